@@ -5,9 +5,19 @@
 
 cdef class PyverbsObject(object):
     cdef object __weakref__
-    cdef object logger
+    cdef object obj_logger
+    cdef bint debug_enabled(self)
 
 cdef class PyverbsCM(PyverbsObject):
     cpdef close(self)
 
-cdef close_weakrefs(iterables)
+cdef class DepRegistry(object):
+    cdef dict kinds
+    cdef Py_ssize_t size
+    cdef Py_ssize_t sweep_at
+    cpdef add(self, kind, obj)
+    cpdef remove(self, kind, obj)
+    cpdef Py_ssize_t num_alive(self, kind)
+    cdef sweep(self)
+
+cdef close_deps(DepRegistry registry, kinds)
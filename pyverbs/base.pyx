@@ -1,6 +1,7 @@
 # SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
 # Copyright (c) 2019, Mellanox Technologies. All rights reserved.
 
+from cpython.weakref cimport PyWeakref_NewRef
 from libc.errno cimport errno
 import logging
 
@@ -21,33 +22,149 @@ LOG_FORMAT='[%(levelname)s] %(asctime)s %(filename)s:%(lineno)s: %(message)s'
 logging.basicConfig(format=LOG_FORMAT, level=LOG_LEVEL, datefmt='%d %b %Y %H:%M:%S')
 
 
-cdef close_weakrefs(iterables):
+cdef enum:
+    # Number of tracked dependents below which a DepRegistry isn't swept
+    DEPS_SWEEP_MIN = 64
+
+
+cdef class DepRegistry(object):
+    """
+    Tracks the objects that hold C references to a pyverbs object (e.g. the
+    MRs and QPs of a PD), so that they're closed before the object's C
+    resource is destroyed. Dependents are grouped by kind, a name chosen by
+    the owning class, and the owner closes them kind by kind in its
+    teardown order.
+    The registry holds plain weak references keyed by the dependents' ids,
+    in a dict per kind that is only allocated once a dependent of that kind
+    is added, so adding and removing a dependent are O(1) and need no weakref
+    callbacks. References to dependents that were garbage collected are
+    swept in bulk once the number of tracked dependents doubles.
     """
-    For each iterable element of iterables, pop each element and
-    call its close() method. This method is used when an object is being
-    closed while other objects still hold C references to it; the object
-    holds weakrefs to such other object, and closes them before trying to
-    teardown the C resources.
-    :param iterables: an array of WeakSets
+    def __init__(self):
+        self.kinds = {}
+        self.size = 0
+        self.sweep_at = DEPS_SWEEP_MIN
+
+    cpdef add(self, kind, obj):
+        """
+        Adds a dependent.
+        :param kind: The dependent's kind
+        :param obj: The dependent object
+        :return: None
+        """
+        cdef dict deps = self.kinds.get(kind)
+        if deps is None:
+            deps = self.kinds[kind] = {}
+        key = id(obj)
+        # An existing entry with the same id is of a collected object
+        if key not in deps:
+            self.size += 1
+        deps[key] = PyWeakref_NewRef(obj, None)
+        if self.size >= self.sweep_at:
+            self.sweep()
+
+    cpdef remove(self, kind, obj):
+        """
+        Removes a dependent, if it's tracked.
+        :param kind: The dependent's kind
+        :param obj: The dependent object
+        :return: None
+        """
+        cdef dict deps = self.kinds.get(kind)
+        if deps is not None and deps.pop(id(obj), None) is not None:
+            self.size -= 1
+
+    cpdef Py_ssize_t num_alive(self, kind):
+        """
+        :param kind: A dependents' kind
+        :return: The number of tracked dependents of <kind> that weren't
+                 garbage collected
+        """
+        cdef dict deps = self.kinds.get(kind)
+        cdef Py_ssize_t num = 0
+        if deps is not None:
+            for ref in deps.values():
+                if ref() is not None:
+                    num += 1
+        return num
+
+    cdef sweep(self):
+        """
+        Drops the references of collected dependents.
+        """
+        cdef dict deps
+        self.size = 0
+        for deps in self.kinds.values():
+            for key in [key for key, ref in deps.items() if ref() is None]:
+                del deps[key]
+            self.size += len(deps)
+        self.sweep_at = max(2 * self.size, DEPS_SWEEP_MIN)
+
+    def __len__(self):
+        """
+        Number of tracked dependents, including collected ones that weren't
+        swept yet.
+        """
+        return self.size
+
+
+cdef close_deps(DepRegistry registry, kinds):
+    """
+    Closes the dependents of <kinds> tracked by <registry>, kind after kind.
+    This method is used when an object is being closed while other objects
+    still hold C references to it; the object tracks such other objects in a
+    DepRegistry, and closes them before trying to teardown the C resources.
+    :param registry: The object's DepRegistry
+    :param kinds: The dependents' kinds in the order they should be closed
     :return: None
     """
-    # None elements can be present if an object's close() was called more
-    # than once (e.g. GC and by another object)
-    for it in iterables:
-        if it is None:
+    cdef dict deps
+    # The registry may be None if the object's initialization failed
+    if registry is None:
+        return
+    for kind in kinds:
+        deps = registry.kinds.get(kind)
+        if deps is None:
             continue
-        while True:
-            try:
-                tmp = it.pop()
-                tmp.close()
-            except KeyError: # popping an empty set
-                break
+        # Closing a dependent may add or remove other dependents
+        while deps:
+            _, ref = deps.popitem()
+            registry.size -= 1
+            obj = ref()
+            if obj is not None:
+                obj.close()
 
 
-cdef class PyverbsObject(object):
+# Loggers of pyverbs' classes, looked up on first use
+cdef dict loggers = {}
 
-    def __init__(self):
-        self.logger = logging.getLogger(self.__class__.__name__)
+
+cdef class PyverbsObject(object):
+    """
+    Base class of pyverbs' objects. An object's logger is its class's logger,
+    which is only looked up when the object first logs, so objects that are
+    created on hot paths (e.g. WCs, SGEs, WRs and GIDs) don't pay for it.
+    """
+    @property
+    def logger(self):
+        if self.obj_logger is None:
+            cls = type(self)
+            self.obj_logger = loggers.get(cls)
+            if self.obj_logger is None:
+                self.obj_logger = logging.getLogger(cls.__name__)
+                loggers[cls] = self.obj_logger
+        return self.obj_logger
+    @logger.setter
+    def logger(self, val):
+        self.obj_logger = val
+
+    cdef bint debug_enabled(self):
+        """
+        Checks if debug messages of the object would be emitted. Debug
+        messages that need formatting are guarded by it, so that the
+        formatting is skipped when debug logging is off.
+        """
+        return self.logger.isEnabledFor(logging.DEBUG)
 
     def set_log_level(self, val):
         self.logger.setLevel(val)
@@ -3,7 +3,7 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsObject, PyverbsCM
+from pyverbs.base cimport PyverbsObject, PyverbsCM, DepRegistry
 cimport pyverbs.librdmacm as cm
 
 
@@ -12,7 +12,7 @@ cdef class CMID(PyverbsCM):
     cdef object event_channel
     cdef object ctx
     cdef object pd
-    cdef object mrs
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
     cpdef close(self)
 
@@ -1,12 +1,11 @@
 from libc.stdint cimport uintptr_t, uint8_t
 from libc.string cimport memset
-import weakref
 
 import ctypes
 from pyverbs.pyverbs_error import PyverbsUserError, PyverbsError, PyverbsRDMAError
 from pyverbs.qp cimport QPInitAttr, QPAttr, ECE
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 cimport pyverbs.libibverbs_enums as e
 cimport pyverbs.librdmacm_enums as ce
 from pyverbs.addr cimport AH, AHAttr
@@ -15,7 +14,7 @@ cimport pyverbs.libibverbs as v
 cimport pyverbs.librdmacm as cm
 from pyverbs.pd cimport PD
 from pyverbs.mr cimport MR
-from pyverbs.cq cimport WC
+from pyverbs.cq cimport WC, WCBatch
 
 
 cdef class ConnParam(PyverbsObject):
@@ -188,6 +187,7 @@ cdef class AddrInfo(PyverbsObject):
         cdef cm.rdma_addrinfo hints
         cdef cm.rdma_addrinfo *hints_ptr = NULL
         cdef cm.rdma_addrinfo *res = NULL
+        cdef int ret
 
         super().__init__()
         if src is not None:
@@ -211,20 +211,25 @@ cdef class AddrInfo(PyverbsObject):
         memset(hints_ptr, 0, sizeof(cm.rdma_addrinfo))
         hints.ai_port_space = port_space
         hints.ai_flags = flags
+        # Address resolution may involve name lookups, release the GIL
         if flags & ce.RAI_PASSIVE:
-            ret = cm.rdma_getaddrinfo(src_addr, src_srvc, hints_ptr,
-                                      &self.addr_info)
+            with nogil:
+                ret = cm.rdma_getaddrinfo(src_addr, src_srvc, hints_ptr,
+                                          &self.addr_info)
         else:
             if src:
                 hints.ai_flags |= ce.RAI_PASSIVE
-                ret = cm.rdma_getaddrinfo(src_addr, src_srvc, hints_ptr, &res)
+                with nogil:
+                    ret = cm.rdma_getaddrinfo(src_addr, src_srvc, hints_ptr,
+                                              &res)
                 if ret != 0:
                     raise PyverbsRDMAErrno('Failed to get Address Info')
                 hints.ai_src_addr = <cm.sockaddr*>res.ai_src_addr
                 hints.ai_src_len = res.ai_src_len
                 hints.ai_flags &= ~ce.RAI_PASSIVE
-            ret = cm.rdma_getaddrinfo(dst_addr, dst_srvc, hints_ptr,
-                                      &self.addr_info)
+            with nogil:
+                ret = cm.rdma_getaddrinfo(dst_addr, dst_srvc, hints_ptr,
+                                          &self.addr_info)
             if src:
                 cm.rdma_freeaddrinfo(res)
         if ret != 0:
@@ -249,8 +254,10 @@ cdef class CMEvent(PyverbsObject):
         :param channel: Event Channel on which this event has been received
         :return: CMEvent object
         """
+        cdef int ret
         super().__init__()
-        ret = cm.rdma_get_cm_event(channel.event_channel, &self.event)
+        with nogil:
+            ret = cm.rdma_get_cm_event(channel.event_channel, &self.event)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to create CMEvent')
         self.logger.debug('Created a CMEvent')
@@ -343,12 +350,14 @@ cdef class CMID(PyverbsCM):
         """
         cdef v.ibv_qp_init_attr *init
         cdef v.ibv_pd *in_pd = NULL
+        cdef cm.rdma_addrinfo *addr_info
+        cdef int ret
 
         super().__init__()
         self.pd = None
         self.ctx = None
         self.event_channel = None
-        self.mrs = weakref.WeakSet()
+        self.deps = DepRegistry()
         if creator is None:
             return
         elif isinstance(creator, AddrInfo):
@@ -356,8 +365,9 @@ cdef class CMID(PyverbsCM):
             if pd is not None:
                 in_pd = pd.pd
                 self.pd = pd
-            ret = cm.rdma_create_ep(&self.id, (<AddrInfo>creator).addr_info,
-                                    in_pd, init)
+            addr_info = (<AddrInfo>creator).addr_info
+            with nogil:
+                ret = cm.rdma_create_ep(&self.id, addr_info, in_pd, init)
             if ret != 0:
                 raise PyverbsRDMAErrno('Failed to create CM ID')
             if not (<AddrInfo>creator).addr_info.ai_flags & ce.RAI_PASSIVE:
@@ -383,7 +393,7 @@ cdef class CMID(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, MR):
-            self.mrs.add(obj)
+            self.deps.add('mrs', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -432,7 +442,7 @@ cdef class CMID(PyverbsCM):
                 (<Context>self.ctx).context = NULL
             if self.pd:
                 (<PD>self.pd).pd = NULL
-            close_weakrefs([self.mrs])
+            close_deps(self.deps, ('mrs',))
             self.id = NULL
 
     def get_request(self):
@@ -445,8 +455,10 @@ cdef class CMID(PyverbsCM):
         close on the newly created identifier.
         :return: New CMID representing the connection request.
         """
-        to_conn = CMID()
-        ret = cm.rdma_get_request(self.id, &to_conn.id)
+        cdef CMID to_conn = CMID()
+        cdef int ret
+        with nogil:
+            ret = cm.rdma_get_request(self.id, &to_conn.id)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to get request, no connection established')
         self.ctx = Context(cmid=to_conn)
@@ -479,8 +491,11 @@ cdef class CMID(PyverbsCM):
         :param timeout_ms: Time to wait for resolution to complete [msec]
         :return: None
         """
-        ret = cm.rdma_resolve_addr(self.id, rai.addr_info.ai_src_addr,
-                                   rai.addr_info.ai_dst_addr, timeout_ms)
+        cdef int ret
+        cdef int timeout = timeout_ms
+        with nogil:
+            ret = cm.rdma_resolve_addr(self.id, rai.addr_info.ai_src_addr,
+                                       rai.addr_info.ai_dst_addr, timeout)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to Resolve Address')
 
@@ -527,7 +542,10 @@ cdef class CMID(PyverbsCM):
         :param timeout_ms: Time to wait for resolution to complete
         :return: None
         """
-        ret = cm.rdma_resolve_route(self.id, timeout_ms)
+        cdef int ret
+        cdef int timeout = timeout_ms
+        with nogil:
+            ret = cm.rdma_resolve_route(self.id, timeout)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to Resolve Route')
         # After resolve route, cm_id contains ibv_context.
@@ -555,7 +573,9 @@ cdef class CMID(PyverbsCM):
         :return: None
         """
         cdef cm.rdma_conn_param *conn = &param.conn_param if param else NULL
-        ret = cm.rdma_connect(self.id, conn)
+        cdef int ret
+        with nogil:
+            ret = cm.rdma_connect(self.id, conn)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to Connect')
 
@@ -577,7 +597,9 @@ cdef class CMID(PyverbsCM):
         :return: None
         """
         cdef cm.rdma_conn_param *conn = &param.conn_param if param else NULL
-        ret = cm.rdma_accept(self.id, conn)
+        cdef int ret
+        with nogil:
+            ret = cm.rdma_accept(self.id, conn)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to Accept Connection')
 
@@ -591,7 +613,9 @@ cdef class CMID(PyverbsCM):
         This method should not be used on a CMID on which a QP has been
         created.
         """
-        ret = cm.rdma_establish(self.id)
+        cdef int ret
+        with nogil:
+            ret = cm.rdma_establish(self.id)
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to Complete an active connection request')
 
@@ -770,17 +794,32 @@ cdef class CMID(PyverbsCM):
         if ret != 0:
             raise PyverbsRDMAErrno('Failed to Post Send')
 
-    def get_recv_comp(self):
+    def get_recv_comp(self, WCBatch wcs=None):
         """
         Polls the receive CQ associated with CMID for a work completion.
-        :return: The retrieved WC or None if there is no completions
+        :param wcs: If provided, the completion is stored in place in the
+                    first slot of this WCBatch and its WCView is returned
+                    instead of a new WC object
+        :return: The retrieved WC (or WCView) or None if there is no
+                 completions
         """
         cdef v.ibv_wc wc
-        ret = cm.rdma_get_recv_comp(self.id, &wc)
+        cdef v.ibv_wc *dst = &wc
+        cdef int ret
+        if wcs is not None:
+            if wcs.wcs == NULL:
+                raise PyverbsUserError('The WCBatch is closed')
+            wcs.num_wcs = 0
+            dst = wcs.wcs
+        with nogil:
+            ret = cm.rdma_get_recv_comp(self.id, dst)
         if ret < 0:
             raise PyverbsRDMAErrno('Failed to retrieve receive completion')
         elif ret == 0:
             return None
+        if wcs is not None:
+            wcs.num_wcs = 1
+            return wcs.views[0]
         return WC(wr_id=wc.wr_id, status=wc.status, opcode=wc.opcode,
                   vendor_err=wc.vendor_err, byte_len=wc.byte_len,
                   qp_num=wc.qp_num, src_qp=wc.src_qp,
@@ -788,17 +827,32 @@ cdef class CMID(PyverbsCM):
                   pkey_index=wc.pkey_index, slid=wc.slid, sl=wc.sl,
                   dlid_path_bits=wc.dlid_path_bits)
 
-    def get_send_comp(self):
+    def get_send_comp(self, WCBatch wcs=None):
         """
         Polls the send CQ associated with CMID for a work completion.
-        :return: The retrieved WC or None if there is no completions
+        :param wcs: If provided, the completion is stored in place in the
+                    first slot of this WCBatch and its WCView is returned
+                    instead of a new WC object
+        :return: The retrieved WC (or WCView) or None if there is no
+                 completions
         """
         cdef v.ibv_wc wc
-        ret = cm.rdma_get_send_comp(self.id, &wc)
+        cdef v.ibv_wc *dst = &wc
+        cdef int ret
+        if wcs is not None:
+            if wcs.wcs == NULL:
+                raise PyverbsUserError('The WCBatch is closed')
+            wcs.num_wcs = 0
+            dst = wcs.wcs
+        with nogil:
+            ret = cm.rdma_get_send_comp(self.id, dst)
         if ret < 0:
             raise PyverbsRDMAErrno('Failed to retrieve send completion')
         elif ret == 0:
             return None
+        if wcs is not None:
+            wcs.num_wcs = 1
+            return wcs.views[0]
         return WC(wr_id=wc.wr_id, status=wc.status, opcode=wc.opcode,
                   vendor_err=wc.vendor_err, byte_len=wc.byte_len,
                   qp_num=wc.qp_num, src_qp=wc.src_qp,
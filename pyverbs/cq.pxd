@@ -3,26 +3,54 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsObject, PyverbsCM
+from libc.stdint cimport uint8_t, uint16_t, uint32_t, uint64_t
+
+from pyverbs.base cimport PyverbsObject, PyverbsCM, DepRegistry
 cimport pyverbs.libibverbs as v
 
+cdef struct cqex_record:
+    uint64_t wr_id
+    uint32_t status
+    uint32_t opcode
+    uint32_t vendor_err
+    uint32_t wc_flags
+    uint32_t byte_len
+    uint32_t imm_data
+    uint32_t qp_num
+    uint32_t src_qp
+    uint32_t slid
+    uint8_t sl
+    uint8_t dlid_path_bits
+    uint16_t cvlan
+    uint32_t flow_tag
+    uint64_t completion_ts
+    uint64_t completion_wallclock_ns
+    uint64_t tm_tag
+    uint32_t tm_priv
+    uint8_t sgid_valid
+    uint8_t sgid[16]
+
 cdef class CompChannel(PyverbsCM):
     cdef v.ibv_comp_channel *cc
     cpdef close(self)
     cdef object context
     cdef add_ref(self, obj)
-    cdef object cqs
+    cdef DepRegistry deps
+    cdef object cq_map
+    cdef object loop
 
 cdef class CQ(PyverbsCM):
     cdef v.ibv_cq *cq
     cpdef close(self)
     cdef object context
     cdef add_ref(self, obj)
-    cdef object qps
-    cdef object srqs
+    cdef DepRegistry deps
     cdef object channel
     cdef object num_events
-    cdef object wqs
+    cdef object ring
+    cdef object comp_event
+    cdef get_ring(self)
+    cdef get_batch(self, num_entries, wcs)
 
 cdef class CqInitAttrEx(PyverbsObject):
     cdef v.ibv_cq_init_attr_ex attr
@@ -35,13 +63,32 @@ cdef class CQEX(PyverbsCM):
     cpdef close(self)
     cdef object context
     cdef add_ref(self, obj)
-    cdef object qps
-    cdef object srqs
-    cdef object wqs
+    cdef DepRegistry deps
+    cdef uint64_t wc_flags
+    cdef int read_dv_fields(self, cqex_record *rec) except -1
+
+cdef class CQEXRecords(PyverbsCM):
+    cdef cqex_record *recs
+    cdef int capacity
+    cdef int num_recs
+    cdef uint64_t fields
+    cdef object has_sgid
+    cpdef close(self)
 
 cdef class WC(PyverbsObject):
     cdef v.ibv_wc wc
 
+cdef class WCBatch(PyverbsCM):
+    cdef v.ibv_wc *wcs
+    cdef int capacity
+    cdef int num_wcs
+    cdef object views
+    cpdef close(self)
+
+cdef class WCView(PyverbsObject):
+    cdef v.ibv_wc *wc
+    cdef v.ibv_wc *_get_wc(self) except NULL
+
 cdef class PollCqAttr(PyverbsObject):
     cdef v.ibv_poll_cq_attr attr
 
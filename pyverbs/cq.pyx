@@ -1,11 +1,20 @@
 # SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
 # Copyright (c) 2019, Mellanox Technologies. All rights reserved.
+import asyncio
 import weakref
-
-from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError
+import os
+
+from cpython.array cimport array, clone
+from libc.stdint cimport uintptr_t
+from libc.stdlib cimport calloc, free
+from libc.string cimport memcpy
+from libc.errno cimport ENOENT, EAGAIN, EINTR, errno
+from posix.time cimport clock_gettime, timespec, CLOCK_MONOTONIC
+from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, \
+    PyverbsUserError
 from pyverbs.base import PyverbsRDMAErrno
 from pyverbs.pd cimport PD, ParentDomain
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 cimport pyverbs.libibverbs_enums as e
 from pyverbs.device cimport Context
 from pyverbs.srq cimport SRQ
@@ -13,6 +22,106 @@ from pyverbs.qp cimport QP
 from pyverbs.wq cimport WQ
 
 
+# Number of CQ events gathered by an event loop reader before they are
+# acknowledged. ibv_ack_cq_events() takes a mutex, so acking every event is
+# costly with many CQs; unacked events are acked anyway when the CQ is closed.
+CQ_EVENTS_ACK_BATCH = 64
+
+cdef extern from '<poll.h>':
+    struct pollfd:
+        int fd
+        short events
+        short revents
+    enum: POLLIN
+    int poll(pollfd *fds, unsigned long nfds, int timeout) nogil
+
+
+cdef inline double monotonic() nogil:
+    cdef timespec ts
+    clock_gettime(CLOCK_MONOTONIC, &ts)
+    return ts.tv_sec + ts.tv_nsec * 1e-9
+
+
+cdef int cq_wait(v.ibv_cq *cq, v.ibv_comp_channel *cc, v.ibv_wc *wcs,
+                 int num_entries, double timeout, double spin,
+                 int *num_events) nogil:
+    """
+    Polls <cq> into <wcs> until <num_entries> completions were polled or
+    <timeout> seconds passed (a negative timeout means no timeout). The CQ is
+    busy polled for <spin> seconds, then armed and, if a completion channel
+    is given, the caller sleeps on the channel. Spinning restarts after every
+    wake up. The number of read completion events is added to <num_events>.
+    :return: The number of polled completions or a negative errno
+    """
+    cdef int npolled = 0
+    cdef int rc, poll_ms
+    cdef double now, deadline, spin_end
+    cdef pollfd pfd
+    cdef v.ibv_cq *ev_cq
+    cdef void *ev_ctx
+
+    now = monotonic()
+    deadline = now + timeout if timeout >= 0 else -1
+    spin_end = now + spin
+    while npolled < num_entries:
+        rc = v.ibv_poll_cq(cq, num_entries - npolled, wcs + npolled)
+        if rc < 0:
+            return rc
+        npolled += rc
+        if npolled == num_entries:
+            break
+        now = monotonic()
+        if deadline >= 0 and now >= deadline:
+            break
+        if rc > 0 or cc == NULL or now < spin_end:
+            continue
+        rc = v.ibv_req_notify_cq(cq, 0)
+        if rc != 0:
+            return -rc
+        # Completions that arrived before the CQ was armed don't generate an
+        # event, poll once more before going to sleep.
+        rc = v.ibv_poll_cq(cq, num_entries - npolled, wcs + npolled)
+        if rc < 0:
+            return rc
+        if rc == 0:
+            pfd.fd = cc.fd
+            pfd.events = POLLIN
+            pfd.revents = 0
+            poll_ms = <int>((deadline - now) * 1000) + 1 if deadline >= 0 else -1
+            rc = poll(&pfd, 1, poll_ms)
+            if rc < 0 and errno != EINTR:
+                return -errno
+            if rc > 0 and v.ibv_get_cq_event(cc, &ev_cq, &ev_ctx) == 0:
+                num_events[0] += 1
+        else:
+            npolled += rc
+        spin_end = monotonic() + spin
+    return npolled
+
+
+cdef modify_cq_moderation(Context context, v.ibv_cq *cq, cq_count, cq_period):
+    """
+    Sets the CQ moderation parameters after validating them against the
+    device's CQ moderation capabilities.
+    """
+    cdef v.ibv_modify_cq_attr attr
+    caps = context.query_device_ex().cq_mod_caps
+    if caps.max_cq_count == 0 and caps.max_cq_period == 0:
+        raise PyverbsUserError('CQ moderation is not supported by the device')
+    if cq_count > caps.max_cq_count:
+        raise PyverbsUserError(f'cq_count {cq_count} exceeds the device '
+                               f'maximum {caps.max_cq_count}')
+    if cq_period > caps.max_cq_period:
+        raise PyverbsUserError(f'cq_period {cq_period} exceeds the device '
+                               f'maximum {caps.max_cq_period}')
+    attr.attr_mask = e.IBV_CQ_ATTR_MODERATE
+    attr.moderate.cq_count = cq_count
+    attr.moderate.cq_period = cq_period
+    rc = v.ibv_modify_cq(cq, &attr)
+    if rc != 0:
+        raise PyverbsRDMAError('Failed to modify CQ moderation', rc)
+
+
 cdef class CompChannel(PyverbsCM):
     """
     A completion channel is a file descriptor used to deliver completion
@@ -32,7 +141,9 @@ cdef class CompChannel(PyverbsCM):
             raise PyverbsRDMAErrno('Failed to create a completion channel')
         self.context = context
         context.add_ref(self)
-        self.cqs = weakref.WeakSet()
+        self.deps = DepRegistry()
+        self.cq_map = weakref.WeakValueDictionary()
+        self.loop = None
         self.logger.debug('Created a Completion Channel')
 
     def __dealloc__(self):
@@ -42,7 +153,8 @@ cdef class CompChannel(PyverbsCM):
         if self.cc != NULL:
             if self.logger:
                 self.logger.debug('Closing completion channel')
-            close_weakrefs([self.cqs])
+            self.detach()
+            close_deps(self.deps, ('cqs',))
             rc = v.ibv_destroy_comp_channel(self.cc)
             if rc != 0:
                 raise PyverbsRDMAError('Failed to destroy a completion channel',
@@ -57,17 +169,95 @@ cdef class CompChannel(PyverbsCM):
         """
         cdef v.ibv_cq *cq
         cdef void *ctx
+        cdef int rc
 
-        rc = v.ibv_get_cq_event(self.cc, &cq, &ctx)
+        with nogil:
+            rc = v.ibv_get_cq_event(self.cc, &cq, &ctx)
         if rc != 0:
             raise PyverbsRDMAErrno('Failed to get CQ event')
         if cq != expected_cq.cq:
             raise PyverbsRDMAErrno('Received event on an unexpected CQ')
         expected_cq.num_events += 1
 
+    def set_nonblocking(self, nonblocking=True):
+        """
+        Sets the channel's file descriptor to non-blocking mode. In this mode
+        get_cq_event() raises EAGAIN instead of waiting when no event is
+        pending, and poll_cq_events() may be used.
+        :param nonblocking: Whether to set or clear O_NONBLOCK
+        :return: None
+        """
+        os.set_blocking(self.cc.fd, not nonblocking)
+
+    def poll_cq_events(self):
+        """
+        Reads all pending completion events from a non-blocking channel. The
+        events are accounted on the matching CQs and acknowledged in batches
+        of CQ_EVENTS_ACK_BATCH. CQs that got an event and are waited on by
+        CQ.wait_completions() are woken up.
+        :return: The number of events read
+        """
+        cdef v.ibv_cq *cq
+        cdef void *ctx
+        cdef int num = 0
+
+        while True:
+            rc = v.ibv_get_cq_event(self.cc, &cq, &ctx)
+            if rc != 0:
+                if errno == EAGAIN:
+                    return num
+                raise PyverbsRDMAErrno('Failed to get CQ event')
+            num += 1
+            cq_obj = self.cq_map.get(<uintptr_t>cq)
+            if cq_obj is None:
+                v.ibv_ack_cq_events(cq, 1)
+                continue
+            (<CQ>cq_obj).num_events += 1
+            if (<CQ>cq_obj).num_events >= CQ_EVENTS_ACK_BATCH:
+                cq_obj.ack_events((<CQ>cq_obj).num_events)
+            if (<CQ>cq_obj).comp_event is not None:
+                (<CQ>cq_obj).comp_event.set()
+
+    def attach(self, loop=None):
+        """
+        Registers the channel with an asyncio event loop. The channel's fd is
+        set to non-blocking mode and poll_cq_events() is called whenever it
+        becomes readable. A channel can be attached to a single loop at a
+        time, it's detached from a closed loop when attached to a new one.
+        :param loop: The event loop to use. Defaults to the running loop.
+        :return: None
+        """
+        if loop is None:
+            loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        if self.loop is not None and self.loop.is_closed():
+            self.detach()
+        if self.loop is not None:
+            raise PyverbsUserError('Completion channel is already attached '
+                                   'to another event loop')
+        self.set_nonblocking()
+        loop.add_reader(self.cc.fd, self.poll_cq_events)
+        self.loop = loop
+
+    def detach(self):
+        """
+        Unregisters the channel from the event loop it was attached to. The
+        CQs' completion events, which belong to that loop, are dropped.
+        :return: None
+        """
+        if self.loop is not None:
+            if not self.loop.is_closed():
+                self.loop.remove_reader(self.cc.fd)
+            self.loop = None
+            for cq_obj in self.cq_map.values():
+                (<CQ>cq_obj).comp_event = None
+
     cdef add_ref(self, obj):
         if isinstance(obj, CQ) or isinstance(obj, CQEX):
-            self.cqs.add(obj)
+            self.deps.add('cqs', obj)
+        if isinstance(obj, CQ):
+            self.cq_map[<uintptr_t>(<CQ>obj).cq] = obj
 
     @property
     def fd(self):
@@ -106,19 +296,18 @@ cdef class CQ(PyverbsCM):
             raise PyverbsRDMAErrno('Failed to create a CQ')
         self.context = context
         context.add_ref(self)
-        self.qps = weakref.WeakSet()
-        self.srqs = weakref.WeakSet()
-        self.wqs = weakref.WeakSet()
+        self.deps = DepRegistry()
         self.num_events = 0
+        self.comp_event = None
         self.logger.debug('Created a CQ')
 
     cdef add_ref(self, obj):
         if isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         elif isinstance(obj, SRQ):
-            self.srqs.add(obj)
+            self.deps.add('srqs', obj)
         elif isinstance(obj, WQ):
-            self.wqs.add(obj)
+            self.deps.add('wqs', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -129,7 +318,7 @@ cdef class CQ(PyverbsCM):
         if self.cq != NULL:
             if self.logger:
                 self.logger.debug('Closing CQ')
-            close_weakrefs([self.qps, self.srqs, self.wqs])
+            close_deps(self.deps, ('qps', 'srqs', 'wqs'))
             if self.num_events:
                 self.ack_events(self.num_events)
             rc = v.ibv_destroy_cq(self.cq)
@@ -138,6 +327,9 @@ cdef class CQ(PyverbsCM):
             self.cq = NULL
             self.context = None
             self.channel = None
+            if self.ring is not None:
+                self.ring.close()
+                self.ring = None
 
     def resize(self, cqe):
         """
@@ -149,6 +341,20 @@ cdef class CQ(PyverbsCM):
         if rc:
             raise PyverbsRDMAError('Failed to resize CQ', rc)
 
+    def modify(self, cq_count, cq_period):
+        """
+        Sets the CQ moderation parameters. A completion event is generated
+        once <cq_count> completions were added to the CQ or <cq_period>
+        microseconds passed since the first unreported completion, whichever
+        comes first. The values are validated against the device's
+        CQModerationCaps.
+        :param cq_count: Number of completions per event
+        :param cq_period: Maximal event delay in microseconds
+        :return: None
+        """
+        modify_cq_moderation(<Context>self.context, self.cq, cq_count,
+                             cq_period)
+
     def poll(self, num_entries=1):
         """
         Polls the CQ for completions.
@@ -175,6 +381,90 @@ cdef class CQ(PyverbsCM):
                           dlid_path_bits=wc.dlid_path_bits))
         return npolled, wcs
 
+    def poll_batch(self, num_entries=1, WCBatch wcs=None):
+        """
+        Polls the CQ for up to <num_entries> completions using a single
+        ibv_poll_cq call. Unlike poll(), no WC object is created per
+        completion; the completions are stored in a WCBatch which exposes
+        them column-wise or through reusable WCView slots.
+        :param num_entries: Maximum number of completions to pull
+        :param wcs: WCBatch to fill. If not provided, the CQ's own completion
+                    ring is used (see the ring property). Its content is
+                    overwritten by the next poll_batch() call, and
+                    <num_entries> can't exceed its capacity.
+        :return: (npolled, wcs): The number of polled completions and the
+                 WCBatch holding them
+        """
+        wcs = self.get_batch(num_entries, wcs)
+        rc = v.ibv_poll_cq(self.cq, num_entries, wcs.wcs)
+        if rc < 0:
+            wcs.num_wcs = 0
+            raise PyverbsRDMAError('Failed to poll CQ', -rc)
+        wcs.num_wcs = rc
+        return rc, wcs
+
+    cdef get_ring(self):
+        if self.cq == NULL:
+            raise PyverbsUserError('The CQ is closed')
+        if self.ring is None:
+            self.ring = WCBatch(self.cq.cqe)
+        return self.ring
+
+    cdef get_batch(self, num_entries, wcs):
+        if wcs is None:
+            wcs = self.get_ring()
+        elif self.cq == NULL:
+            raise PyverbsUserError('The CQ is closed')
+        if num_entries > wcs.capacity:
+            raise PyverbsUserError(f'Requested {num_entries} completions but '
+                                   f'the WCBatch capacity is {wcs.capacity}')
+        return wcs
+
+    def wait(self, num_entries=1, timeout=None, spin_us=50, WCBatch wcs=None):
+        """
+        Waits for <num_entries> completions. The CQ is busy polled for
+        <spin_us> microseconds. If the completions did not arrive by then and
+        the CQ has a completion channel, the CQ is armed and the calling
+        thread sleeps on the channel until a completion event arrives. The CQ
+        is polled again after arming, so completions that arrived before the
+        notification was requested are not missed. CQs without a completion
+        channel are busy polled until the timeout expires.
+        The GIL is released while waiting. The completion channel must not be
+        shared with other CQs.
+        :param num_entries: Number of completions to wait for
+        :param timeout: Maximal time to wait in seconds. None waits forever.
+        :param spin_us: Busy polling budget in microseconds before sleeping
+        :param wcs: WCBatch to fill. If not provided, the CQ's own completion
+                    ring is used.
+        :return: (npolled, wcs): The number of polled completions, which is
+                 smaller than num_entries if the timeout expired, and the
+                 WCBatch holding them
+        """
+        cdef v.ibv_comp_channel *cc = NULL
+        cdef double c_timeout = -1 if timeout is None else timeout
+        cdef double spin = spin_us * 1e-6
+        cdef int c_num = num_entries
+        cdef int num_events = 0
+        cdef int rc
+
+        wcs = self.get_batch(num_entries, wcs)
+        if self.channel is not None:
+            if (<CompChannel>self.channel).deps.num_alive('cqs') > 1:
+                raise PyverbsUserError('CQ.wait() requires a completion '
+                                       'channel that is used by this CQ only')
+            cc = (<CompChannel>self.channel).cc
+        with nogil:
+            rc = cq_wait(self.cq, cc, wcs.wcs, c_num, c_timeout, spin,
+                         &num_events)
+        self.num_events += num_events
+        if self.num_events >= CQ_EVENTS_ACK_BATCH:
+            self.ack_events(self.num_events)
+        if rc < 0:
+            wcs.num_wcs = 0
+            raise PyverbsRDMAError('Failed to wait for completions', -rc)
+        wcs.num_wcs = rc
+        return rc, wcs
+
     def req_notify(self, solicited_only = False):
         """
         Request completion notification on the completion queue.
@@ -198,6 +488,38 @@ cdef class CQ(PyverbsCM):
         v.ibv_ack_cq_events(self.cq, num_events)
         self.num_events -= num_events
 
+    async def wait_completions(self, num_entries=1, solicited_only=False):
+        """
+        Asynchronously waits until <num_entries> completions were polled from
+        the CQ. The CQ's completion channel is attached to the running event
+        loop (see CompChannel.attach()), so many CQs can be waited on from a
+        single thread without a blocking get_cq_event() call per CQ.
+        The CQ is re-armed before sleeping and polled once more after arming,
+        so completions that arrive in between are not missed. Completion
+        events are acknowledged in batches by the channel.
+        :param num_entries: Number of completions to wait for
+        :param solicited_only: Passed to req_notify() when re-arming the CQ
+        :return: A list of the polled WCs
+        """
+        if self.channel is None:
+            raise PyverbsUserError('CQ has no completion channel')
+        self.channel.attach()
+        if self.comp_event is None:
+            self.comp_event = asyncio.Event()
+        wcs = []
+        while len(wcs) < num_entries:
+            _, tmp_wcs = self.poll(num_entries - len(wcs))
+            wcs.extend(tmp_wcs)
+            if len(wcs) == num_entries:
+                break
+            self.comp_event.clear()
+            self.req_notify(solicited_only)
+            npolled, tmp_wcs = self.poll(num_entries - len(wcs))
+            wcs.extend(tmp_wcs)
+            if npolled == 0:
+                await self.comp_event.wait()
+        return wcs
+
     def __str__(self):
         print_format = '{:22}: {:<20}\n'
         return 'CQ\n' +\
@@ -208,6 +530,16 @@ cdef class CQ(PyverbsCM):
     def comp_channel(self):
         return self.channel
 
+    @property
+    def ring(self):
+        """
+        The completion ring owned by the CQ, used by poll_batch() when no
+        WCBatch is provided. It is allocated on first use with a capacity of
+        the CQ's depth, and is never reallocated, so polling more completions
+        than that requires a WCBatch.
+        """
+        return self.get_ring()
+
     @property
     def cqe(self):
         return self.cq.cqe
@@ -321,14 +653,13 @@ cdef class CQEX(PyverbsCM):
         :return: The newly created CQEX on success
         """
         super().__init__()
-        self.qps = weakref.WeakSet()
-        self.srqs = weakref.WeakSet()
-        self.wqs = weakref.WeakSet()
+        self.deps = DepRegistry()
+        if init_attr is None:
+            init_attr = CqInitAttrEx()
+        self.wc_flags = init_attr.wc_flags
         if self.cq != NULL:
             # Leave CQ initialization to the provider
             return
-        if init_attr is None:
-            init_attr = CqInitAttrEx()
         self.cq = v.ibv_create_cq_ex(context.context, &init_attr.attr)
         if init_attr.comp_channel:
             init_attr.comp_channel.add_ref(self)
@@ -342,11 +673,11 @@ cdef class CQEX(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         elif isinstance(obj, SRQ):
-            self.srqs.add(obj)
+            self.deps.add('srqs', obj)
         elif isinstance(obj, WQ):
-            self.wqs.add(obj)
+            self.deps.add('wqs', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -357,13 +688,23 @@ cdef class CQEX(PyverbsCM):
         if self.cq != NULL:
             if self.logger:
                 self.logger.debug('Closing CQEx')
-            close_weakrefs([self.srqs, self.qps, self.wqs])
+            close_deps(self.deps, ('srqs', 'qps', 'wqs'))
             rc = v.ibv_destroy_cq(<v.ibv_cq*>self.cq)
             if rc != 0:
                 raise PyverbsRDMAError('Failed to destroy CQEX', rc)
             self.cq = NULL
             self.context = None
 
+    def modify(self, cq_count, cq_period):
+        """
+        Sets the CQ moderation parameters, see CQ.modify().
+        :param cq_count: Number of completions per event
+        :param cq_period: Maximal event delay in microseconds
+        :return: None
+        """
+        modify_cq_moderation(<Context>self.context, self.ibv_cq, cq_count,
+                             cq_period)
+
     def start_poll(self, PollCqAttr attr):
         """
         Start polling a batch of work completions.
@@ -388,6 +729,110 @@ cdef class CQEX(PyverbsCM):
         """
         return v.ibv_end_poll(self.cq)
 
+    def drain(self, max_entries, fields=None, CQEXRecords recs=None):
+        """
+        Polls up to <max_entries> completions, running the whole
+        start_poll/poll_next/end_poll sequence in a single call. For each
+        completion the wr_id, status, opcode, vendor error and WC flags are
+        collected, as well as the optional fields requested in <fields>.
+        Provider CQs may collect provider-specific fields as well (e.g. the
+        source GID of an EfaCQ created with EFADV_WC_EX_WITH_SGID).
+        :param max_entries: Maximum number of completions to poll
+        :param fields: Bitmask of ibv_create_cq_wc_flags to collect. Must be a
+                       subset of the wc_flags the CQ was created with. If None,
+                       all of the CQ's wc_flags are collected.
+        :param recs: CQEXRecords to fill. If not provided, a new one of
+                     capacity <max_entries> is allocated.
+        :return: (npolled, recs): The number of polled completions and the
+                 CQEXRecords holding them
+        """
+        cdef v.ibv_poll_cq_attr attr
+        cdef v.ibv_wc_tm_info tm_info
+        cdef cqex_record *rec
+        cdef uint64_t flags
+        cdef int num = 0
+        cdef int limit
+        if max_entries < 1:
+            raise PyverbsUserError(f'Invalid number of completions '
+                                   f'{max_entries}')
+        flags = self.wc_flags if fields is None else fields
+        if flags & ~self.wc_flags:
+            raise PyverbsUserError(f'Fields {create_wc_flags_to_str(flags & ~self.wc_flags)}'
+                                   f'were not enabled on CQ creation')
+        if recs is None:
+            recs = CQEXRecords(max_entries)
+        elif max_entries > recs.capacity:
+            raise PyverbsUserError(f'Requested {max_entries} completions but '
+                                   f'the CQEXRecords capacity is {recs.capacity}')
+        limit = min(max_entries, recs.capacity)
+        recs.num_recs = 0
+        recs.fields = flags
+        recs.has_sgid = False
+        attr.comp_mask = 0
+        rc = v.ibv_start_poll(self.cq, &attr)
+        if rc == ENOENT:
+            return 0, recs
+        if rc != 0:
+            raise PyverbsRDMAError('Failed to poll CQ', rc)
+        try:
+            while True:
+                rec = &recs.recs[num]
+                rec.wr_id = self.cq.wr_id
+                rec.status = self.cq.status
+                rec.opcode = v.ibv_wc_read_opcode(self.cq)
+                rec.vendor_err = v.ibv_wc_read_vendor_err(self.cq)
+                rec.wc_flags = v.ibv_wc_read_wc_flags(self.cq)
+                if flags & e.IBV_WC_EX_WITH_BYTE_LEN:
+                    rec.byte_len = v.ibv_wc_read_byte_len(self.cq)
+                if flags & e.IBV_WC_EX_WITH_IMM:
+                    rec.imm_data = v.ibv_wc_read_imm_data(self.cq)
+                if flags & e.IBV_WC_EX_WITH_QP_NUM:
+                    rec.qp_num = v.ibv_wc_read_qp_num(self.cq)
+                if flags & e.IBV_WC_EX_WITH_SRC_QP:
+                    rec.src_qp = v.ibv_wc_read_src_qp(self.cq)
+                if flags & e.IBV_WC_EX_WITH_SLID:
+                    rec.slid = v.ibv_wc_read_slid(self.cq)
+                if flags & e.IBV_WC_EX_WITH_SL:
+                    rec.sl = v.ibv_wc_read_sl(self.cq)
+                if flags & e.IBV_WC_EX_WITH_DLID_PATH_BITS:
+                    rec.dlid_path_bits = v.ibv_wc_read_dlid_path_bits(self.cq)
+                if flags & e.IBV_WC_EX_WITH_COMPLETION_TIMESTAMP:
+                    rec.completion_ts = v.ibv_wc_read_completion_ts(self.cq)
+                if flags & e.IBV_WC_EX_WITH_COMPLETION_TIMESTAMP_WALLCLOCK:
+                    rec.completion_wallclock_ns = \
+                        v.ibv_wc_read_completion_wallclock_ns(self.cq)
+                if flags & e.IBV_WC_EX_WITH_CVLAN:
+                    rec.cvlan = v.ibv_wc_read_cvlan(self.cq)
+                if flags & e.IBV_WC_EX_WITH_FLOW_TAG:
+                    rec.flow_tag = v.ibv_wc_read_flow_tag(self.cq)
+                if flags & e.IBV_WC_EX_WITH_TM_INFO:
+                    v.ibv_wc_read_tm_info(self.cq, &tm_info)
+                    rec.tm_tag = tm_info.tag
+                    rec.tm_priv = tm_info.priv
+                rec.sgid_valid = 0
+                if self.read_dv_fields(rec):
+                    recs.has_sgid = True
+                num += 1
+                recs.num_recs = num
+                if num >= limit:
+                    break
+                rc = v.ibv_next_poll(self.cq)
+                if rc == ENOENT:
+                    break
+                if rc != 0:
+                    raise PyverbsRDMAError('Failed to poll CQ', rc)
+        finally:
+            v.ibv_end_poll(self.cq)
+        return num, recs
+
+    cdef int read_dv_fields(self, cqex_record *rec) except -1:
+        """
+        Reads provider-specific fields of the current completion into <rec>.
+        Provider CQs override this method, the generic CQEX has none.
+        :return: 1 if provider-specific fields were collected, 0 otherwise
+        """
+        return 0
+
     def read_opcode(self):
         return v.ibv_wc_read_opcode(self.cq)
     def read_vendor_err(self):
@@ -442,6 +887,224 @@ cdef class CQEX(PyverbsCM):
                print_format.format('CQEs', self.cq.cqe)
 
 
+cdef class CQEXRecords(PyverbsCM):
+    """
+    A preallocated, reusable array of completion records, filled by
+    CQEX.drain(). Only the fields requested in the drain are collected; each
+    of them is exposed as a column (array.array object). Accessing a column
+    that wasn't collected raises a PyverbsUserError.
+    """
+    def __init__(self, capacity):
+        """
+        Allocates room for <capacity> completion records.
+        :param capacity: Maximum number of completions the records can hold
+        :return: A CQEXRecords object
+        """
+        super().__init__()
+        if capacity <= 0:
+            raise PyverbsUserError(f'Invalid CQEXRecords capacity {capacity}')
+        self.recs = <cqex_record*>calloc(capacity, sizeof(cqex_record))
+        if self.recs == NULL:
+            raise PyverbsError('Failed to allocate completion records')
+        self.capacity = capacity
+        self.num_recs = 0
+        self.fields = 0
+        self.has_sgid = False
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        free(self.recs)
+        self.recs = NULL
+        self.capacity = 0
+        self.num_recs = 0
+
+    def __len__(self):
+        return self.num_recs
+
+    def _column(self, typecode, field):
+        if field and not self.fields & field:
+            raise PyverbsUserError(f'{create_wc_flags_to_str(field)}was not '
+                                   f'collected')
+        return clone(array(typecode), self.num_recs, False)
+
+    @property
+    def capacity(self):
+        return self.capacity
+
+    @property
+    def fields(self):
+        return self.fields
+
+    def all_success(self):
+        """
+        Checks whether all the polled completions have a success status.
+        :return: True if no completion has an error status
+        """
+        cdef int i
+        for i in range(self.num_recs):
+            if self.recs[i].status != e.IBV_WC_SUCCESS:
+                return False
+        return True
+
+    @property
+    def wr_id(self):
+        cdef int i
+        cdef array col = self._column('Q', 0)
+        for i in range(self.num_recs):
+            col.data.as_ulonglongs[i] = self.recs[i].wr_id
+        return col
+
+    @property
+    def status(self):
+        cdef int i
+        cdef array col = self._column('I', 0)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].status
+        return col
+
+    @property
+    def opcode(self):
+        cdef int i
+        cdef array col = self._column('I', 0)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].opcode
+        return col
+
+    @property
+    def vendor_err(self):
+        cdef int i
+        cdef array col = self._column('I', 0)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].vendor_err
+        return col
+
+    @property
+    def wc_flags(self):
+        cdef int i
+        cdef array col = self._column('I', 0)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].wc_flags
+        return col
+
+    @property
+    def byte_len(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_BYTE_LEN)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].byte_len
+        return col
+
+    @property
+    def imm_data(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_IMM)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].imm_data
+        return col
+
+    @property
+    def qp_num(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_QP_NUM)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].qp_num
+        return col
+
+    @property
+    def src_qp(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_SRC_QP)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].src_qp
+        return col
+
+    @property
+    def slid(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_SLID)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].slid
+        return col
+
+    @property
+    def sl(self):
+        cdef int i
+        cdef array col = self._column('B', e.IBV_WC_EX_WITH_SL)
+        for i in range(self.num_recs):
+            col.data.as_uchars[i] = self.recs[i].sl
+        return col
+
+    @property
+    def dlid_path_bits(self):
+        cdef int i
+        cdef array col = self._column('B', e.IBV_WC_EX_WITH_DLID_PATH_BITS)
+        for i in range(self.num_recs):
+            col.data.as_uchars[i] = self.recs[i].dlid_path_bits
+        return col
+
+    @property
+    def completion_ts(self):
+        cdef int i
+        cdef array col = self._column('Q', e.IBV_WC_EX_WITH_COMPLETION_TIMESTAMP)
+        for i in range(self.num_recs):
+            col.data.as_ulonglongs[i] = self.recs[i].completion_ts
+        return col
+
+    @property
+    def completion_wallclock_ns(self):
+        cdef int i
+        cdef array col = self._column('Q', e.IBV_WC_EX_WITH_COMPLETION_TIMESTAMP_WALLCLOCK)
+        for i in range(self.num_recs):
+            col.data.as_ulonglongs[i] = self.recs[i].completion_wallclock_ns
+        return col
+
+    @property
+    def cvlan(self):
+        cdef int i
+        cdef array col = self._column('H', e.IBV_WC_EX_WITH_CVLAN)
+        for i in range(self.num_recs):
+            col.data.as_ushorts[i] = self.recs[i].cvlan
+        return col
+
+    @property
+    def flow_tag(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_FLOW_TAG)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].flow_tag
+        return col
+
+    @property
+    def tm_tag(self):
+        cdef int i
+        cdef array col = self._column('Q', e.IBV_WC_EX_WITH_TM_INFO)
+        for i in range(self.num_recs):
+            col.data.as_ulonglongs[i] = self.recs[i].tm_tag
+        return col
+
+    @property
+    def tm_priv(self):
+        cdef int i
+        cdef array col = self._column('I', e.IBV_WC_EX_WITH_TM_INFO)
+        for i in range(self.num_recs):
+            col.data.as_uints[i] = self.recs[i].tm_priv
+        return col
+
+    @property
+    def sgid(self):
+        """
+        The raw source GIDs (bytes), None for completions without one.
+        Only collected by provider CQs that support it.
+        """
+        cdef int i
+        if not self.has_sgid:
+            raise PyverbsUserError('SGID was not collected')
+        return [(<char*>self.recs[i].sgid)[:16] if self.recs[i].sgid_valid
+                else None for i in range(self.num_recs)]
+
+
 cdef class WC(PyverbsObject):
     def __init__(self, wr_id=0, status=0, opcode=0, vendor_err=0, byte_len=0,
                  qp_num=0, src_qp=0, imm_data=0, wc_flags=0, pkey_index=0,
@@ -569,6 +1232,218 @@ cdef class WC(PyverbsObject):
             print_format.format('dlid path bits', self.dlid_path_bits)
 
 
+cdef class WCBatch(PyverbsCM):
+    """
+    A preallocated, reusable array of ibv_wc structs, filled in place by
+    CQ.poll_batch(), CMID.get_recv_comp() and CMID.get_send_comp().
+    The polled completions are exposed either as columns (array.array
+    objects) or as WCView objects. A WCView is created once per slot when the
+    batch is allocated, so iterating a batch in a poll loop does not allocate
+    a WC object per completion. A view reflects the content of its slot, hence
+    it's only valid until the next poll into the same batch.
+    """
+    def __init__(self, capacity):
+        """
+        Allocates room for <capacity> work completions.
+        :param capacity: Maximum number of completions the batch can hold
+        :return: A WCBatch object
+        """
+        super().__init__()
+        if capacity <= 0:
+            raise PyverbsUserError(f'Invalid WCBatch capacity {capacity}')
+        self.wcs = <v.ibv_wc*>calloc(capacity, sizeof(v.ibv_wc))
+        if self.wcs == NULL:
+            raise PyverbsError('Failed to allocate WC array')
+        self.capacity = capacity
+        self.num_wcs = 0
+        self.views = []
+        cdef WCView view
+        cdef int i
+        for i in range(capacity):
+            view = WCView()
+            view.wc = &self.wcs[i]
+            self.views.append(view)
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        if self.views:
+            # Views may outlive the batch, make sure they don't point to the
+            # freed memory.
+            for view in self.views:
+                (<WCView>view).wc = NULL
+            self.views = None
+        free(self.wcs)
+        self.wcs = NULL
+        self.capacity = 0
+        self.num_wcs = 0
+
+    def __len__(self):
+        return self.num_wcs
+
+    def __getitem__(self, idx):
+        """
+        Returns the WCView of the completion at index <idx>.
+        """
+        cdef int i = idx
+        if i < 0:
+            i += self.num_wcs
+        if i < 0 or i >= self.num_wcs:
+            raise IndexError(f'WC index {idx} out of range')
+        return self.views[i]
+
+    @property
+    def capacity(self):
+        return self.capacity
+
+    @property
+    def wr_id(self):
+        cdef int i
+        cdef array col = clone(array('Q'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_ulonglongs[i] = self.wcs[i].wr_id
+        return col
+
+    @property
+    def status(self):
+        cdef int i
+        cdef array col = clone(array('I'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_uints[i] = self.wcs[i].status
+        return col
+
+    @property
+    def opcode(self):
+        cdef int i
+        cdef array col = clone(array('I'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_uints[i] = self.wcs[i].opcode
+        return col
+
+    @property
+    def byte_len(self):
+        cdef int i
+        cdef array col = clone(array('I'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_uints[i] = self.wcs[i].byte_len
+        return col
+
+    @property
+    def imm_data(self):
+        cdef int i
+        cdef array col = clone(array('I'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_uints[i] = self.wcs[i].imm_data
+        return col
+
+    @property
+    def qp_num(self):
+        cdef int i
+        cdef array col = clone(array('I'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_uints[i] = self.wcs[i].qp_num
+        return col
+
+    @property
+    def wc_flags(self):
+        cdef int i
+        cdef array col = clone(array('I'), self.num_wcs, False)
+        for i in range(self.num_wcs):
+            col.data.as_uints[i] = self.wcs[i].wc_flags
+        return col
+
+    def all_success(self):
+        """
+        Checks whether all the polled completions have a success status.
+        :return: True if no completion has an error status
+        """
+        cdef int i
+        for i in range(self.num_wcs):
+            if self.wcs[i].status != e.IBV_WC_SUCCESS:
+                return False
+        return True
+
+
+cdef class WCView(PyverbsObject):
+    """
+    A read-only view of a single work completion slot in a WCBatch. It exposes
+    the same attributes as WC without copying the completion.
+    """
+    cdef v.ibv_wc *_get_wc(self) except NULL:
+        if self.wc == NULL:
+            raise PyverbsError('The WCBatch of this view was closed')
+        return self.wc
+
+    def to_wc(self):
+        """
+        Copies the completion into a new WC object which remains valid after
+        the slot is reused.
+        :return: A WC object
+        """
+        cdef v.ibv_wc *wc = self._get_wc()
+        return WC(wr_id=wc.wr_id, status=wc.status, opcode=wc.opcode,
+                  vendor_err=wc.vendor_err, byte_len=wc.byte_len,
+                  qp_num=wc.qp_num, src_qp=wc.src_qp, imm_data=wc.imm_data,
+                  wc_flags=wc.wc_flags, pkey_index=wc.pkey_index,
+                  slid=wc.slid, sl=wc.sl, dlid_path_bits=wc.dlid_path_bits)
+
+    @property
+    def wr_id(self):
+        return self._get_wc().wr_id
+
+    @property
+    def status(self):
+        return self._get_wc().status
+
+    @property
+    def opcode(self):
+        return self._get_wc().opcode
+
+    @property
+    def vendor_err(self):
+        return self._get_wc().vendor_err
+
+    @property
+    def byte_len(self):
+        return self._get_wc().byte_len
+
+    @property
+    def qp_num(self):
+        return self._get_wc().qp_num
+
+    @property
+    def src_qp(self):
+        return self._get_wc().src_qp
+
+    @property
+    def wc_flags(self):
+        return self._get_wc().wc_flags
+
+    @property
+    def pkey_index(self):
+        return self._get_wc().pkey_index
+
+    @property
+    def slid(self):
+        return self._get_wc().slid
+
+    @property
+    def sl(self):
+        return self._get_wc().sl
+
+    @property
+    def imm_data(self):
+        return self._get_wc().imm_data
+
+    @property
+    def dlid_path_bits(self):
+        return self._get_wc().dlid_path_bits
+
+    def __str__(self):
+        return str(self.to_wc())
+
+
 cdef class PollCqAttr(PyverbsObject):
     @property
     def comp_mask(self):
@@ -3,7 +3,7 @@
 
 #cython: language_level=3
 
-from .base cimport PyverbsObject, PyverbsCM
+from .base cimport PyverbsObject, PyverbsCM, DepRegistry
 cimport pyverbs.libibverbs as v
 
 
@@ -12,21 +12,14 @@ cdef class Context(PyverbsCM):
     cdef v.ibv_device *device
     cdef object name
     cdef add_ref(self, obj)
-    cdef object pds
-    cdef object dms
-    cdef object ccs
-    cdef object cqs
-    cdef object qps
-    cdef object xrcds
-    cdef object vars
-    cdef object uars
-    cdef object pps
-    cdef object sched_nodes
-    cdef object sched_leafs
-    cdef object dr_domains
-    cdef object wqs
-    cdef object rwq_ind_tbls
-    cdef object crypto_logins
+    cdef DepRegistry deps
+    cdef object query_cache
+    cdef unsigned long cache_hits
+    cdef unsigned long cache_misses
+    cdef unsigned long cache_invalidations
+    cdef cache_lookup(self, unsigned int port_num, kind, key)
+    cdef cache_store(self, unsigned int port_num, kind, key, val)
+    cdef invalidate_cache(self, event_type, unsigned int port_num)
 
 cdef class DeviceAttr(PyverbsObject):
     cdef v.ibv_device_attr dev_attr
@@ -64,7 +57,7 @@ cdef class AllocDmAttr(PyverbsObject):
 
 cdef class DM(PyverbsCM):
     cdef v.ibv_dm *dm
-    cdef object dm_mrs
+    cdef DepRegistry deps
     cdef object context
     cdef object _is_imported
     cdef add_ref(self, obj)
@@ -6,13 +6,12 @@ Device module introduces the Context and DeviceAttr class.
 It allows user to open an IB device (using Context(name=<name>) and query it,
 which returns a DeviceAttr object.
 """
-import weakref
 
 from .pyverbs_error import PyverbsRDMAError, PyverbsError
 from pyverbs.cq cimport CQEX, CQ, CompChannel
 from .pyverbs_error import PyverbsUserError
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.wq cimport WQ, RwqIndTable
 cimport pyverbs.libibverbs_enums as e
 cimport pyverbs.libibverbs as v
@@ -23,6 +22,7 @@ from pyverbs.addr cimport GID
 from pyverbs.mr import DMMR
 from pyverbs.pd cimport PD
 from pyverbs.qp cimport QP
+from cpython.bytes cimport PyBytes_FromStringAndSize, PyBytes_AS_STRING
 from libc.stdlib cimport free, malloc
 from libc.string cimport memset
 from libc.stdint cimport uint64_t
@@ -33,6 +33,16 @@ from pyverbs.utils import gid_str
 cdef extern from 'endian.h':
     unsigned long be64toh(unsigned long host_64bits);
 
+# The kinds of cached port query results made stale by each async event
+CACHE_INVALIDATING_EVENTS = {
+    e.IBV_EVENT_PORT_ACTIVE: ('port',),
+    e.IBV_EVENT_PORT_ERR: ('port',),
+    e.IBV_EVENT_LID_CHANGE: ('port',),
+    e.IBV_EVENT_SM_CHANGE: ('port',),
+    e.IBV_EVENT_GID_CHANGE: ('gid', 'gid_type'),
+    e.IBV_EVENT_PKEY_CHANGE: ('pkey',),
+}
+
 
 class Device(PyverbsObject):
     """
@@ -100,6 +110,9 @@ cdef class Context(PyverbsCM):
             * *cmd_fd*
               A command FD. If passed, the device will be imported from the
               given cmd_fd using ibv_import_device.
+            * *query_cache*
+              If True, the results of query_device(), query_port(),
+              query_gid(), query_gid_type() and query_pkey() are cached.
         :return: None
         """
         cdef int count
@@ -107,21 +120,9 @@ cdef class Context(PyverbsCM):
         cdef CMID cmid
 
         super().__init__()
-        self.pds = weakref.WeakSet()
-        self.dms = weakref.WeakSet()
-        self.ccs = weakref.WeakSet()
-        self.cqs = weakref.WeakSet()
-        self.qps = weakref.WeakSet()
-        self.xrcds = weakref.WeakSet()
-        self.vars = weakref.WeakSet()
-        self.uars = weakref.WeakSet()
-        self.pps = weakref.WeakSet()
-        self.sched_nodes = weakref.WeakSet()
-        self.sched_leafs = weakref.WeakSet()
-        self.dr_domains = weakref.WeakSet()
-        self.wqs = weakref.WeakSet()
-        self.rwq_ind_tbls = weakref.WeakSet()
-        self.crypto_logins = weakref.WeakSet()
+        self.deps = DepRegistry()
+        if kwargs.get('query_cache'):
+            self.query_cache = {}
 
         self.name = kwargs.get('name')
         provider_attr = kwargs.get('attr')
@@ -156,8 +157,9 @@ cdef class Context(PyverbsCM):
                     if self.context == NULL:
                         raise PyverbsRDMAErrno('Failed to open device {dev}'.
                                                format(dev=self.name))
-                    self.logger.debug('Context: opened device {dev}'.
-                                      format(dev=self.name))
+                    if self.debug_enabled():
+                        self.logger.debug('Context: opened device {dev}'.
+                                          format(dev=self.name))
                     break
             else:
                 raise PyverbsRDMAError('Failed to find device {dev}'.
@@ -176,9 +178,10 @@ cdef class Context(PyverbsCM):
         if self.context != NULL:
             if self.logger:
                 self.logger.debug('Closing Context')
-            close_weakrefs([self.qps, self.crypto_logins, self.rwq_ind_tbls, self.wqs, self.ccs, self.cqs,
-                            self.dms, self.pds, self.xrcds, self.vars, self.sched_leafs,
-                            self.sched_nodes, self.dr_domains])
+            close_deps(self.deps, ('qps', 'crypto_logins', 'rwq_ind_tbls',
+                                   'wqs', 'ccs', 'cqs', 'dms', 'pds', 'xrcds',
+                                   'vars', 'sched_leafs', 'sched_nodes',
+                                   'dr_domains'))
             rc = v.ibv_close_device(self.context)
             if rc != 0:
                 raise PyverbsRDMAErrno(f'Failed to close device {self.name}')
@@ -192,17 +195,126 @@ cdef class Context(PyverbsCM):
     def num_comp_vectors(self):
         return self.context.num_comp_vectors
 
+    @property
+    def numa_node(self):
+        """
+        The NUMA node of the device, or -1 if it has no NUMA affinity
+        """
+        return get_device_numa_node(self.name)
+
+    @property
+    def local_cpus(self):
+        """
+        The CPUs local to the device, e.g. for pinning polling threads using
+        os.sched_setaffinity()
+        """
+        return get_device_local_cpus(self.name)
+
+    cdef cache_lookup(self, unsigned int port_num, kind, key):
+        """
+        :return: The cached result of a query, or None if it's not cached.
+                 Device queries are cached under port 0.
+        """
+        entries = self.query_cache.get(port_num)
+        if entries is not None:
+            entries = entries.get(kind)
+            if entries is not None:
+                val = entries.get(key)
+                if val is not None:
+                    self.cache_hits += 1
+                    return val
+        self.cache_misses += 1
+        return None
+
+    cdef cache_store(self, unsigned int port_num, kind, key, val):
+        entries = self.query_cache.setdefault(port_num, {})
+        entries.setdefault(kind, {})[key] = val
+
+    cdef invalidate_cache(self, event_type, unsigned int port_num):
+        """
+        Drops the cached query results made stale by an async event.
+        """
+        if event_type == e.IBV_EVENT_DEVICE_FATAL:
+            self.invalidate_query_cache()
+            return
+        kinds = CACHE_INVALIDATING_EVENTS.get(event_type)
+        entries = self.query_cache.get(port_num)
+        if kinds is None or entries is None:
+            return
+        for kind in kinds:
+            self.cache_invalidations += len(entries.pop(kind, ()))
+
+    def invalidate_query_cache(self, port_num=None):
+        """
+        Drops cached query results. Needed only for changes that aren't
+        reported by get_async_event().
+        :param port_num: If set, only the results of this port's queries are
+                         dropped
+        :return: None
+        """
+        if self.query_cache is None:
+            return
+        if port_num is None:
+            ports = list(self.query_cache.values())
+            self.query_cache.clear()
+        else:
+            ports = [self.query_cache.pop(port_num, {})]
+        for entries in ports:
+            self.cache_invalidations += sum(len(kind_entries) for kind_entries
+                                            in entries.values())
+
+    @property
+    def query_cache(self):
+        """
+        Whether the results of device, port, GID and P_Key queries are
+        cached. Cached port results are dropped when get_async_event()
+        reports an event that changes them.
+        """
+        return self.query_cache is not None
+
+    @query_cache.setter
+    def query_cache(self, val):
+        if not val:
+            self.query_cache = None
+        elif self.query_cache is None:
+            self.query_cache = {}
+
+    @property
+    def query_cache_stats(self):
+        """
+        The query cache's hits, misses, invalidated entries and number of
+        cached entries
+        """
+        entries = 0
+        if self.query_cache is not None:
+            entries = sum(len(kind_entries)
+                          for port_entries in self.query_cache.values()
+                          for kind_entries in port_entries.values())
+        return {'hits': self.cache_hits, 'misses': self.cache_misses,
+                'invalidations': self.cache_invalidations, 'entries': entries}
+
     def query_device(self):
         """
         Queries the device's attributes.
         :return: A DeviceAttr object which holds the device's attributes as
                  reported by the hardware.
         """
+        cdef DeviceAttr cached
         dev_attr = DeviceAttr()
+        if self.query_cache is not None:
+            cached = self.cache_lookup(0, 'device', 0)
+            if cached is not None:
+                dev_attr.dev_attr = cached.dev_attr
+                return dev_attr
         rc = v.ibv_query_device(self.context, &dev_attr.dev_attr)
         if rc != 0:
             raise PyverbsRDMAError('Failed to query device {name}'.
                                    format(name=self.name), rc)
+        if self.query_cache is not None:
+            # Cache a copy, the returned object may be modified by the user
+            cached = DeviceAttr()
+            cached.dev_attr = dev_attr.dev_attr
+            self.cache_store(0, 'device', 0, cached)
         return dev_attr
 
     def query_device_ex(self, QueryDeviceExInput ex_input = None):
@@ -223,9 +335,15 @@ cdef class Context(PyverbsCM):
 
     def query_pkey(self, unsigned int port_num, int index):
         cdef uint16_t pkey
+        if self.query_cache is not None:
+            cached = self.cache_lookup(port_num, 'pkey', index)
+            if cached is not None:
+                return cached
         rc = v.ibv_query_pkey(self.context, port_num, index, &pkey)
         if rc != 0:
             raise PyverbsRDMAError(f'Failed to query pkey {index} of port {port_num}')
+        if self.query_cache is not None:
+            self.cache_store(port_num, 'pkey', index, pkey)
         return pkey
 
     def get_pkey_index(self, unsigned int port_num, int pkey):
@@ -235,19 +353,35 @@ cdef class Context(PyverbsCM):
         return idx
 
     def query_gid(self, unsigned int port_num, int index):
+        cdef GID cached
         gid = GID()
+        if self.query_cache is not None:
+            cached = self.cache_lookup(port_num, 'gid', index)
+            if cached is not None:
+                gid.gid = cached.gid
+                return gid
         rc = v.ibv_query_gid(self.context, port_num, index, &gid.gid)
         if rc != 0:
             raise PyverbsRDMAError('Failed to query gid {idx} of port {port}'.
                                                                    format(idx=index, port=port_num))
+        if self.query_cache is not None:
+            cached = GID()
+            cached.gid = gid.gid
+            self.cache_store(port_num, 'gid', index, cached)
         return gid
 
     def query_gid_type(self, unsigned int port_num, unsigned int index):
         cdef v.ibv_gid_type_sysfs gid_type
+        if self.query_cache is not None:
+            cached = self.cache_lookup(port_num, 'gid_type', index)
+            if cached is not None:
+                return cached
         rc = v.ibv_query_gid_type(self.context, port_num, index, &gid_type)
         if rc != 0:
             raise PyverbsRDMAErrno('Failed to query gid type of port {p} and gid index {g}'
                                    .format(p=port_num, g=index))
+        if self.query_cache is not None:
+            self.cache_store(port_num, 'gid_type', index, gid_type)
         return gid_type
 
     def query_port(self, unsigned int port_num):
@@ -256,11 +390,21 @@ cdef class Context(PyverbsCM):
         :param port_num: Port number to query
         :return: PortAttr object on success
         """
+        cdef PortAttr cached
         port_attrs = PortAttr()
+        if self.query_cache is not None:
+            cached = self.cache_lookup(port_num, 'port', 0)
+            if cached is not None:
+                port_attrs.attr = cached.attr
+                return port_attrs
         rc = v.ibv_query_port(self.context, port_num, &port_attrs.attr)
         if rc != 0:
             raise PyverbsRDMAError('Failed to query port {p}'.
                                    format(p=port_num), rc)
+        if self.query_cache is not None:
+            cached = PortAttr()
+            cached.attr = port_attrs.attr
+            self.cache_store(port_num, 'port', 0, cached)
         return port_attrs
 
     def query_gid_table(self, size_t max_entries, uint32_t flags=0):
@@ -330,29 +474,34 @@ cdef class Context(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, PD):
-            self.pds.add(obj)
+            self.deps.add('pds', obj)
         elif isinstance(obj, DM):
-            self.dms.add(obj)
+            self.deps.add('dms', obj)
         elif isinstance(obj, CompChannel):
-            self.ccs.add(obj)
+            self.deps.add('ccs', obj)
         elif isinstance(obj, CQ) or isinstance(obj, CQEX):
-            self.cqs.add(obj)
+            self.deps.add('cqs', obj)
         elif isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         elif isinstance(obj, XRCD):
-            self.xrcds.add(obj)
+            self.deps.add('xrcds', obj)
         elif isinstance(obj, WQ):
-            self.wqs.add(obj)
+            self.deps.add('wqs', obj)
         elif isinstance(obj, RwqIndTable):
-            self.rwq_ind_tbls.add(obj)
+            self.deps.add('rwq_ind_tbls', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
     def get_async_event(self):
-        event = AsyncEvent()
-        rc = v.ibv_get_async_event(self.context, &event.event)
+        cdef AsyncEvent event = AsyncEvent()
+        cdef int rc
+        with nogil:
+            rc = v.ibv_get_async_event(self.context, &event.event)
         if rc != 0:
             raise PyverbsRDMAError(f'Failed to get async event', rc)
+        if self.query_cache is not None:
+            self.invalidate_cache(event.event.event_type,
+                                  event.event.element.port_num)
         return event
 
     @property
@@ -768,6 +917,35 @@ cdef class AllocDmAttr(PyverbsObject):
         self.alloc_dm_attr.comp_mask = val
 
 
+cdef check_dm_regions(regions, size_t buf_length):
+    """
+    Verifies that the (dm_offset, length) regions are valid and fit in a host
+    buffer of <buf_length> bytes, before any of them is copied.
+    """
+    total = 0
+    for dm_offset, length in regions:
+        if dm_offset < 0 or length < 0:
+            raise PyverbsUserError(f'Invalid DM region: offset {dm_offset}, '
+                                   f'length {length}')
+        total += length
+    if total > buf_length:
+        raise PyverbsUserError(f'The DM regions of {total} bytes exceed the '
+                               f'buffer of {buf_length} bytes')
+
+
+cdef byte_view(buf, writable=False):
+    """
+    Returns a flat byte view of an object supporting the buffer protocol, of
+    any item type.
+    """
+    view = memoryview(buf)
+    if not view.c_contiguous:
+        raise PyverbsUserError('The buffer must be contiguous')
+    if writable and view.readonly:
+        raise PyverbsUserError('The buffer must be writable')
+    return view.cast('B')
+
+
 cdef class DM(PyverbsCM):
     def __init__(self, Context context, AllocDmAttr dm_attr=None, **kwargs):
         """
@@ -782,7 +960,7 @@ cdef class DM(PyverbsCM):
         :return: A DM object on success
         """
         super().__init__()
-        self.dm_mrs = weakref.WeakSet()
+        self.deps = DepRegistry()
 
         dm_handle = kwargs.get('handle')
         if dm_handle is not None:
@@ -820,7 +998,7 @@ cdef class DM(PyverbsCM):
         if self.dm != NULL:
             if self.logger:
                 self.logger.debug('Closing DM')
-            close_weakrefs([self.dm_mrs])
+            close_deps(self.deps, ('dm_mrs',))
             if not self._is_imported:
                 rc = v.ibv_free_dm(self.dm)
                 if rc != 0:
@@ -830,25 +1008,104 @@ cdef class DM(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, DMMR):
-            self.dm_mrs.add(obj)
+            self.deps.add('dm_mrs', obj)
 
     def copy_to_dm(self, dm_offset, data, length):
+        """
+        Copies data to the device memory.
+        :param dm_offset: Offset in the DM to copy to
+        :param data: The data to copy, a str or any object supporting the
+                     buffer protocol
+        :param length: Number of bytes to copy
+        :return: None
+        """
+        cdef const unsigned char[::1] src
+        if isinstance(data, str):
+            data = data.encode()
+        src = byte_view(data)
+        if length < 0 or length > src.shape[0]:
+            raise PyverbsUserError(f'Invalid length {length} for data of '
+                                   f'{src.shape[0]} bytes')
+        if length == 0:
+            return
         rc = v.ibv_memcpy_to_dm(<v.ibv_dm *>self.dm, <uint64_t>dm_offset,
-                                <char *>data, <size_t>length)
+                                <void *>&src[0], <size_t>length)
         if rc != 0:
             raise PyverbsRDMAError('Failed to copy to dm', rc)
 
     def copy_from_dm(self, dm_offset, length):
-        cdef char *data =<char*>malloc(length)
-        memset(data, 0, length)
-        rc = v.ibv_memcpy_from_dm(<void *>data, <v.ibv_dm *>self.dm,
-                                  <uint64_t>dm_offset, <size_t>length)
+        """
+        Copies data from the device memory.
+        :param dm_offset: Offset in the DM to copy from
+        :param length: Number of bytes to copy
+        :return: The data as bytes
+        """
+        # The data is copied directly into the returned bytes object
+        res = PyBytes_FromStringAndSize(NULL, length)
+        rc = v.ibv_memcpy_from_dm(<void *>PyBytes_AS_STRING(res),
+                                  <v.ibv_dm *>self.dm, <uint64_t>dm_offset,
+                                  <size_t>length)
         if rc != 0:
             raise PyverbsRDMAError('Failed to copy from dm', rc)
-        res = data[:length]
-        free(data)
         return res
 
+    def copy_to_dm_vec(self, data, regions):
+        """
+        Scatters data to several regions of the device memory, without
+        intermediate copies. Consecutive chunks of <data> are copied to the
+        regions in order.
+        :param data: A contiguous object supporting the buffer protocol, e.g.
+                     bytes or an array of any type
+        :param regions: A list of (dm_offset, length) tuples, lengths are in
+                        bytes
+        :return: The number of bytes copied
+        """
+        cdef const unsigned char[::1] src = byte_view(data)
+        cdef size_t pos = 0
+        cdef int rc
+        regions = list(regions)
+        check_dm_regions(regions, src.shape[0])
+        for dm_offset, length in regions:
+            if length == 0:
+                continue
+            rc = v.ibv_memcpy_to_dm(self.dm, <uint64_t>dm_offset,
+                                    <void *>&src[pos], <size_t>length)
+            if rc != 0:
+                raise PyverbsRDMAError(f'Failed to copy to dm offset '
+                                       f'{dm_offset}', rc)
+            pos += length
+        return pos
+
+    def copy_from_dm_into(self, buffer, regions=None, dm_offset=0):
+        """
+        Gathers several regions of the device memory into a writable buffer,
+        without intermediate copies. The regions are copied to consecutive
+        chunks of <buffer> in order.
+        :param buffer: A writable, contiguous object supporting the buffer
+                       protocol, e.g. a bytearray, an array or an MR
+        :param regions: A list of (dm_offset, length) tuples, lengths are in
+                        bytes. If None, the whole buffer is filled from
+                        <dm_offset>.
+        :param dm_offset: Offset in the DM to copy from if <regions> is None
+        :return: The number of bytes copied
+        """
+        cdef unsigned char[::1] dst = byte_view(buffer, writable=True)
+        cdef size_t pos = 0
+        cdef int rc
+        regions = [(dm_offset, dst.shape[0])] if regions is None \
+            else list(regions)
+        check_dm_regions(regions, dst.shape[0])
+        for offset, length in regions:
+            if length == 0:
+                continue
+            rc = v.ibv_memcpy_from_dm(&dst[pos], self.dm, <uint64_t>offset,
+                                      <size_t>length)
+            if rc != 0:
+                raise PyverbsRDMAError(f'Failed to copy from dm offset '
+                                       f'{offset}', rc)
+            pos += length
+        return pos
+
     @property
     def handle(self):
         return self.dm.handle
@@ -1011,6 +1268,13 @@ cdef class AsyncEvent(PyverbsObject):
     def event_type(self):
         return self.event.event_type
 
+    @property
+    def port_num(self):
+        """
+        The port of a port event
+        """
+        return self.event.element.port_num
+
     def __str__(self):
         print_format = '{:<24}: {:<20}\n'
         return print_format.format('Event Type', translate_event_type(
@@ -1218,6 +1482,52 @@ def get_device_list():
     return devices
 
 
+def get_device_numa_node(name):
+    """
+    :param name: The IB device's name
+    :return: The NUMA node of the device as reported by sysfs, or -1 if it
+             has no NUMA affinity
+    """
+    name = name.decode() if isinstance(name, bytes) else name
+    try:
+        with open(f'/sys/class/infiniband/{name}/device/numa_node') as f:
+            return int(f.read())
+    except FileNotFoundError:
+        return -1
+
+
+def get_device_local_cpus(name):
+    """
+    :param name: The IB device's name
+    :return: A sorted list of the CPUs local to the device as reported by
+             sysfs. All online CPUs are returned if the device has no NUMA
+             affinity.
+    """
+    name = name.decode() if isinstance(name, bytes) else name
+    try:
+        with open(f'/sys/class/infiniband/{name}/device/local_cpulist') as f:
+            cpulist = f.read().strip()
+    except FileNotFoundError:
+        with open('/sys/devices/system/cpu/online') as f:
+            cpulist = f.read().strip()
+    return parse_cpulist(cpulist)
+
+
+def parse_cpulist(cpulist):
+    """
+    Parses a list of CPUs in sysfs format (e.g. '0-3,8-11').
+    :param cpulist: The CPU list string
+    :return: A sorted list of CPU numbers
+    """
+    cpus = []
+    for item in cpulist.split(','):
+        if not item:
+            continue
+        first, _, last = item.partition('-')
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+
 def rdma_get_devices():
     """
     Get the RDMA devices.
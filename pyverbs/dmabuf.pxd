@@ -3,6 +3,8 @@
 
 #cython: language_level=3
 
+from pyverbs.base cimport DepRegistry
+
 cdef class DmaBuf:
     cdef int drm_fd
     cdef int handle
@@ -10,6 +12,6 @@ cdef class DmaBuf:
     cdef unsigned long size
     cdef unsigned long map_offset
     cdef void *dmabuf
-    cdef object dmabuf_mrs
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
     cpdef close(self)
@@ -3,9 +3,8 @@
 
 #cython: language_level=3
 
-import weakref
 
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.base import PyverbsRDMAErrno
 from pyverbs.mr cimport DmaBufMR
 
@@ -30,7 +29,7 @@ cdef class DmaBuf:
         :param gtt: Allocate from GTT (Graphics Translation Table) instead of VRAM.
         :return: The newly created DmaBuf object on success.
         """
-        self.dmabuf_mrs = weakref.WeakSet()
+        self.deps = DepRegistry()
         self.dmabuf = dmabuf_alloc(size, gpu, gtt)
         if self.dmabuf == NULL:
             raise PyverbsRDMAErrno(f'Failed to allocate dmabuf of size {size} on gpu {gpu}')
@@ -44,13 +43,13 @@ cdef class DmaBuf:
     cpdef close(self):
         if self.dmabuf == NULL:
             return None
-        close_weakrefs([self.dmabuf_mrs])
+        close_deps(self.deps, ('dmabuf_mrs',))
         dmabuf_free(<dmabuf *>self.dmabuf)
         self.dmabuf = NULL
 
     cdef add_ref(self, obj):
         if isinstance(obj, DmaBufMR):
-            self.dmabuf_mrs.add(obj)
+            self.deps.add('dmabuf_mrs', obj)
 
     @property
     def drm_fd(self):
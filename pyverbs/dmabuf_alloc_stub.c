@@ -4,10 +4,123 @@
  */
 
 #include <stdio.h>
+#include <stdlib.h>
 #include <stdint.h>
+#include <unistd.h>
 #include <errno.h>
+#include <fcntl.h>
+#include <sys/ioctl.h>
+#include <sys/syscall.h>
 #include "dmabuf_alloc.h"
 
+#ifdef __has_include
+#if __has_include(<linux/udmabuf.h>) && __has_include(<linux/memfd.h>)
+#include <linux/udmabuf.h>
+#include <linux/memfd.h>
+#define HAVE_UDMABUF
+#endif
+#endif
+
+#ifdef HAVE_UDMABUF
+
+#ifndef F_ADD_SEALS
+#define F_ADD_SEALS 1033
+#endif
+#ifndef F_SEAL_SHRINK
+#define F_SEAL_SHRINK 0x0002
+#endif
+
+/*
+ * Without GPU support, dmabufs are allocated from host memory using the
+ * udmabuf driver: a dmabuf is exported from a sealed memfd, which also
+ * serves as the mapping fd. The gpu and gtt arguments are ignored.
+ */
+
+struct dmabuf {
+	int memfd;
+	int fd;
+};
+
+struct dmabuf *dmabuf_alloc(uint64_t size, int gpu, int gtt)
+{
+	struct udmabuf_create create = {};
+	struct dmabuf *dmabuf;
+	long page_size;
+	int dev_fd;
+
+	dmabuf = malloc(sizeof(*dmabuf));
+	if (!dmabuf)
+		return NULL;
+
+	dev_fd = open("/dev/udmabuf", O_RDWR);
+	if (dev_fd < 0) {
+		errno = EOPNOTSUPP;
+		goto out_free;
+	}
+
+	page_size = sysconf(_SC_PAGESIZE);
+	size = (size + page_size - 1) / page_size * page_size;
+	dmabuf->memfd = syscall(SYS_memfd_create, "pyverbs-dmabuf",
+				MFD_ALLOW_SEALING);
+	if (dmabuf->memfd < 0)
+		goto out_close_dev;
+
+	if (ftruncate(dmabuf->memfd, size) ||
+	    fcntl(dmabuf->memfd, F_ADD_SEALS, F_SEAL_SHRINK))
+		goto out_close_memfd;
+
+	create.memfd = dmabuf->memfd;
+	create.flags = UDMABUF_FLAGS_CLOEXEC;
+	create.size = size;
+	dmabuf->fd = ioctl(dev_fd, UDMABUF_CREATE, &create);
+	if (dmabuf->fd < 0)
+		goto out_close_memfd;
+
+	close(dev_fd);
+	return dmabuf;
+
+out_close_memfd:
+	close(dmabuf->memfd);
+out_close_dev:
+	close(dev_fd);
+out_free:
+	free(dmabuf);
+	return NULL;
+}
+
+void dmabuf_free(struct dmabuf *dmabuf)
+{
+	if (!dmabuf)
+		return;
+
+	close(dmabuf->fd);
+	close(dmabuf->memfd);
+	free(dmabuf);
+}
+
+int dmabuf_get_drm_fd(struct dmabuf *dmabuf)
+{
+	if (!dmabuf)
+		return -1;
+
+	return dmabuf->memfd;
+}
+
+int dmabuf_get_fd(struct dmabuf *dmabuf)
+{
+	if (!dmabuf)
+		return -1;
+
+	return dmabuf->fd;
+}
+
+uint64_t dmabuf_get_offset(struct dmabuf *dmabuf)
+{
+	return 0;
+}
+
+#else
+
 struct dmabuf *dmabuf_alloc(uint64_t size, int gpu, int gtt)
 {
 	errno = EOPNOTSUPP;
@@ -37,3 +150,4 @@ uint64_t dmabuf_get_offset(struct dmabuf *dmabuf)
 	return -1;
 }
 
+#endif
@@ -0,0 +1,670 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+"""
+Micro-benchmarks for pyverbs' hot paths.
+Each benchmark is a sub-command, e.g.:
+    perf.py -d rxe0 cq-poll -n 4096 -i 100
+The benchmarks need no remote peer. Completions are generated by flushing
+posted receive WRs, so they can run on any device, including rxe.
+"""
+import statistics
+import threading
+import argparse
+import resource
+import time
+
+from pyverbs.libibverbs_enums import ibv_qp_type, ibv_qp_state, \
+    ibv_qp_attr_mask, ibv_access_flags, _IBV_ADVISE_MR_ADVICE_PREFETCH_WRITE, \
+    _IBV_ADVISE_MR_FLAG_FLUSH
+from pyverbs.odp_prefetch import ODPPrefetcher
+from pyverbs.qp import QP, QPAttr, QPCap, QPInitAttr
+from pyverbs.qp_pool import QPPool
+from pyverbs.addr import AH, AHAttr, GID, GlobalRoute
+from pyverbs.cq import CQ, CompChannel, WC, WCBatch
+import pyverbs.mem_alloc as mem
+from pyverbs.wr import SGE, SGEList, RecvWR, SendWR
+from pyverbs.device import Context
+from pyverbs.mr import MR, DmaBufMR
+from pyverbs.pd import PD
+
+
+class FlushResources:
+    """
+    A RC QP with a single receive buffer. fill() posts <depth> receive WRs and
+    moves the QP to the error state, which produces <depth> flush completions
+    on the CQ. If <with_channel> is set, the CQ is created with a completion
+    channel.
+    """
+    def __init__(self, ctx, port, depth, with_channel=False):
+        self.ctx = ctx
+        self.port = port
+        self.depth = depth
+        self.pd = PD(ctx)
+        self.channel = CompChannel(ctx) if with_channel else None
+        self.cq = CQ(ctx, depth, None, self.channel, 0)
+        self.mr = MR(self.pd, 64, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE)
+        cap = QPCap(max_send_wr=1, max_recv_wr=depth)
+        init_attr = QPInitAttr(qp_type=ibv_qp_type.IBV_QPT_RC, scq=self.cq,
+                               rcq=self.cq, cap=cap)
+        self.qp = QP(self.pd, init_attr)
+        self.recv_wr = RecvWR(num_sge=1,
+                              sg=[SGE(self.mr.buf, 64, self.mr.lkey)])
+
+    def fill(self):
+        self.qp.modify(QPAttr(qp_state=ibv_qp_state.IBV_QPS_RESET),
+                       ibv_qp_attr_mask.IBV_QP_STATE)
+        self.qp.to_init(QPAttr(port_num=self.port))
+        for i in range(self.depth):
+            self.recv_wr.wr_id = i
+            self.qp.post_recv(self.recv_wr)
+        self.qp.modify(QPAttr(qp_state=ibv_qp_state.IBV_QPS_ERR),
+                       ibv_qp_attr_mask.IBV_QP_STATE)
+
+    def close(self):
+        self.qp.close()
+        self.cq.close()
+        if self.channel is not None:
+            self.channel.close()
+        self.mr.close()
+        self.pd.close()
+
+
+class LoopbackUD:
+    """
+    A UD QP that sends to itself. Receive completions are reported on a CQ
+    with a completion channel, send completions on a separate CQ.
+    """
+    UD_QKEY = 0x11111111
+    GRH_SIZE = 40
+
+    def __init__(self, ctx, port, gid_index, depth, msg_size=64):
+        self.depth = depth
+        self.pd = PD(ctx)
+        self.channel = CompChannel(ctx)
+        self.rcq = CQ(ctx, depth, None, self.channel, 0)
+        self.scq = CQ(ctx, depth, None, None, 0)
+        self.mr = MR(self.pd, msg_size + self.GRH_SIZE,
+                     ibv_access_flags.IBV_ACCESS_LOCAL_WRITE)
+        cap = QPCap(max_send_wr=depth, max_recv_wr=depth)
+        init_attr = QPInitAttr(qp_type=ibv_qp_type.IBV_QPT_UD, scq=self.scq,
+                               rcq=self.rcq, cap=cap)
+        qp_attr = QPAttr(port_num=port)
+        qp_attr.qkey = self.UD_QKEY
+        self.qp = QP(self.pd, init_attr, qp_attr)
+        gr = GlobalRoute(dgid=ctx.query_gid(port, gid_index),
+                         sgid_index=gid_index)
+        ah_attr = AHAttr(port_num=port, is_global=1, gr=gr,
+                         dlid=ctx.query_port(port).lid)
+        self.ah = AH(self.pd, attr=ah_attr)
+        self.recv_wr = RecvWR(num_sge=1, sg=[SGE(self.mr.buf,
+                                                 msg_size + self.GRH_SIZE,
+                                                 self.mr.lkey)])
+        self.send_wr = SendWR(num_sge=1, sg=[SGE(self.mr.buf + self.GRH_SIZE,
+                                                 msg_size, self.mr.lkey)])
+        self.send_wr.set_wr_ud(self.ah, self.qp.qp_num, self.UD_QKEY)
+
+    def close(self):
+        self.qp.close()
+        self.ah.close()
+        self.scq.close()
+        self.rcq.close()
+        self.channel.close()
+        self.mr.close()
+        self.pd.close()
+
+
+def drain(poll_func, depth):
+    """
+    Calls poll_func(remaining) until <depth> completions were polled.
+    :return: The elapsed time in seconds
+    """
+    remaining = depth
+    start = time.perf_counter()
+    while remaining:
+        remaining -= poll_func(remaining)
+    return time.perf_counter() - start
+
+
+def report(name, elapsed, count):
+    print(f'{name:<24}{count / elapsed / 1e6:>10.3f} Mcqe/s'
+          f'{elapsed / count * 1e9:>12.1f} ns/cqe')
+
+
+def bench_cq_poll(ctx, args):
+    res = FlushResources(ctx, args.port, args.num)
+    wcs = WCBatch(args.num)
+    poll = lambda n: res.cq.poll(n)[0]
+    poll_batch = lambda n: res.cq.poll_batch(n, wcs)[0]
+
+    def poll_views(n):
+        npolled, ring = res.cq.poll_batch(n)
+        for wc in ring:
+            wc.wr_id
+        return npolled
+
+    results = {'CQ.poll': 0, 'CQ.poll_batch': 0, 'CQ.ring views': 0}
+    try:
+        for _ in range(args.iters):
+            res.fill()
+            results['CQ.poll'] += drain(poll, args.num)
+            res.fill()
+            results['CQ.poll_batch'] += drain(poll_batch, args.num)
+            res.fill()
+            results['CQ.ring views'] += drain(poll_views, args.num)
+    finally:
+        wcs.close()
+        res.close()
+    for name, elapsed in results.items():
+        report(name, elapsed, args.num * args.iters)
+
+
+def reg_worker(pd, addrs, size, barrier, times):
+    barrier.wait()
+    start = time.perf_counter()
+    mrs = [MR(pd, size, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE, address=addr)
+           for addr in addrs]
+    times.append(time.perf_counter() - start)
+    for mr in mrs:
+        mr.close()
+
+
+def bench_reg_mrs(ctx, args):
+    """
+    Registers a single region of <size> GiB using PD.reg_mrs() for each
+    number of workers, splitting it into <chunk> MiB MRs. The region is
+    remapped for each run, so the prefault phase always starts from
+    unpopulated memory.
+    """
+    size = args.size << 30
+    pd = PD(ctx)
+    try:
+        for workers in args.workers:
+            addr = mem.mmap(length=size)
+            try:
+                mrs, stats = pd.reg_mrs([(addr, size)], workers=workers,
+                                        chunk_size=args.chunk << 20,
+                                        prefault=not args.no_prefault)
+                for mr in mrs:
+                    mr.close()
+            finally:
+                mem.munmap(addr, size)
+            print(f'{workers:>3} workers: prefault {stats["prefault_time"]:>7.3f}s'
+                  f'  reg {stats["reg_time"]:>7.3f}s'
+                  f'{size / stats["total_time"] / 2**30:>10.2f} GiB/s')
+    finally:
+        pd.close()
+
+
+def bench_dmabuf_access(ctx, args):
+    """
+    Measures small reads and writes of a DmaBufMR's buffer, and writes
+    through a view of it, compared to a regular MR. The dma-buf is allocated
+    from the GPU, or from host memory using udmabuf when pyverbs is built
+    without DRM support.
+    """
+    pd = PD(ctx)
+    access = ibv_access_flags.IBV_ACCESS_LOCAL_WRITE
+    data = b'a' * args.size
+    mrs = [('MR', MR(pd, args.length, access)),
+           ('DmaBufMR', DmaBufMR(pd, args.length, access, gpu=args.gpu))]
+    try:
+        for name, mr in mrs:
+            offsets = [(i * args.size) % (args.length - args.size)
+                       for i in range(args.iters)]
+            view = mr.view()
+            for op, func in [('write', lambda o: mr.write(data, args.size, o)),
+                             ('read', lambda o: mr.read(args.size, o)),
+                             ('view write', lambda o: view.__setitem__(
+                                 slice(o, o + args.size), data))]:
+                start = time.perf_counter()
+                for offset in offsets:
+                    func(offset)
+                elapsed = time.perf_counter() - start
+                print(f'{name + " " + op:<24}'
+                      f'{elapsed / args.iters * 1e9:>12.1f} ns/op')
+            view.release()
+    finally:
+        for _, mr in mrs:
+            mr.close()
+        pd.close()
+
+
+def bench_odp_prefetch(ctx, args):
+    """
+    Compares the prefetch cost of <iters> sends of <size> bytes, cycling over
+    an ODP MR of <length> bytes, like the ODP tests' traffic: one
+    synchronous ibv_advise_mr() per send vs. an ODPPrefetcher, which
+    coalesces the upcoming sends, advises them asynchronously and skips the
+    ones already prefetched.
+    """
+    access = ibv_access_flags.IBV_ACCESS_LOCAL_WRITE | \
+        ibv_access_flags.IBV_ACCESS_ON_DEMAND
+    advice = _IBV_ADVISE_MR_ADVICE_PREFETCH_WRITE
+    num_slots = args.length // args.size
+    for name in ['sync', 'prefetcher']:
+        pd = PD(ctx)
+        mr = MR(pd, args.length, access)
+        sges = [SGE(mr.buf + (i % num_slots) * args.size, args.size, mr.lkey)
+                for i in range(args.iters)]
+        prefetcher = ODPPrefetcher(pd, advice, lookahead=args.lookahead)
+        start = time.perf_counter()
+        if name == 'sync':
+            for sge in sges:
+                pd.advise_mr(advice, _IBV_ADVISE_MR_FLAG_FLUSH, [sge])
+        else:
+            for sge in sges:
+                prefetcher.submit([sge])
+            for _ in sges:
+                prefetcher.next()
+        elapsed = time.perf_counter() - start
+        print(f'{name:<12}{elapsed / args.iters * 1e9:>12.1f} ns/send')
+        if name == 'prefetcher':
+            print(prefetcher)
+        prefetcher.close()
+        mr.close()
+        pd.close()
+
+
+def event_waiter(res):
+    res.channel.get_cq_event(res.cq)
+    res.cq.ack_events(1)
+
+
+def bench_mt(ctx, args):
+    """
+    Registers <num> MRs of <size> MiB from each of <threads> threads
+    concurrently, while <waiters> other threads are blocked on completion
+    channels. Since the registration and the event wait calls release the
+    GIL, the throughput should scale with the number of threads.
+    """
+    size = args.size << 20
+    page_size = resource.getpagesize()
+    pd = PD(ctx)
+    waiters = [FlushResources(ctx, args.port, 1, with_channel=True)
+               for _ in range(args.waiters)]
+    threads = []
+    for res in waiters:
+        res.cq.req_notify()
+        threads.append(threading.Thread(target=event_waiter, args=(res,)))
+        threads[-1].start()
+    try:
+        for num_threads in args.threads:
+            addrs = [[mem.posix_memalign(size, page_size)
+                      for _ in range(args.num)] for _ in range(num_threads)]
+            barrier = threading.Barrier(num_threads)
+            times = []
+            workers = [threading.Thread(target=reg_worker,
+                                        args=(pd, a, size, barrier, times))
+                       for a in addrs]
+            for t in workers:
+                t.start()
+            for t in workers:
+                t.join()
+            for a in addrs:
+                for addr in a:
+                    mem.free(addr)
+            count = num_threads * args.num
+            elapsed = max(times)
+            print(f'{num_threads:>3} threads: {count / elapsed:>10.1f} reg/s'
+                  f'{count * size / elapsed / 2**30:>10.2f} GiB/s')
+    finally:
+        # Wake up the waiters with a flush completion
+        for res in waiters:
+            res.fill()
+        for t in threads:
+            t.join()
+        for res in waiters:
+            res.close()
+        pd.close()
+
+
+def moderation_receiver(res, num_msgs, send_times, stats):
+    """
+    Waits for completion events, polls the receive CQ and reposts the
+    receive WRs. Records the number of events and per-message latency.
+    """
+    received = 0
+    events = 0
+    latencies = []
+    while received < num_msgs:
+        res.channel.get_cq_event(res.rcq)
+        events += 1
+        res.rcq.req_notify()
+        while True:
+            npolled, wcs = res.rcq.poll_batch(res.depth)
+            if npolled == 0:
+                break
+            now = time.perf_counter()
+            for i in range(received, received + npolled):
+                latencies.append(now - send_times[i])
+                res.qp.post_recv(res.recv_wr)
+            received += npolled
+            stats['received'] = received
+    stats['events'] = events
+    stats['latencies'] = latencies
+
+
+def bench_cq_moderation(ctx, args):
+    """
+    Sends <num> paced messages over a UD loopback QP for each CQ moderation
+    setting and reports the completion event rate and the completion latency
+    seen by an event-driven receiver.
+    """
+    caps = ctx.query_device_ex().cq_mod_caps
+    print(f'Device moderation caps: max_cq_count {caps.max_cq_count}, '
+          f'max_cq_period {caps.max_cq_period} usec')
+    print(f'{"count":>6}{"period":>8}{"events/msg":>12}{"avg usec":>10}'
+          f'{"p99 usec":>10}')
+    for cq_count in args.counts:
+        for cq_period in args.periods:
+            res = LoopbackUD(ctx, args.port, args.gid_index, args.depth)
+            try:
+                res.rcq.modify(cq_count, cq_period)
+                for _ in range(args.depth):
+                    res.qp.post_recv(res.recv_wr)
+                res.rcq.req_notify()
+                send_times = [0.0] * args.num
+                stats = {'received': 0}
+                receiver = threading.Thread(target=moderation_receiver,
+                                            args=(res, args.num, send_times,
+                                                  stats))
+                receiver.start()
+                for i in range(args.num):
+                    # Don't overrun the receive queue
+                    while i - stats['received'] >= args.depth:
+                        time.sleep(0)
+                    send_times[i] = time.perf_counter()
+                    res.qp.post_send(res.send_wr)
+                    while res.scq.poll()[0] == 0:
+                        pass
+                    if args.gap:
+                        time.sleep(args.gap * 1e-6)
+                receiver.join()
+            finally:
+                res.close()
+            lat = sorted(stats['latencies'])
+            p99 = lat[int(len(lat) * 0.99) - 1]
+            print(f'{cq_count:>6}{cq_period:>8}'
+                  f'{stats["events"] / args.num:>12.3f}'
+                  f'{statistics.mean(lat) * 1e6:>10.1f}{p99 * 1e6:>10.1f}')
+
+
+def bench_construct(ctx, args):
+    """
+    Measures the construction (and destruction) time of common pyverbs
+    objects, most of which are created on the data path.
+    """
+    pd = PD(ctx)
+    mr = MR(pd, 4096, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE)
+    sge = SGE(mr.buf, 64, mr.lkey)
+    sgl = SGEList([sge])
+    gid = ctx.query_gid(args.port, 0)
+    objects = {
+        'SGE': lambda: SGE(mr.buf, 64, mr.lkey),
+        'SGEList(1)': lambda: SGEList([(mr.buf, 64, mr.lkey)]),
+        'SendWR': lambda: SendWR(num_sge=1, sg=[sge]),
+        'SendWR(SGEList)': lambda: SendWR(sg=sgl),
+        'RecvWR': lambda: RecvWR(num_sge=1, sg=[sge]),
+        'WC': lambda: WC(),
+        'GID': lambda: GID(),
+        'GlobalRoute': lambda: GlobalRoute(dgid=gid),
+        'AHAttr': lambda: AHAttr(port_num=args.port),
+        'QPCap': lambda: QPCap(),
+        'QPAttr': lambda: QPAttr(),
+        'MR': lambda: MR(pd, 4096,
+                         ibv_access_flags.IBV_ACCESS_LOCAL_WRITE).close(),
+    }
+    try:
+        for name, create in objects.items():
+            num = args.num if name != 'MR' else max(args.num // 100, 1)
+            best = None
+            for _ in range(args.iters):
+                start = time.perf_counter()
+                for _ in range(num):
+                    create()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            print(f'{name:<24}{best / num * 1e9:>12.1f} ns/object')
+    finally:
+        sgl.close()
+        mr.close()
+        pd.close()
+
+
+def bench_deps(ctx, args):
+    """
+    Measures the cost of tracking many dependents of a PD: <num> MRs and
+    QPs are created, every other one is closed explicitly, and the rest are
+    closed along with the PD. QPs are capped by the device's max_qp.
+    """
+    access = ibv_access_flags.IBV_ACCESS_LOCAL_WRITE
+    num_qps = min(args.num, ctx.query_device().max_qp - 16)
+    cap = QPCap(max_send_wr=1, max_recv_wr=1, max_send_sge=1,
+                max_recv_sge=1)
+    for name, num in [('MR', args.num), ('QP', num_qps)]:
+        pd = PD(ctx)
+        cq = CQ(ctx, 16) if name == 'QP' else None
+        if name == 'MR':
+            create = lambda: MR(pd, 64, access)
+        else:
+            attr = QPInitAttr(qp_type=ibv_qp_type.IBV_QPT_RC, scq=cq, rcq=cq,
+                              cap=cap)
+            create = lambda: QP(pd, attr)
+        try:
+            start = time.perf_counter()
+            objs = [create() for _ in range(num)]
+            elapsed = time.perf_counter() - start
+            print(f'{name + " create":<24}{elapsed / num * 1e9:>12.1f} ns/obj')
+            start = time.perf_counter()
+            for obj in objs[::2]:
+                obj.close()
+            elapsed = time.perf_counter() - start
+            print(f'{name + " close":<24}'
+                  f'{elapsed / len(objs[::2]) * 1e9:>12.1f} ns/obj')
+            start = time.perf_counter()
+            pd.close()
+            elapsed = time.perf_counter() - start
+            print(f'{name + " PD teardown":<24}'
+                  f'{elapsed / len(objs[1::2]) * 1e9:>12.1f} ns/obj')
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            print(f'{name + " max RSS":<24}{rss:>12} KB')
+            del objs
+        finally:
+            pd.close()
+            if cq is not None:
+                cq.close()
+
+
+def bench_qp_pool(ctx, args):
+    """
+    Compares the setup rate of <num> loopback RC connections, each a pair of
+    QPs moved to RTS towards each other and then torn down, when the QPs are
+    created and destroyed per connection and when they're taken from and
+    released to a QPPool, which keeps them in the INIT state.
+    """
+    pd = PD(ctx)
+    cq = CQ(ctx, 16)
+    init_attr = QPInitAttr(qp_type=ibv_qp_type.IBV_QPT_RC, scq=cq, rcq=cq,
+                           cap=QPCap(max_recv_wr=16))
+    gr = GlobalRoute(dgid=ctx.query_gid(args.port, args.gid_index),
+                     sgid_index=args.gid_index)
+    ah_attr = AHAttr(port_num=args.port, is_global=1, gr=gr,
+                     dlid=ctx.query_port(args.port).lid)
+    qp_attr = QPAttr(port_num=args.port)
+    qp_attr.ah_attr = ah_attr
+
+    def connect(qps):
+        for qp, remote in [(qps[0], qps[1]), (qps[1], qps[0])]:
+            qp_attr.dest_qp_num = remote.qp_num
+            qp.to_rts(qp_attr)
+
+    init_qp_attr = QPAttr(port_num=args.port)
+    pool = QPPool(pd, init_attr, init_qp_attr, low=args.low, high=args.high)
+    try:
+        for name, get, put in [
+                ('create/destroy', lambda: QP(pd, init_attr, init_qp_attr),
+                 lambda qp: qp.close()),
+                ('QPPool', pool.get, pool.release)]:
+            start = time.perf_counter()
+            for _ in range(args.num):
+                qps = [get(), get()]
+                connect(qps)
+                for qp in qps:
+                    put(qp)
+            elapsed = time.perf_counter() - start
+            print(f'{name:<24}{args.num / elapsed:>10.0f} conn/s'
+                  f'{elapsed / args.num * 1e6:>12.1f} us/conn')
+        print(pool)
+    finally:
+        pool.close()
+        cq.close()
+        pd.close()
+
+
+def bench_query_cache(ctx, args):
+    """
+    Compares the cost of <iters> port, GID and GID type queries, as done when
+    resolving the address of a new peer, with and without the Context's
+    query cache.
+    """
+    for enabled in [False, True]:
+        ctx.query_cache = enabled
+        for name, query in [
+                ('query_port', lambda: ctx.query_port(args.port)),
+                ('query_gid', lambda: ctx.query_gid(args.port,
+                                                    args.gid_index)),
+                ('query_gid_type', lambda: ctx.query_gid_type(
+                    args.port, args.gid_index))]:
+            start = time.perf_counter()
+            for _ in range(args.iters):
+                query()
+            elapsed = time.perf_counter() - start
+            name += ' (cached)' if enabled else ''
+            print(f'{name:<24}{elapsed / args.iters * 1e9:>12.1f} ns/query')
+    print(ctx.query_cache_stats)
+    ctx.query_cache = False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='pyverbs micro-benchmarks')
+    parser.add_argument('-d', '--dev', required=True, help='RDMA device')
+    parser.add_argument('-p', '--port', type=int, default=1, help='Port')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    cq_poll = subparsers.add_parser('cq-poll',
+                                    help='CQ.poll() vs. CQ.poll_batch()')
+    cq_poll.add_argument('-n', '--num', type=int, default=1024,
+                         help='Completions per iteration')
+    cq_poll.add_argument('-i', '--iters', type=int, default=100,
+                         help='Number of iterations')
+    cq_poll.set_defaults(func=bench_cq_poll)
+
+    int_list = lambda x: [int(t) for t in x.split(',')]
+    cq_mod = subparsers.add_parser('cq-moderation',
+                                   help='Event rate vs. latency for CQ '
+                                        'moderation settings')
+    cq_mod.add_argument('-g', '--gid-index', type=int, default=0,
+                        help='GID index')
+    cq_mod.add_argument('-c', '--counts', type=int_list, default=[1, 8, 32],
+                        help='Comma separated cq_count values')
+    cq_mod.add_argument('-t', '--periods', type=int_list, default=[1, 16, 64],
+                        help='Comma separated cq_period values [usec]')
+    cq_mod.add_argument('-n', '--num', type=int, default=10000,
+                        help='Messages per setting')
+    cq_mod.add_argument('--depth', type=int, default=256,
+                        help='Receive queue depth')
+    cq_mod.add_argument('--gap', type=int, default=5,
+                        help='Delay between sends [usec]')
+    cq_mod.set_defaults(func=bench_cq_moderation)
+
+    mt = subparsers.add_parser('mt', help='Concurrent MR registration while '
+                                          'other threads wait for CQ events')
+    mt.add_argument('-t', '--threads', default=[1, 2, 4, 8], type=int_list,
+                    help='Comma separated thread counts')
+    mt.add_argument('-s', '--size', type=int, default=64,
+                    help='MR size in MiB')
+    mt.add_argument('-n', '--num', type=int, default=8,
+                    help='MRs registered per thread')
+    mt.add_argument('-w', '--waiters', type=int, default=4,
+                    help='Threads blocked on completion channels')
+    mt.set_defaults(func=bench_mt)
+
+    reg_mrs = subparsers.add_parser('reg-mrs', help='Parallel registration of '
+                                                    'a large region')
+    reg_mrs.add_argument('-w', '--workers', default=[1, 2, 4, 8],
+                         type=int_list, help='Comma separated worker counts')
+    reg_mrs.add_argument('-s', '--size', type=int, default=4,
+                         help='Region size in GiB')
+    reg_mrs.add_argument('-c', '--chunk', type=int, default=256,
+                         help='MR size in MiB')
+    reg_mrs.add_argument('--no-prefault', action='store_true',
+                         help='Don\'t prefault the region')
+    reg_mrs.set_defaults(func=bench_reg_mrs)
+
+    dmabuf = subparsers.add_parser('dmabuf-access',
+                                   help='Small accesses of DmaBufMR buffers')
+    dmabuf.add_argument('-s', '--size', type=int, default=64,
+                        help='Access size in bytes')
+    dmabuf.add_argument('-l', '--length', type=int, default=1 << 20,
+                        help='MR length in bytes')
+    dmabuf.add_argument('-i', '--iters', type=int, default=100000,
+                        help='Number of accesses')
+    dmabuf.add_argument('-g', '--gpu', type=int, default=0,
+                        help='GPU unit to allocate the dma-buf from')
+    dmabuf.set_defaults(func=bench_dmabuf_access)
+
+    odp = subparsers.add_parser('odp-prefetch',
+                                help='Per-send ODP prefetch vs. ODPPrefetcher')
+    odp.add_argument('-s', '--size', type=int, default=1024,
+                     help='Message size')
+    odp.add_argument('-l', '--length', type=int, default=1 << 22,
+                     help='ODP MR length')
+    odp.add_argument('-i', '--iters', type=int, default=10000,
+                     help='Number of sends')
+    odp.add_argument('-w', '--lookahead', type=int, default=64,
+                     help='Prefetch lookahead depth')
+    odp.set_defaults(func=bench_odp_prefetch)
+
+    construct = subparsers.add_parser('construct',
+                                      help='Construction time of common '
+                                           'objects')
+    construct.add_argument('-n', '--num', type=int, default=100000,
+                           help='Objects per iteration')
+    construct.add_argument('-i', '--iters', type=int, default=5,
+                           help='Number of iterations, the best is reported')
+    construct.set_defaults(func=bench_construct)
+
+    deps = subparsers.add_parser('deps', help='Creation and teardown of many '
+                                              'MRs and QPs of a PD')
+    deps.add_argument('-n', '--num', type=int, default=100000,
+                      help='Number of MRs and QPs')
+    deps.set_defaults(func=bench_deps)
+
+    qp_pool = subparsers.add_parser('qp-pool', help='RC connection setup '
+                                                    'rate with a QPPool')
+    qp_pool.add_argument('-g', '--gid-index', type=int, default=0,
+                         help='GID index')
+    qp_pool.add_argument('-n', '--num', type=int, default=10000,
+                         help='Number of connections')
+    qp_pool.add_argument('--low', type=int, default=8,
+                         help='Low watermark of free QPs')
+    qp_pool.add_argument('--high', type=int, default=32,
+                         help='High watermark of free QPs')
+    qp_pool.set_defaults(func=bench_qp_pool)
+
+    query_cache = subparsers.add_parser('query-cache',
+                                        help='Port and GID queries with and '
+                                             'without the query cache')
+    query_cache.add_argument('-g', '--gid-index', type=int, default=0,
+                             help='GID index')
+    query_cache.add_argument('-i', '--iters', type=int, default=100000,
+                             help='Number of queries')
+    query_cache.set_defaults(func=bench_query_cache)
+
+    args = parser.parse_args()
+    with Context(name=args.dev) as ctx:
+        args.func(ctx, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -229,6 +229,14 @@ cdef extern from 'infiniband/verbs.h':
         unsigned int        flags
         ibv_pd              *parent_domain
 
+    cdef struct ibv_moderate_cq:
+        uint16_t    cq_count
+        uint16_t    cq_period
+
+    cdef struct ibv_modify_cq_attr:
+        uint32_t            attr_mask
+        ibv_moderate_cq     moderate
+
     cdef struct ibv_cq_ex:
         ibv_context         *context
         ibv_comp_channel    *channel
@@ -663,9 +671,9 @@ cdef extern from 'infiniband/verbs.h':
     int ibv_get_pkey_index(ibv_context *context, unsigned int port_num, uint16_t pkey)
     ibv_pd *ibv_alloc_pd(ibv_context *context)
     int ibv_dealloc_pd(ibv_pd *pd)
-    ibv_mr *ibv_reg_mr(ibv_pd *pd, void *addr, size_t length, int access)
+    ibv_mr *ibv_reg_mr(ibv_pd *pd, void *addr, size_t length, int access) nogil
     ibv_mr *ibv_reg_dmabuf_mr(ibv_pd *pd, uint64_t offset, size_t length,
-                              uint64_t iova, int fd, int access)
+                              uint64_t iova, int fd, int access) nogil
     int ibv_rereg_mr(ibv_mr *mr, int flags, ibv_pd *pd, void *addr,
                      size_t length, int access)
     int ibv_dereg_mr(ibv_mr *mr)
@@ -686,14 +694,15 @@ cdef extern from 'infiniband/verbs.h':
     ibv_comp_channel *ibv_create_comp_channel(ibv_context *context)
     int ibv_destroy_comp_channel(ibv_comp_channel *channel)
     int ibv_get_cq_event(ibv_comp_channel *channel, ibv_cq **cq,
-                         void **cq_context)
-    int ibv_req_notify_cq(ibv_cq *cq, int solicited_only)
+                         void **cq_context) nogil
+    int ibv_req_notify_cq(ibv_cq *cq, int solicited_only) nogil
     void ibv_ack_cq_events(ibv_cq *cq, int nevents)
     ibv_cq *ibv_create_cq(ibv_context *context, int cqe, void *cq_context,
                           ibv_comp_channel *channel, int comp_vector)
     int ibv_resize_cq(ibv_cq *cq, int cqe)
+    int ibv_modify_cq(ibv_cq *cq, ibv_modify_cq_attr *attr)
     int ibv_destroy_cq(ibv_cq *cq)
-    int ibv_poll_cq(ibv_cq *cq, int num_entries, ibv_wc *wc)
+    int ibv_poll_cq(ibv_cq *cq, int num_entries, ibv_wc *wc) nogil
     ibv_cq_ex *ibv_create_cq_ex(ibv_context *context,
                                 ibv_cq_init_attr_ex *cq_attr)
     ibv_cq *ibv_cq_ex_to_cq(ibv_cq_ex *cq)
@@ -725,7 +734,7 @@ cdef extern from 'infiniband/verbs.h':
     ibv_qp *ibv_create_qp(ibv_pd *pd, ibv_qp_init_attr *qp_init_attr)
     ibv_qp *ibv_create_qp_ex(ibv_context *context,
                              ibv_qp_init_attr_ex *qp_init_attr_ex)
-    int ibv_modify_qp(ibv_qp *qp, ibv_qp_attr *qp_attr, int comp_mask)
+    int ibv_modify_qp(ibv_qp *qp, ibv_qp_attr *qp_attr, int comp_mask) nogil
     int ibv_query_qp(ibv_qp *qp, ibv_qp_attr *attr, int attr_mask,
                      ibv_qp_init_attr *init_attr)
     int ibv_destroy_qp(ibv_qp *qp)
@@ -799,7 +808,7 @@ cdef extern from 'infiniband/verbs.h':
     ibv_flow *ibv_create_flow(ibv_qp *qp, ibv_flow_attr *flow)
     int ibv_destroy_flow(ibv_flow *flow_id)
     int ibv_query_rt_values_ex(ibv_context *context, ibv_values_ex *values)
-    int ibv_get_async_event(ibv_context *context, ibv_async_event *event)
+    int ibv_get_async_event(ibv_context *context, ibv_async_event *event) nogil
     void ibv_ack_async_event(ibv_async_event *event)
     int ibv_query_qp_data_in_order(ibv_qp *qp, ibv_wr_opcode op, uint32_t flags)
     int ibv_fork_init()
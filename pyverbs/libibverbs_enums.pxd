@@ -406,6 +406,9 @@ cdef extern from '<infiniband/verbs.h>':
         IBV_CREATE_CQ_ATTR_SINGLE_THREADED
         IBV_CREATE_CQ_ATTR_IGNORE_OVERRUN
 
+    cpdef enum ibv_cq_attr_mask:
+        IBV_CQ_ATTR_MODERATE
+
     cpdef enum ibv_odp_general_caps:
         IBV_ODP_SUPPORT
         IBV_ODP_SUPPORT_IMPLICIT
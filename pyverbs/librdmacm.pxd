@@ -98,33 +98,33 @@ cdef extern from '<rdma/rdma_cma.h>':
     void rdma_destroy_event_channel(rdma_event_channel *channel)
     ibv_context **rdma_get_devices(int *num_devices)
     void rdma_free_devices (ibv_context **list);
-    int rdma_get_cm_event(rdma_event_channel *channel, rdma_cm_event **event)
+    int rdma_get_cm_event(rdma_event_channel *channel, rdma_cm_event **event) nogil
     int rdma_ack_cm_event(rdma_cm_event *event)
     char *rdma_event_str(rdma_cm_event_type event)
     int rdma_create_ep(rdma_cm_id **id, rdma_addrinfo *res,
-                       ibv_pd *pd, ibv_qp_init_attr *qp_init_attr)
+                       ibv_pd *pd, ibv_qp_init_attr *qp_init_attr) nogil
     void rdma_destroy_ep(rdma_cm_id *id)
     int rdma_create_id(rdma_event_channel *channel, rdma_cm_id **id,
                        void *context, rdma_port_space ps)
     int rdma_destroy_id(rdma_cm_id *id)
     int rdma_get_remote_ece(rdma_cm_id *id, ibv_ece *ece)
     int rdma_set_local_ece(rdma_cm_id *id, ibv_ece *ece)
-    int rdma_get_request(rdma_cm_id *listen, rdma_cm_id **id)
+    int rdma_get_request(rdma_cm_id *listen, rdma_cm_id **id) nogil
     int rdma_bind_addr(rdma_cm_id *id, sockaddr *addr)
     int rdma_resolve_addr(rdma_cm_id *id, sockaddr *src_addr,
-                          sockaddr *dst_addr, int timeout_ms)
-    int rdma_resolve_route(rdma_cm_id *id, int timeout_ms)
+                          sockaddr *dst_addr, int timeout_ms) nogil
+    int rdma_resolve_route(rdma_cm_id *id, int timeout_ms) nogil
     int rdma_join_multicast(rdma_cm_id *id, sockaddr *addr, void *context)
     int rdma_join_multicast_ex(rdma_cm_id *id, rdma_cm_join_mc_attr_ex *mc_join_attr,
                                void *context)
     int rdma_leave_multicast(rdma_cm_id *id, sockaddr *addr)
-    int rdma_connect(rdma_cm_id *id, rdma_conn_param *conn_param)
+    int rdma_connect(rdma_cm_id *id, rdma_conn_param *conn_param) nogil
     int rdma_disconnect(rdma_cm_id *id)
     int rdma_listen(rdma_cm_id *id, int backlog)
-    int rdma_accept(rdma_cm_id *id, rdma_conn_param *conn_param)
-    int rdma_establish(rdma_cm_id *id)
+    int rdma_accept(rdma_cm_id *id, rdma_conn_param *conn_param) nogil
+    int rdma_establish(rdma_cm_id *id) nogil
     int rdma_getaddrinfo(char *node, char *service, rdma_addrinfo *hints,
-                         rdma_addrinfo **res)
+                         rdma_addrinfo **res) nogil
     void rdma_freeaddrinfo(rdma_addrinfo *res)
     int rdma_init_qp_attr(rdma_cm_id *id, ibv_qp_attr *qp_attr,
                           int *qp_attr_mask)
@@ -149,8 +149,8 @@ cdef extern from '<rdma/rdma_verbs.h>':
     int rdma_post_write(rdma_cm_id *id, void *context, void *addr,
                         size_t length, ibv_mr *mr, int flags,
                         uint64_t remote_addr, uint32_t rkey)
-    int rdma_get_send_comp(rdma_cm_id *id, ibv_wc *wc)
-    int rdma_get_recv_comp(rdma_cm_id *id, ibv_wc *wc)
+    int rdma_get_send_comp(rdma_cm_id *id, ibv_wc *wc) nogil
+    int rdma_get_recv_comp(rdma_cm_id *id, ibv_wc *wc) nogil
     ibv_mr *rdma_reg_msgs(rdma_cm_id *id, void *addr, size_t length)
     ibv_mr *rdma_reg_read(rdma_cm_id *id, void *addr, size_t length)
     ibv_mr *rdma_reg_write(rdma_cm_id *id, void *addr, size_t length)
@@ -8,9 +8,13 @@ from libc.stdlib cimport malloc as c_malloc, free as c_free
 from posix.mman cimport mmap as c_mmap, munmap as c_munmap, madvise as c_madvise
 
 from libc.stdint cimport uintptr_t, uint32_t, uint64_t
+from libc.errno cimport ENOENT
+import resource
+from pyverbs.pyverbs_error import PyverbsUserError, PyverbsRDMAError
 from pyverbs.base import PyverbsRDMAErrno
-from libc.string cimport memcpy
-from libc.string cimport memset
+from libc.string cimport memcpy as c_memcpy
+from libc.string cimport memset as c_memset
+from cpython.array cimport array, clone
 cimport posix.mman as mm
 
 cdef extern from 'sys/mman.h':
@@ -20,6 +24,29 @@ cdef extern from 'sys/mman.h':
 cdef extern from 'endian.h':
     unsigned long htobe32(unsigned long host_32bits)
     unsigned long htobe64(unsigned long host_64bits)
+    uint32_t be32toh(uint32_t big_endian_32bits)
+    uint64_t be64toh(uint64_t big_endian_64bits)
+
+cdef extern from '<sys/syscall.h>':
+    cdef long SYS_mbind
+    cdef long SYS_move_pages
+
+cdef extern from '<unistd.h>':
+    long syscall(long number, ...)
+
+# Values from linux/mempolicy.h, the syscalls are used directly to avoid
+# depending on libnuma.
+cdef enum:
+    MPOL_BIND = 2
+    MPOL_MF_STRICT = 1 << 0
+    MPOL_MF_MOVE = 1 << 1
+    MAX_NUMA_NODES = 1024
+    # Enough longs for MAX_NUMA_NODES bits even with 32-bit longs
+    NODEMASK_LONGS = 32
+    MOVE_PAGES_BATCH = 1024
+    # From linux/mman.h, may be missing from older libc headers
+    MADV_POPULATE_READ = 22
+    MADV_POPULATE_WRITE = 23
 
 
 def mmap(addr=0, length=100, prot=mm.PROT_READ | mm.PROT_WRITE,
@@ -42,6 +69,72 @@ def mmap(addr=0, length=100, prot=mm.PROT_READ | mm.PROT_WRITE,
     return <uintptr_t> ptr
 
 
+def mbind(addr, length, node, move=False):
+    """
+    Binds the memory range [addr, addr + length) to a NUMA node, so that its
+    pages are allocated on that node when they're faulted in.
+    :param addr: Start address of the range, page aligned
+    :param length: Length of the range in bytes
+    :param node: The NUMA node
+    :param move: If True, pages that are already faulted in are migrated to
+                 the node
+    """
+    cdef unsigned long nodemask[NODEMASK_LONGS]
+    cdef unsigned long flags = MPOL_MF_STRICT | MPOL_MF_MOVE if move else 0
+    cdef int bits = 8 * sizeof(unsigned long)
+    if node < 0 or node >= MAX_NUMA_NODES:
+        raise PyverbsUserError(f'Invalid NUMA node {node}')
+    c_memset(nodemask, 0, sizeof(nodemask))
+    nodemask[node // bits] = 1UL << (node % bits)
+    # The kernel expects the number of mask bits + 1
+    rc = syscall(SYS_mbind, <void*><uintptr_t>addr, <unsigned long>length,
+                 <int>MPOL_BIND, nodemask,
+                 <unsigned long>(MAX_NUMA_NODES + 1), flags)
+    if rc:
+        raise PyverbsRDMAErrno(f'Failed to bind memory to NUMA node {node}')
+
+
+def numa_nodes(addr, length, page_size=None):
+    """
+    Queries the NUMA placement of the pages of [addr, addr + length).
+    :param addr: Start address of the range
+    :param length: Length of the range in bytes
+    :param page_size: The range's page size. Defaults to the system's page
+                      size, pass the huge page size for huge page mappings.
+    :return: A dict mapping each NUMA node to its number of pages. Pages
+             that weren't faulted in yet are counted under None.
+    """
+    cdef void *pages[MOVE_PAGES_BATCH]
+    cdef int status[MOVE_PAGES_BATCH]
+    cdef uintptr_t page_addr
+    cdef size_t psize
+    cdef unsigned long i, num
+    psize = resource.getpagesize() if page_size is None else page_size
+    page_addr = addr - addr % psize
+    total = (addr + length - page_addr + psize - 1) // psize
+    placement = {}
+    while total > 0:
+        num = min(total, MOVE_PAGES_BATCH)
+        for i in range(num):
+            pages[i] = <void*>(page_addr + i * psize)
+        # No target nodes, move_pages() only reports the pages' nodes
+        rc = syscall(SYS_move_pages, 0, num, pages, NULL, status, 0)
+        if rc < 0:
+            raise PyverbsRDMAErrno('Failed to query NUMA placement')
+        for i in range(num):
+            if status[i] >= 0:
+                node = status[i]
+            elif status[i] == -ENOENT:
+                node = None
+            else:
+                raise PyverbsRDMAError('Failed to query NUMA placement',
+                                       -status[i])
+            placement[node] = placement.get(node, 0) + 1
+        page_addr += num * psize
+        total -= num
+    return placement
+
+
 def madvise(addr, length, flags=MADV_DONTNEED):
     """
     Python wrapper for sys madvise function
@@ -49,7 +142,13 @@ def madvise(addr, length, flags=MADV_DONTNEED):
     :param length: The length of the requested memory in bytes
     :param flags: Specify speicific flags to this memory
     """
-    rc = c_madvise(<void*><uintptr_t>addr, length, flags)
+    cdef void *c_addr = <void*><uintptr_t>addr
+    cdef size_t c_length = length
+    cdef int c_flags = flags
+    cdef int rc
+    # Populating a large range may take long, let other threads run
+    with nogil:
+        rc = c_madvise(c_addr, c_length, c_flags)
     if rc:
         raise PyverbsRDMAErrno('Failed to madvise memory')
 
@@ -90,7 +189,7 @@ def posix_memalign(size, alignment=8):
     ret = c_posix_memalign(&ptr, alignment, size)
     if ret:
         raise MemoryError('Failed to allocate memory ({err}'.format(ret))
-    memset(ptr, 0, size)
+    c_memset(ptr, 0, size)
     return <uintptr_t>ptr
 
 
@@ -126,17 +225,200 @@ def write(addr, data, length, offset=0):
     """
     Write user data to a given address
     :param addr: The start of the address to write to
-    :param data: User data to write (string or bytes)
+    :param data: User data to write, a str or any object supporting the
+                 buffer protocol (bytes, bytearray, memoryview, array, ...)
     :param length: Length of the data to write (in bytes)
     :param offset: Writing offset (in bytes)
     """
-    cdef int off = offset
+    cdef const unsigned char[::1] src
+    cdef size_t off
     cdef void* buf = <void*><uintptr_t>addr
+    if offset < 0 or length < 0:
+        raise PyverbsUserError(f'Invalid offset {offset} or length {length}')
+    off = offset
     # If data is a string, cast it to bytes as Python3 doesn't
     # automatically convert it.
     if isinstance(data, str):
         data = data.encode()
-    memcpy(<char*>(buf + off), <char *>data, length)
+    src = memoryview(data).cast('B')
+    if <size_t>length > <size_t>src.shape[0]:
+        raise PyverbsUserError(f'Length {length} exceeds the data of '
+                               f'{src.shape[0]} bytes')
+    if length:
+        c_memcpy(<char*>(buf + off), &src[0], length)
+
+
+def memset(addr, value, length):
+    """
+    Python wrapper for libc memset function
+    :param addr: The address of the memory to set
+    :param value: The byte value to set
+    :param length: Number of bytes to set
+    """
+    if length < 0:
+        raise PyverbsUserError(f'Invalid length {length}')
+    c_memset(<void*><uintptr_t>addr, value, length)
+
+
+def memcpy(dst, src, length):
+    """
+    Copies memory to a raw address
+    :param dst: The address to copy to
+    :param src: The address to copy from, or any object supporting the buffer
+                protocol
+    :param length: Number of bytes to copy
+    """
+    cdef const unsigned char[::1] src_buf
+    cdef const void *src_ptr
+    if length < 0:
+        raise PyverbsUserError(f'Invalid length {length}')
+    if isinstance(src, int):
+        src_ptr = <void*><uintptr_t>src
+    else:
+        src_buf = memoryview(src).cast('B')
+        if <size_t>length > <size_t>src_buf.shape[0]:
+            raise PyverbsUserError(f'Length {length} exceeds the source of '
+                                   f'{src_buf.shape[0]} bytes')
+        if length == 0:
+            return
+        src_ptr = &src_buf[0]
+    c_memcpy(<void*><uintptr_t>dst, src_ptr, length)
+
+
+cdef const uint64_t[::1] offsets_view(offsets):
+    """
+    :return: A view of byte offsets. Offsets that aren't an unsigned 64-bit
+             buffer (e.g. a list or a range) are converted to one.
+    """
+    try:
+        return offsets
+    except (TypeError, ValueError):
+        pass
+    try:
+        return array('Q', offsets)
+    except (OverflowError, TypeError) as ex:
+        raise PyverbsUserError(f'Offsets must be non-negative 64-bit '
+                               f'integers: {ex}')
+
+
+cdef check_strided(count, stride, offset):
+    """
+    Verifies the arguments of a strided read before any memory is read.
+    """
+    if count < 0 or stride < 0 or offset < 0:
+        raise PyverbsUserError(f'Invalid strided read: count {count}, stride '
+                               f'{stride}, offset {offset}')
+
+
+def gatherbe32(addr, offsets):
+    """
+    Reads big endian 32-bit fields at several offsets of an address
+    :param addr: The start of the address to read from
+    :param offsets: Byte offsets of the fields, a sequence or an unsigned
+                    64-bit buffer (e.g. array('Q'))
+    :return: An array('I') of the fields' values in host order
+    """
+    cdef const uint64_t[::1] offs = offsets_view(offsets)
+    cdef array res = clone(array('I'), offs.shape[0], False)
+    cdef char *base = <char*><uintptr_t>addr
+    cdef Py_ssize_t i
+    for i in range(offs.shape[0]):
+        res.data.as_uints[i] = be32toh((<uint32_t*>(base + offs[i]))[0])
+    return res
+
+
+def gatherbe64(addr, offsets):
+    """
+    Reads big endian 64-bit fields at several offsets of an address
+    :param addr: The start of the address to read from
+    :param offsets: Byte offsets of the fields, a sequence or an unsigned
+                    64-bit buffer (e.g. array('Q'))
+    :return: An array('Q') of the fields' values in host order
+    """
+    cdef const uint64_t[::1] offs = offsets_view(offsets)
+    cdef array res = clone(array('Q'), offs.shape[0], False)
+    cdef char *base = <char*><uintptr_t>addr
+    cdef Py_ssize_t i
+    for i in range(offs.shape[0]):
+        res.data.as_ulonglongs[i] = be64toh((<uint64_t*>(base + offs[i]))[0])
+    return res
+
+
+def readbe32_strided(addr, count, stride, offset=0):
+    """
+    Reads a big endian 32-bit field of <count> consecutive entries, e.g. a
+    field of each CQE of a CQ buffer
+    :param addr: The start of the address to read from
+    :param count: Number of entries
+    :param stride: Size of an entry in bytes
+    :param offset: Offset of the field in an entry (in bytes)
+    :return: An array('I') of the fields' values in host order
+    """
+    check_strided(count, stride, offset)
+    cdef array res = clone(array('I'), count, False)
+    cdef char *field = <char*><uintptr_t>addr + <size_t>offset
+    cdef size_t c_stride = stride
+    cdef Py_ssize_t i
+    for i in range(count):
+        res.data.as_uints[i] = be32toh((<uint32_t*>(field + i * c_stride))[0])
+    return res
+
+
+def readbe64_strided(addr, count, stride, offset=0):
+    """
+    Reads a big endian 64-bit field of <count> consecutive entries
+    :param addr: The start of the address to read from
+    :param count: Number of entries
+    :param stride: Size of an entry in bytes
+    :param offset: Offset of the field in an entry (in bytes)
+    :return: An array('Q') of the fields' values in host order
+    """
+    check_strided(count, stride, offset)
+    cdef array res = clone(array('Q'), count, False)
+    cdef char *field = <char*><uintptr_t>addr + <size_t>offset
+    cdef size_t c_stride = stride
+    cdef Py_ssize_t i
+    for i in range(count):
+        res.data.as_ulonglongs[i] = be64toh((<uint64_t*>(field + i * c_stride))[0])
+    return res
+
+
+def scatterbe32(addr, offsets, values):
+    """
+    Writes 32-bit values as big endian at several offsets of an address
+    :param addr: The start of the address to write to
+    :param offsets: Byte offsets of the fields, a sequence or an unsigned
+                    64-bit buffer (e.g. array('Q'))
+    :param values: The values to write, one per offset
+    """
+    cdef const uint64_t[::1] offs = offsets_view(offsets)
+    cdef array vals = array('I', values)
+    cdef char *base = <char*><uintptr_t>addr
+    cdef Py_ssize_t i
+    if len(vals) != offs.shape[0]:
+        raise PyverbsUserError(f'Got {len(vals)} values for '
+                               f'{offs.shape[0]} offsets')
+    for i in range(offs.shape[0]):
+        (<uint32_t*>(base + offs[i]))[0] = htobe32(vals.data.as_uints[i])
+
+
+def scatterbe64(addr, offsets, values):
+    """
+    Writes 64-bit values as big endian at several offsets of an address
+    :param addr: The start of the address to write to
+    :param offsets: Byte offsets of the fields, a sequence or an unsigned
+                    64-bit buffer (e.g. array('Q'))
+    :param values: The values to write, one per offset
+    """
+    cdef const uint64_t[::1] offs = offsets_view(offsets)
+    cdef array vals = array('Q', values)
+    cdef char *base = <char*><uintptr_t>addr
+    cdef Py_ssize_t i
+    if len(vals) != offs.shape[0]:
+        raise PyverbsUserError(f'Got {len(vals)} values for '
+                               f'{offs.shape[0]} offsets')
+    for i in range(offs.shape[0]):
+        (<uint64_t*>(base + offs[i]))[0] = htobe64(vals.data.as_ulonglongs[i])
 
 
 def read32(addr, offset=0):
@@ -168,6 +450,8 @@ def read(addr, length, offset=0):
     :return: The data on the buffer in the requested offset (bytes)
     """
     cdef char *data
+    if offset < 0 or length < 0:
+        raise PyverbsUserError(f'Invalid offset {offset} or length {length}')
     data = <char*><uintptr_t>(addr + offset)
     return data[:length]
 
@@ -189,3 +473,8 @@ MAP_HUGETLB_ = mm.MAP_HUGETLB
 MAP_POPULATE_ = mm.MAP_POPULATE
 MAP_NORESERVE_ = mm.MAP_NORESERVE
 MAP_GROWSDOWN_ = mm.MAP_GROWSDOWN
+
+# advice values for madvise
+MADV_DONTNEED_ = MADV_DONTNEED
+MADV_POPULATE_READ_ = MADV_POPULATE_READ
+MADV_POPULATE_WRITE_ = MADV_POPULATE_WRITE
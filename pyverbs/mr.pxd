@@ -13,12 +13,18 @@ cdef class MR(PyverbsCM):
     cdef object pd
     cdef object cmid
     cdef v.ibv_mr *mr
-    cdef int mmap_length
+    cdef size_t mmap_length
+    cdef size_t page_size
     cdef object is_huge
     cdef object is_user_addr
     cdef void *buf
+    cdef size_t buf_length
+    cdef int exports
     cdef object _is_imported
+    cdef object numa_node
     cpdef read(self, length, offset)
+    cdef free_buf(self)
+    cdef check_range(self, length, offset)
 
 cdef class MWBindInfo(PyverbsCM):
     cdef v.ibv_mw_bind_info info
@@ -39,3 +45,9 @@ cdef class DmaBufMR(MR):
     cdef object dmabuf
     cdef unsigned long offset
     cdef object is_dmabuf_internal
+    cdef void *map_buf
+    cdef size_t map_length
+    cdef free_buf(self)
+    cdef map_dmabuf(self)
+    cdef check_range(self, length, offset)
+    cdef check_dmabuf_range(self, length, offset)
@@ -3,13 +3,14 @@
 # Copyright (c) 2020, Intel Corporation. All rights reserved. See COPYING file
 
 import resource
-import logging
 
 from posix.mman cimport mmap, munmap, MAP_PRIVATE, PROT_READ, PROT_WRITE, \
     MAP_ANONYMOUS, MAP_HUGETLB, MAP_SHARED
 from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, \
     PyverbsUserError
-from libc.stdint cimport uintptr_t, SIZE_MAX
+from libc.stdint cimport uintptr_t, uint64_t, SIZE_MAX
+from cpython.buffer cimport PyBuffer_FillInfo
+from pyverbs.mem_alloc import mbind, numa_nodes
 from pyverbs.utils import rereg_error_to_str
 from pyverbs.base import PyverbsRDMAErrno
 from posix.stdlib cimport posix_memalign
@@ -23,6 +24,7 @@ from .dmabuf cimport DmaBuf
 
 cdef extern from 'sys/mman.h':
     cdef void* MAP_FAILED
+    cdef int MAP_HUGE_SHIFT
 
 HUGE_PAGE_SIZE = 0x200000
 
@@ -31,6 +33,9 @@ cdef class MR(PyverbsCM):
     """
     MR class represents ibv_mr. Buffer allocation in done in the c'tor. Freeing
     it is done in close().
+    The MR's buffer supports the buffer protocol, so memoryview(mr) and
+    mr.view() provide zero-copy, writable access to it. If views still exist
+    when the MR is closed, the buffer is freed only once they're released.
     """
     def __init__(self, creator not None, length=0, access=0, address=None,
                  implicit=False, **kwargs):
@@ -52,8 +57,23 @@ cdef class MR(PyverbsCM):
                 A valid kernel handle for a MR object in the given PD (creator).
                 If passed, the MR will be imported and associated with the
                 context that is associated with the given PD using ibv_import_mr.
+            * *huge_page_size*
+                The huge page size of the buffer allocated for an
+                IBV_ACCESS_HUGETLB MR, e.g. 1 GiB for very large regions.
+                The length is rounded up to a multiple of it. Defaults to
+                HUGE_PAGE_SIZE.
+            * *numa_node*
+                The NUMA node to allocate the buffer's pages on, or 'device'
+                for the node of the creator's device. The pages are bound to
+                the node with mbind(), see query_numa_nodes() for their actual
+                placement. A negative node (e.g. when the device's node is
+                unknown) leaves the placement to the kernel.
         :return: The newly created MR on success
         """
+        cdef v.ibv_pd *c_pd
+        cdef void *c_buf
+        cdef size_t c_length
+        cdef int c_access, mmap_flags
         super().__init__()
         if self.mr != NULL:
             return
@@ -63,6 +83,7 @@ cdef class MR(PyverbsCM):
             # uintptr_t is guaranteed to be large enough to hold any pointer.
             # In order to safely cast addr to void*, it is firstly cast to uintptr_t.
             self.buf = <void*><uintptr_t>address
+            self.buf_length = length
 
         mr_handle = kwargs.get('handle')
         # If a MR handle is passed import MR and finish
@@ -76,29 +97,70 @@ cdef class MR(PyverbsCM):
             pd.add_ref(self)
             return
 
+        numa_node = kwargs.get('numa_node')
+        if numa_node is not None:
+            if address or implicit:
+                raise PyverbsUserError('NUMA placement is only supported for '
+                                       'buffers allocated by the MR')
+            if numa_node == 'device':
+                if isinstance(creator, PD):
+                    numa_node = (<PD>creator).ctx.numa_node
+                else:
+                    numa_node = (<CMID>creator).ctx.numa_node
+            if numa_node < 0:
+                numa_node = None
+        self.numa_node = numa_node
+
         # Allocate a buffer
         if not address and length > 0:
-            if self.is_huge:
-                # Rounding up to multiple of HUGE_PAGE_SIZE
-                self.mmap_length = length + (HUGE_PAGE_SIZE - length % HUGE_PAGE_SIZE) \
-                    if length % HUGE_PAGE_SIZE else length
-                self.buf = mmap(NULL, self.mmap_length, PROT_READ | PROT_WRITE,
-                                MAP_PRIVATE | MAP_ANONYMOUS | MAP_HUGETLB, -1, 0)
+            if self.is_huge or numa_node is not None:
+                # The buffer is mmapped so that it can be bound to the NUMA
+                # node before its pages are faulted in.
+                if self.is_huge:
+                    page_size = kwargs.get('huge_page_size', HUGE_PAGE_SIZE)
+                    if page_size <= 0 or page_size & (page_size - 1):
+                        raise PyverbsUserError(f'Invalid huge page size {page_size}')
+                    mmap_flags = MAP_PRIVATE | MAP_ANONYMOUS | MAP_HUGETLB
+                    if page_size != HUGE_PAGE_SIZE:
+                        mmap_flags |= (page_size.bit_length() - 1) << MAP_HUGE_SHIFT
+                else:
+                    page_size = resource.getpagesize()
+                    mmap_flags = MAP_PRIVATE | MAP_ANONYMOUS
+                # Rounding up to multiple of the page size. Anonymous
+                # mappings are zeroed by the kernel, so unlike the
+                # posix_memalign() case the pages aren't faulted in here.
+                mmap_length = (length + page_size - 1) // page_size * page_size
+                self.buf = mmap(NULL, mmap_length, PROT_READ | PROT_WRITE,
+                                mmap_flags, -1, 0)
                 if self.buf == MAP_FAILED:
+                    self.buf = NULL
                     raise PyverbsError('Failed to allocate MR buffer of size {l}'.
                                        format(l=length))
+                self.mmap_length = mmap_length
+                self.page_size = page_size
+                self.buf_length = length
+                if numa_node is not None:
+                    mbind(<uintptr_t>self.buf, mmap_length, numa_node)
             else:
                 rc = posix_memalign(&self.buf, resource.getpagesize(), length)
                 if rc:
                     raise PyverbsError('Failed to allocate MR buffer of size {l}'.
                                        format(l=length))
-            memset(self.buf, 0, length)
+                memset(self.buf, 0, length)
+            self.buf_length = length
         if isinstance(creator, PD):
             pd = <PD>creator
+            c_pd = (<PD>pd).pd
+            c_access = access
             if implicit:
-                self.mr = v.ibv_reg_mr(pd.pd, NULL, SIZE_MAX, access)
+                c_buf = NULL
+                c_length = SIZE_MAX
             else:
-                self.mr = v.ibv_reg_mr(pd.pd, self.buf, length, access)
+                c_buf = self.buf
+                c_length = length
+            # Pinning a large region may take long, let other threads run
+            with nogil:
+                self.mr = v.ibv_reg_mr(c_pd, c_buf, c_length, c_access)
             self.pd = pd
             pd.add_ref(self)
         elif isinstance(creator, CMID):
@@ -114,8 +176,9 @@ cdef class MR(PyverbsCM):
         if self.mr == NULL:
             raise PyverbsRDMAErrno('Failed to register a MR. length: {l}, access flags: {a}'.
                                    format(l=length, a=access))
-        self.logger.debug('Registered ibv_mr. Length: {l}, access flags {a}'.
-                          format(l=length, a=access))
+        if self.debug_enabled():
+            self.logger.debug('Registered ibv_mr. Length: {l}, access flags {a}'.
+                              format(l=length, a=access))
 
     def unimport(self):
         v.ibv_unimport_mr(self.mr)
@@ -141,33 +204,81 @@ cdef class MR(PyverbsCM):
                 rc = v.ibv_dereg_mr(self.mr)
                 if rc != 0:
                     raise PyverbsRDMAError('Failed to dereg MR', rc)
-                if not self.is_user_addr:
-                    if self.is_huge:
-                        munmap(self.buf, self.mmap_length)
-                    else:
-                        free(self.buf)
             self.mr = NULL
             self.pd = None
-            self.buf = NULL
             self.cmid = None
+            if self.exports == 0:
+                self.free_buf()
+            elif self.debug_enabled():
+                self.logger.debug(f'MR buffer is still used by {self.exports}'
+                                  f' views, it will be freed once they\'re '
+                                  f'released')
+
+    cdef free_buf(self):
+        if self.buf != NULL and not self.is_user_addr and \
+                not self._is_imported:
+            if self.mmap_length:
+                munmap(self.buf, self.mmap_length)
+            else:
+                free(self.buf)
+        self.buf = NULL
+        self.buf_length = 0
+        self.mmap_length = 0
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        if self.mr == NULL or self.buf == NULL:
+            raise PyverbsUserError('The MR has no host buffer to export')
+        PyBuffer_FillInfo(buffer, self, self.buf, self.buf_length, 0, flags)
+        self.exports += 1
+
+    def __releasebuffer__(self, Py_buffer *buffer):
+        self.exports -= 1
+        if self.exports == 0 and self.mr == NULL:
+            self.free_buf()
+
+    def view(self, offset=0, length=None):
+        """
+        Returns a writable memoryview of a range of the MR's buffer without
+        copying it.
+        :param offset: Offset of the range
+        :param length: Length of the range. Defaults to the rest of the buffer.
+        :return: A memoryview of the range
+        """
+        length = self.buf_length - offset if length is None else length
+        self.check_range(length, offset)
+        return memoryview(self)[offset:offset + length]
+
+    @property
+    def exports(self):
+        """
+        The number of buffer views currently exported by the MR
+        """
+        return self.exports
 
     def write(self, data, length, offset=0):
         """
         Write user data to the MR's buffer using memcpy
-        :param data: User data to write
-        :param length: Length of the data to write
+        :param data: User data to write, a str or any object supporting the
+                     buffer protocol (bytes, bytearray, memoryview, array, ...)
+        :param length: Length of the data to write (in bytes)
         :param offset: Writing offset
         :return: None
         """
-        if not self.buf or length < 0:
-            raise PyverbsUserError('The MR buffer isn\'t allocated or length'
-                                   f' {length} is invalid')
+        cdef const unsigned char[::1] src
+        cdef size_t off
+        self.check_range(length, offset)
+        off = offset
         # If data is a string, cast it to bytes as Python3 doesn't
         # automatically convert it.
-        cdef int off = offset
         if isinstance(data, str):
             data = data.encode()
-        memcpy(<char*>(self.buf + off), <char *>data, length)
+        src = memoryview(data).cast('B')
+        if <size_t>length > <size_t>src.shape[0]:
+            raise PyverbsUserError(f'Length {length} exceeds the data of '
+                                   f'{src.shape[0]} bytes')
+        if length == 0:
+            return
+        memcpy(<char*>(self.buf + off), &src[0], length)
 
     cpdef read(self, length, offset):
         """
@@ -177,16 +288,23 @@ cdef class MR(PyverbsCM):
         :return: The data on the buffer in the requested offset
         """
         cdef char *data
-        cdef int off = offset # we can't use offset in the next line, as it is
-                              # a Python object and not C
-        if offset < 0:
-            raise PyverbsUserError(f'Invalid offset {offset}')
-        if not self.buf or length < 0:
-            raise PyverbsUserError('The MR buffer isn\'t allocated or length'
-                                   f' {length} is invalid')
+        cdef size_t off
+        self.check_range(length, offset)
+        off = offset
         data = <char*>(self.buf + off)
         return data[:length]
 
+    cdef check_range(self, length, offset):
+        """
+        Verifies that <length> bytes at <offset> are within the MR's buffer.
+        """
+        if self.buf == NULL:
+            raise PyverbsUserError('The MR buffer isn\'t allocated')
+        if length < 0 or offset < 0 or offset + length > self.buf_length:
+            raise PyverbsUserError(f'Range of {length} bytes at offset '
+                                   f'{offset} exceeds the MR buffer of '
+                                   f'{self.buf_length} bytes')
+
     def rereg(self, flags, PD pd=None, addr=0, length=0, access=0):
         """
         Modifies the attributes of an existing memory region.
@@ -198,6 +316,9 @@ cdef class MR(PyverbsCM):
         :param access: New MR access
         :return: None
         """
+        if flags & e.IBV_REREG_MR_CHANGE_TRANSLATION and self.exports > 0:
+            raise PyverbsUserError(f'Can\'t change the MR translation, its '
+                                   f'buffer is used by {self.exports} views')
         ret = v.ibv_rereg_mr(self.mr, flags, pd.pd, <void*><uintptr_t>addr,
                              length, access)
         if ret != 0:
@@ -206,12 +327,15 @@ cdef class MR(PyverbsCM):
 
         if flags & e.IBV_REREG_MR_CHANGE_TRANSLATION:
             if not self.is_user_addr:
-                if self.is_huge:
+                if self.mmap_length:
                     munmap(self.buf, self.mmap_length)
                 else:
                     free(self.buf)
             self.buf = <void*><uintptr_t>addr
+            self.buf_length = length
+            self.mmap_length = 0
             self.is_user_addr = True
+            self.numa_node = None
 
         if flags & e.IBV_REREG_MR_CHANGE_PD:
             (<PD>self.pd).remove_ref(self)
@@ -222,6 +346,25 @@ cdef class MR(PyverbsCM):
     def buf(self):
         return <uintptr_t>self.buf
 
+    @property
+    def numa_node(self):
+        """
+        The NUMA node the MR's buffer is bound to, None if it isn't bound
+        """
+        return self.numa_node
+
+    def query_numa_nodes(self):
+        """
+        Queries the actual NUMA placement of the MR's buffer. Only pages that
+        were already faulted in have a node.
+        :return: A dict mapping each NUMA node to its number of pages in the
+                 buffer. Pages that weren't faulted in are counted under None.
+        """
+        if self.buf == NULL:
+            raise PyverbsUserError('The MR buffer isn\'t allocated')
+        page_size = self.page_size if self.mmap_length else None
+        return numa_nodes(<uintptr_t>self.buf, self.buf_length, page_size)
+
     @property
     def lkey(self):
         return self.mr.lkey
@@ -306,8 +449,9 @@ cdef class MW(PyverbsCM):
             raise PyverbsRDMAErrno('Failed to allocate MW')
         self.pd = pd
         pd.add_ref(self)
-        self.logger.debug('Allocated memory window of type {t}'.
-                          format(t=mwtype2str(mw_type)))
+        if self.debug_enabled():
+            self.logger.debug('Allocated memory window of type {t}'.
+                              format(t=mwtype2str(mw_type)))
 
     def __dealloc__(self):
         self.close()
@@ -362,10 +506,6 @@ cdef class DMMR(MR):
                        memory buffer
         :return: The newly create DMMR
         """
-        # Initialize the logger here as the parent's __init__ is called after
-        # the DMMR is allocated. Allocation can fail, which will lead to
-        # exceptions thrown during object's teardown.
-        self.logger = logging.getLogger(self.__class__.__name__)
         self.mr = v.ibv_reg_dm_mr(pd.pd, dm.dm, offset, length, access)
         if self.mr == NULL:
             raise PyverbsRDMAErrno('Failed to register a device MR. length: {len}, access flags: {flags}'.
@@ -375,8 +515,9 @@ cdef class DMMR(MR):
         self.dm = dm
         pd.add_ref(self)
         dm.add_ref(self)
-        self.logger.debug('Registered device ibv_mr. Length: {len}, access flags {flags}'.
-                          format(len=length, flags=access))
+        if self.debug_enabled():
+            self.logger.debug('Registered device ibv_mr. Length: {len}, access flags {flags}'.
+                              format(len=length, flags=access))
 
     def write(self, data, length, offset=0):
         if isinstance(data, str):
@@ -387,6 +528,11 @@ cdef class DMMR(MR):
         return self.dm.copy_from_dm(offset, length)
 
 cdef class DmaBufMR(MR):
+    """
+    DmaBufMR class represents ibv_mr of a dma-buf. The dma-buf is mapped on the
+    first access to the MR's buffer, by read(), write(), view() or the buffer
+    protocol, and stays mapped until the MR is closed.
+    """
     def __init__(self, PD pd not None, length, access, dmabuf=None,
                  offset=0, gpu=0, gtt=0):
         """
@@ -402,22 +548,31 @@ cdef class DmaBufMR(MR):
         :param gtt: If true allocate internal dmabuf from GTT instead of VRAM
         :return: The newly created DMABUFMR
         """
-        self.logger = logging.getLogger(self.__class__.__name__)
+        cdef uint64_t c_offset
+        cdef size_t c_length
+        cdef int c_fd, c_access
         if dmabuf is None:
             self.is_dmabuf_internal = True
             dmabuf = DmaBuf(length + offset, gpu, gtt)
-        fd = dmabuf.fd if isinstance(dmabuf, DmaBuf) else dmabuf
-        self.mr = v.ibv_reg_dmabuf_mr(pd.pd, offset, length, offset, fd, access)
+        c_fd = dmabuf.fd if isinstance(dmabuf, DmaBuf) else dmabuf
+        c_offset = offset
+        c_length = length
+        c_access = access
+        with nogil:
+            self.mr = v.ibv_reg_dmabuf_mr(pd.pd, c_offset, c_length, c_offset,
+                                          c_fd, c_access)
         if self.mr == NULL:
             raise PyverbsRDMAErrno(f'Failed to register a dma-buf MR. length: {length}, access flags: {access}')
         super().__init__(pd, length, access)
         self.pd = pd
         self.dmabuf = dmabuf
         self.offset = offset
+        self.buf_length = length
         pd.add_ref(self)
         if isinstance(dmabuf, DmaBuf):
             dmabuf.add_ref(self)
-        self.logger.debug(f'Registered dma-buf ibv_mr. Length: {length}, access flags {access}')
+        if self.debug_enabled():
+            self.logger.debug(f'Registered dma-buf ibv_mr. Length: {length}, access flags {access}')
 
     def __dealloc__(self):
         self.close()
@@ -435,12 +590,68 @@ cdef class DmaBufMR(MR):
                 raise PyverbsRDMAError('Failed to dereg dma-buf MR', rc)
             self.pd = None
             self.mr = NULL
+            # The mapping holds its own reference to the dma-buf's memory, so
+            # it outlives the dma-buf if views are still exported.
+            if self.exports == 0:
+                self.free_buf()
             # Set self.mr to NULL before closing dmabuf because this method is
-            # re-entered when close_weakrefs() is called inside dmabuf.close().
+            # re-entered when close_deps() is called inside dmabuf.close().
             if self.is_dmabuf_internal:
                 self.dmabuf.close()
             self.dmabuf = None
 
+    cdef free_buf(self):
+        if self.map_buf != NULL:
+            munmap(self.map_buf, self.map_length)
+        self.map_buf = NULL
+        self.buf = NULL
+        self.buf_length = 0
+
+    cdef map_dmabuf(self):
+        """
+        Maps the dma-buf, from its start to the end of the MR, unless it's
+        already mapped.
+        """
+        cdef size_t map_length
+        cdef void *buf
+        cdef int fd
+        cdef uint64_t map_offset
+        if self.map_buf != NULL:
+            return
+        if isinstance(self.dmabuf, DmaBuf):
+            fd = (<DmaBuf>self.dmabuf).drm_fd
+            map_offset = (<DmaBuf>self.dmabuf).map_offset
+        else:
+            fd = self.dmabuf
+            map_offset = 0
+        map_length = self.offset + self.mr.length
+        buf = mmap(NULL, map_length, PROT_READ | PROT_WRITE, MAP_SHARED, fd,
+                   map_offset)
+        if buf == MAP_FAILED:
+            raise PyverbsRDMAErrno(f'Failed to map dma-buf of size {map_length}')
+        self.map_buf = buf
+        self.map_length = map_length
+        self.buf = <char*>buf + self.offset
+
+    cdef check_range(self, length, offset):
+        self.check_dmabuf_range(length, offset)
+        self.map_dmabuf()
+
+    def __getbuffer__(self, Py_buffer *buffer, int flags):
+        if self.mr == NULL:
+            raise PyverbsUserError('The dma-buf MR is closed')
+        self.map_dmabuf()
+        PyBuffer_FillInfo(buffer, self, self.buf, self.buf_length, 0, flags)
+        self.exports += 1
+
+    cdef check_dmabuf_range(self, length, offset):
+        if self.mr == NULL:
+            raise PyverbsUserError('The dma-buf MR is closed')
+        if length < 0 or offset < 0 or offset + length > self.mr.length:
+            raise PyverbsUserError(f'Range of {length} bytes at offset '
+                                   f'{offset} exceeds the MR length '
+                                   f'{self.mr.length}')
+
     @property
     def offset(self):
         return self.offset
@@ -449,46 +660,6 @@ cdef class DmaBufMR(MR):
     def dmabuf(self):
         return self.dmabuf
 
-    def write(self, data, length, offset=0):
-        """
-        Write user data to the dma-buf backing the MR
-        :param data: User data to write
-        :param length: Length of the data to write
-        :param offset: Writing offset
-        :return: None
-        """
-        if isinstance(data, str):
-            data = data.encode()
-        cdef int off = offset + self.offset
-        cdef void *buf = mmap(NULL, length + off, PROT_READ | PROT_WRITE,
-                              MAP_SHARED, self.dmabuf.drm_fd,
-                              self.dmabuf.map_offset)
-        if buf == MAP_FAILED:
-            raise PyverbsError(f'Failed to map dma-buf of size {length}')
-        memcpy(<char*>(buf + off), <char *>data, length)
-        munmap(buf, length + off)
-
-    cpdef read(self, length, offset):
-        """
-        Reads data from the dma-buf backing the MR
-        :param length: Length of data to read
-        :param offset: Reading offset
-        :return: The data on the buffer in the requested offset
-        """
-        cdef int off = offset + self.offset
-        cdef void *buf = mmap(NULL, length + off, PROT_READ | PROT_WRITE,
-                              MAP_SHARED, self.dmabuf.drm_fd,
-                              self.dmabuf.map_offset)
-        if buf == MAP_FAILED:
-            raise PyverbsError(f'Failed to map dma-buf of size {length}')
-        cdef char *data =<char*>malloc(length)
-        memset(data, 0, length)
-        memcpy(data, <char*>(buf + off), length)
-        munmap(buf, length + off)
-        res = data[:length]
-        free(data)
-        return res
-
 
 def mwtype2str(mw_type):
     mw_types = {1:'IBV_MW_TYPE_1', 2:'IBV_MW_TYPE_2'}
@@ -0,0 +1,23 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+#cython: language_level=3
+
+from pyverbs.base cimport PyverbsCM
+
+
+cdef class MRCache(PyverbsCM):
+    cdef object pd
+    cdef object max_bytes
+    cdef object starts
+    cdef object entries
+    cdef size_t page_size
+    cdef size_t reg_bytes
+    cdef unsigned long hits
+    cdef unsigned long misses
+    cdef unsigned long evictions
+    cdef unsigned long merges
+    cdef unsigned long invalidations
+    cpdef close(self)
+    cdef drop(self, start)
+    cdef overlapping(self, start, end)
+    cdef evict(self)
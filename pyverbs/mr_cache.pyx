@@ -0,0 +1,202 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+import resource
+
+from pyverbs.pyverbs_error import PyverbsUserError
+cimport pyverbs.libibverbs_enums as e
+from pyverbs.mr cimport MR
+from pyverbs.pd cimport PD
+
+
+cdef class MRCache(PyverbsCM):
+    """
+    A registration cache of user memory for a PD. reg() returns an MR that
+    covers the requested range with at least the requested access flags,
+    registering one only if no cached MR does. Cached MRs cover whole pages
+    and don't overlap: a registration that overlaps cached MRs replaces them
+    with a single MR covering their union, with the union of their access
+    flags.
+    When the registered bytes exceed the cache's budget, the least recently
+    used MRs are dropped from the cache. Replaced and evicted MRs are
+    deregistered once the application holds no reference to them, so MRs
+    that are still in use stay valid.
+    invalidate() must be called before a cached buffer is freed or unmapped.
+    Closing the cache deregisters all the cached MRs.
+    """
+    def __init__(self, PD pd not None, max_bytes=None):
+        """
+        Initializes an MRCache object.
+        :param pd: The PD to register the MRs with
+        :param max_bytes: Budget of registered bytes. Unlimited if None.
+        :return: An MRCache object
+        """
+        super().__init__()
+        if max_bytes is not None and max_bytes <= 0:
+            raise PyverbsUserError(f'Invalid cache budget {max_bytes}')
+        self.pd = pd
+        self.max_bytes = max_bytes
+        self.page_size = resource.getpagesize()
+        # Sorted start addresses of the cached MRs
+        self.starts = []
+        # start -> (end, access, MR), least recently used first
+        self.entries = OrderedDict()
+        pd.add_ref(self)
+        self.logger.debug('Created MRCache')
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        if self.pd is not None:
+            if self.logger:
+                self.logger.debug('Closing MRCache')
+            for _, _, mr in self.entries.values():
+                mr.close()
+            self.entries.clear()
+            self.starts = []
+            self.reg_bytes = 0
+            self.pd = None
+
+    cdef drop(self, start):
+        """
+        Removes the MR starting at <start> from the cache.
+        :return: The removed MR
+        """
+        end, _, mr = self.entries.pop(start)
+        del self.starts[bisect_left(self.starts, start)]
+        self.reg_bytes -= end - start
+        return mr
+
+    cdef overlapping(self, start, end):
+        """
+        :return: The start addresses of the cached MRs that overlap
+                 [start, end), in descending order
+        """
+        res = []
+        i = bisect_left(self.starts, end) - 1
+        # Cached MRs don't overlap, so their ends are sorted as well
+        while i >= 0 and self.entries[self.starts[i]][0] > start:
+            res.append(self.starts[i])
+            i -= 1
+        return res
+
+    cdef evict(self):
+        if self.max_bytes is None:
+            return
+        # Never evict the most recently used MR, which was just returned
+        while self.reg_bytes > self.max_bytes and len(self.entries) > 1:
+            self.drop(next(iter(self.entries)))
+            self.evictions += 1
+
+    def reg(self, addr, length, access=e.IBV_ACCESS_LOCAL_WRITE):
+        """
+        Returns a cached MR covering [addr, addr + length) with at least
+        <access> access flags, registering one if needed.
+        :param addr: Start address of the buffer
+        :param length: Length of the buffer
+        :param access: Required access flags, see ibv_access_flags enum
+        :return: An MR whose lkey/rkey can be used for the buffer
+        """
+        if self.pd is None:
+            raise PyverbsUserError('The MR cache is closed')
+        if addr <= 0 or length <= 0:
+            raise PyverbsUserError(f'Invalid buffer: address {addr}, length '
+                                   f'{length}')
+        i = bisect_right(self.starts, addr) - 1
+        if i >= 0:
+            start = self.starts[i]
+            end, mr_access, mr = self.entries[start]
+            if addr + length <= end and mr_access & access == access:
+                self.entries.move_to_end(start)
+                self.hits += 1
+                return mr
+        self.misses += 1
+        start = addr - addr % self.page_size
+        end = (addr + length + self.page_size - 1) // self.page_size * \
+            self.page_size
+        for s in self.overlapping(start, end):
+            e_, a, _ = self.entries[s]
+            start = min(start, s)
+            end = max(end, e_)
+            access |= a
+            self.drop(s)
+            self.merges += 1
+        mr = MR(self.pd, end - start, access, address=start)
+        self.starts.insert(bisect_left(self.starts, start), start)
+        self.entries[start] = (end, access, mr)
+        self.reg_bytes += end - start
+        self.evict()
+        return mr
+
+    def invalidate(self, addr, length):
+        """
+        Deregisters the cached MRs that overlap [addr, addr + length). Must be
+        called before the range is freed or unmapped.
+        :param addr: Start address of the range
+        :param length: Length of the range
+        :return: The number of deregistered MRs
+        """
+        if self.pd is None:
+            return 0
+        starts = self.overlapping(addr, addr + length)
+        for s in starts:
+            self.drop(s).close()
+        self.invalidations += len(starts)
+        return len(starts)
+
+    def flush(self):
+        """
+        Deregisters all the cached MRs.
+        :return: None
+        """
+        if self.pd is None:
+            return
+        for start in list(self.entries):
+            self.drop(start).close()
+            self.invalidations += 1
+
+    @property
+    def max_bytes(self):
+        return self.max_bytes
+
+    @property
+    def reg_bytes(self):
+        return self.reg_bytes
+
+    @property
+    def num_entries(self):
+        return len(self.entries)
+
+    @property
+    def hits(self):
+        return self.hits
+
+    @property
+    def misses(self):
+        return self.misses
+
+    @property
+    def evictions(self):
+        return self.evictions
+
+    @property
+    def merges(self):
+        return self.merges
+
+    @property
+    def invalidations(self):
+        return self.invalidations
+
+    def __str__(self):
+        print_format = '{:22}: {:<20}\n'
+        return 'MRCache:\n' + \
+               print_format.format('Entries', self.num_entries) + \
+               print_format.format('Registered bytes', self.reg_bytes) + \
+               print_format.format('Budget', str(self.max_bytes)) + \
+               print_format.format('Hits', self.hits) + \
+               print_format.format('Misses', self.misses) + \
+               print_format.format('Evictions', self.evictions) + \
+               print_format.format('Merges', self.merges) + \
+               print_format.format('Invalidations', self.invalidations)
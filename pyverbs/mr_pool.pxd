@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+#cython: language_level=3
+
+from pyverbs.base cimport PyverbsCM
+from pyverbs.wr cimport SGE
+from pyverbs cimport libibverbs as v
+
+
+cdef class MRPool(PyverbsCM):
+    cdef object mr
+    cdef object sizes
+    cdef object strides
+    cdef object free_lists
+    cdef size_t length
+    cdef size_t top
+    cdef size_t align
+    cdef size_t slab_size
+    cdef unsigned long num_allocated
+    cpdef close(self)
+    cdef carve(self, int size_class)
+    cdef put(self, size_t offset, int size_class)
+
+cdef class MRChunk(SGE):
+    cdef object pool
+    cdef size_t offset
+    cdef int size_class
+    cdef size_t size
+    cdef unsigned int rkey
+    cdef v.ibv_sge *get_sge(self) except NULL
@@ -0,0 +1,221 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+from libc.stdint cimport uintptr_t
+from bisect import bisect_left
+
+from pyverbs.pyverbs_error import PyverbsError, PyverbsUserError
+cimport pyverbs.libibverbs_enums as e
+from pyverbs cimport libibverbs as v
+from pyverbs.mr cimport MR
+from pyverbs.pd cimport PD
+
+DEFAULT_SIZE_CLASSES = (64, 256, 1024, 4096, 16384, 65536)
+
+
+cdef class MRPool(PyverbsCM):
+    """
+    A slab allocator over a single MR. Chunks are allocated from size
+    classes; each class keeps a free list of chunks and is refilled by
+    carving a slab out of the MR when it runs out of free chunks, so
+    allocating and freeing a chunk are O(1). Freed chunks are kept in their
+    class for reuse, the MR's memory is never returned to other classes.
+    """
+    def __init__(self, PD pd not None, length, access=e.IBV_ACCESS_LOCAL_WRITE,
+                 size_classes=DEFAULT_SIZE_CLASSES, align=64, slab_size=65536,
+                 huge_page_size=None):
+        """
+        Registers an MR of <length> bytes to allocate chunks from.
+        :param pd: The PD to register the MR with
+        :param length: Length of the MR
+        :param access: The MR's access flags
+        :param size_classes: Chunk sizes to allocate. A request is served by
+                             the smallest class that fits it.
+        :param align: Alignment of the chunks, a power of 2
+        :param slab_size: Number of bytes carved out of the MR at once when
+                          a size class runs out of free chunks
+        :param huge_page_size: If set, the MR's buffer is allocated from huge
+                               pages of this size
+        :return: An MRPool object
+        """
+        super().__init__()
+        if align <= 0 or align & (align - 1):
+            raise PyverbsUserError(f'Invalid alignment {align}')
+        if not size_classes or min(size_classes) <= 0:
+            raise PyverbsUserError(f'Invalid size classes {size_classes}')
+        if length <= 0 or slab_size <= 0:
+            raise PyverbsUserError(f'Invalid pool length {length} or slab '
+                                   f'size {slab_size}')
+        if huge_page_size is None:
+            self.mr = MR(pd, length, access)
+        else:
+            self.mr = MR(pd, length, access | e.IBV_ACCESS_HUGETLB,
+                         huge_page_size=huge_page_size)
+        self.length = length
+        self.align = align
+        self.slab_size = slab_size
+        self.sizes = sorted(size_classes)
+        self.strides = [(size + align - 1) & ~(align - 1)
+                        for size in self.sizes]
+        self.free_lists = [[] for _ in self.sizes]
+        if self.debug_enabled():
+            self.logger.debug(f'Created MRPool of {length} bytes')
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        """
+        Deregisters the pool's MR. Chunks that weren't freed can't be used
+        afterwards.
+        :return: None
+        """
+        if self.mr is not None:
+            if self.logger:
+                self.logger.debug('Closing MRPool')
+            self.mr.close()
+            self.mr = None
+            self.free_lists = None
+
+    cdef carve(self, int size_class):
+        """
+        Refills a size class's free list with the chunks of a new slab.
+        """
+        cdef Py_ssize_t stride = self.strides[size_class]
+        cdef Py_ssize_t start, num
+        start = (self.top + self.align - 1) & ~(self.align - 1)
+        if start + stride > self.length:
+            raise PyverbsError(f'The pool has no room for more chunks of '
+                               f'{self.sizes[size_class]} bytes')
+        num = min(max(self.slab_size // stride, 1),
+                  (self.length - start) // stride)
+        # Pushed in reverse so that chunks are allocated in address order
+        self.free_lists[size_class].extend(
+            range(start + (num - 1) * stride, start - 1, -stride))
+        self.top = start + num * stride
+
+    cdef put(self, size_t offset, int size_class):
+        if self.free_lists is not None:
+            self.free_lists[size_class].append(offset)
+            self.num_allocated -= 1
+
+    def alloc(self, length):
+        """
+        Allocates a chunk of at least <length> bytes.
+        :param length: Requested length
+        :return: An MRChunk. It can be used wherever an SGE is accepted.
+        """
+        cdef int size_class
+        if self.mr is None or (<MR>self.mr).mr == NULL:
+            raise PyverbsUserError('The MR pool is closed')
+        size_class = bisect_left(self.sizes, length)
+        if length <= 0 or size_class == len(self.sizes):
+            raise PyverbsUserError(f'No size class fits {length} bytes')
+        free_list = self.free_lists[size_class]
+        if not free_list:
+            self.carve(size_class)
+        chunk = MRChunk(self, free_list.pop(), size_class, length)
+        self.num_allocated += 1
+        return chunk
+
+    def free(self, MRChunk chunk not None):
+        """
+        Returns a chunk to the pool. Same as chunk.close().
+        :param chunk: The chunk to free
+        :return: None
+        """
+        if chunk.pool is not self:
+            raise PyverbsUserError('The chunk doesn\'t belong to this pool')
+        chunk.close()
+
+    def num_free(self, size):
+        """
+        :param size: A size class
+        :return: The number of free chunks carved for the size class
+        """
+        return len(self.free_lists[self.sizes.index(size)])
+
+    @property
+    def mr(self):
+        return self.mr
+
+    @property
+    def lkey(self):
+        return self.mr.lkey
+
+    @property
+    def rkey(self):
+        return self.mr.rkey
+
+    @property
+    def size_classes(self):
+        return tuple(self.sizes)
+
+    @property
+    def num_allocated(self):
+        return self.num_allocated
+
+    @property
+    def used_bytes(self):
+        """
+        Number of bytes carved out of the MR
+        """
+        return self.top
+
+
+cdef class MRChunk(SGE):
+    """
+    A chunk of an MRPool's MR. It's an SGE of the chunk's address, requested
+    length and the MR's lkey, so it can be passed to SendWR, RecvWR and
+    QPEx.wr_set_sge() as is. Closing the chunk returns it to the pool, after
+    which the chunk can't be used, nor once the pool is closed.
+    """
+    def __init__(self, MRPool pool not None, offset, size_class, length):
+        cdef MR mr = pool.mr
+        super().__init__(<uintptr_t>mr.buf + offset, length, mr.mr.lkey)
+        self.pool = pool
+        self.offset = offset
+        self.size_class = size_class
+        self.size = pool.sizes[size_class]
+        self.rkey = mr.mr.rkey
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        if self.pool is not None:
+            # The chunk's memory may be handed out again
+            self.sge.length = 0
+            self.sge.lkey = 0
+            (<MRPool>self.pool).put(self.offset, self.size_class)
+            self.pool = None
+            SGE.close(self)
+
+    cdef v.ibv_sge *get_sge(self) except NULL:
+        """
+        Returns the chunk's ibv_sge, after checking that the chunk wasn't
+        freed and that its pool's MR is still registered.
+        """
+        if self.pool is None:
+            raise PyverbsUserError('The MR chunk was freed')
+        mr = (<MRPool>self.pool).mr
+        if mr is None or (<MR>mr).mr == NULL:
+            raise PyverbsUserError('The MR pool of this chunk was closed')
+        return self.sge
+
+    @property
+    def rkey(self):
+        return self.rkey
+
+    @property
+    def offset(self):
+        """
+        The chunk's offset in the pool's MR
+        """
+        return self.offset
+
+    @property
+    def size(self):
+        """
+        The size of the chunk, which may be larger than its length
+        """
+        return self.size
@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+#cython: language_level=3
+
+from libc.stdint cimport uint32_t
+
+from pyverbs.base cimport PyverbsCM
+cimport pyverbs.libibverbs as v
+
+
+cdef class ODPPrefetcher(PyverbsCM):
+    cdef object pd
+    cdef v.ibv_sge *sges
+    cdef unsigned int max_sges
+    cdef uint32_t advice
+    cdef uint32_t flags
+    cdef unsigned int lookahead
+    cdef object queue
+    cdef unsigned int num_advised
+    cdef object resident
+    cdef unsigned long advise_calls
+    cdef unsigned long requested_sges
+    cdef unsigned long coalesced_sges
+    cdef unsigned long advised_sges
+    cdef unsigned long advised_bytes
+    cdef unsigned long skipped_bytes
+    cpdef close(self)
+    cdef advise(self, ranges)
+    cdef missing(self, uint32_t lkey, start, end)
+    cdef mark_resident(self, uint32_t lkey, start, end)
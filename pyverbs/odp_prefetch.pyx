@@ -0,0 +1,288 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+from libc.stdlib cimport calloc, free
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, \
+    PyverbsUserError
+cimport pyverbs.libibverbs_enums as e
+from pyverbs.pd cimport PD
+
+# ibv_sge's length is 32 bits wide, larger ranges are split
+MAX_SGE_LENGTH = 1 << 31
+
+
+cdef class ODPPrefetcher(PyverbsCM):
+    """
+    Prefetches the SG lists of upcoming sends of on-demand paging MRs.
+    The SG lists are submitted in the order they'll be sent, and next() is
+    called before each send. The prefetcher keeps the next <lookahead> SG
+    lists advised ahead of the sends: when less than half of them are, the
+    rest of the window is advised at once. The SGEs of a batch are coalesced
+    into contiguous ranges per lkey, ranges that were already prefetched are
+    skipped, and the rest are advised using as few ibv_advise_mr() calls as
+    possible, asynchronously by default.
+    The prefetcher can't tell when the kernel invalidates prefetched pages
+    (e.g. when the buffer is unmapped or madvised away), invalidate() must
+    be called for such ranges.
+    """
+    def __init__(self, PD pd not None,
+                 advice=e.IBV_ADVISE_MR_ADVICE_PREFETCH_WRITE, flags=0,
+                 lookahead=16, max_sges=32):
+        """
+        Initializes an ODPPrefetcher object.
+        :param pd: The PD of the ODP MRs
+        :param advice: The prefetch advice, see ibv_advise_mr_advice enum
+        :param flags: ibv_advise_mr() flags. Defaults to asynchronous
+                      prefetch, pass IBV_ADVISE_MR_FLAG_FLUSH to wait for the
+                      pages to be mapped.
+        :param lookahead: Number of submitted SG lists to keep advised ahead
+                          of the sends
+        :param max_sges: Maximum number of SGEs per ibv_advise_mr() call
+        :return: An ODPPrefetcher object
+        """
+        super().__init__()
+        if lookahead <= 0 or max_sges <= 0:
+            raise PyverbsUserError(f'Invalid lookahead {lookahead} or max '
+                                   f'SGEs {max_sges}')
+        self.sges = <v.ibv_sge*>calloc(max_sges, sizeof(v.ibv_sge))
+        if self.sges == NULL:
+            raise MemoryError('Failed to allocate SGEs')
+        self.pd = pd
+        self.advice = advice
+        self.flags = flags
+        self.lookahead = lookahead
+        self.max_sges = max_sges
+        self.queue = deque()
+        # lkey -> ([starts], [ends]) of the disjoint prefetched ranges
+        self.resident = {}
+        self.logger.debug('Created ODPPrefetcher')
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        if self.sges != NULL:
+            if self.logger:
+                self.logger.debug('Closing ODPPrefetcher')
+            free(self.sges)
+            self.sges = NULL
+            self.pd = None
+            self.queue = None
+
+    def submit(self, sg_list):
+        """
+        Queues the SG list of an upcoming send.
+        :param sg_list: A list of SGE objects or (addr, length, lkey) tuples
+        :return: None
+        """
+        if self.sges == NULL:
+            raise PyverbsUserError('The prefetcher is closed')
+        ranges = tuple((sge.addr, sge.length, sge.lkey)
+                       if not isinstance(sge, tuple) else sge
+                       for sge in sg_list)
+        self.queue.append((sg_list, ranges))
+
+    def next(self):
+        """
+        Pops the next submitted SG list, to be sent now. Advises the upcoming
+        SG lists first if less than half of the lookahead window is advised.
+        :return: The SG list, as it was submitted
+        """
+        if not self.queue:
+            raise PyverbsUserError('No submitted SG lists')
+        if self.num_advised <= self.lookahead // 2:
+            end = min(self.lookahead, len(self.queue))
+            self.advise([r for i in range(self.num_advised, end)
+                         for r in self.queue[i][1]])
+            self.num_advised = end
+        self.num_advised -= 1
+        return self.queue.popleft()[0]
+
+    def flush(self):
+        """
+        Advises all the submitted SG lists that weren't advised yet.
+        :return: None
+        """
+        self.advise([r for i in range(self.num_advised, len(self.queue))
+                     for r in self.queue[i][1]])
+        self.num_advised = len(self.queue)
+
+    def prefetch(self, sg_list):
+        """
+        Advises an SG list right away, coalescing its SGEs and skipping the
+        ranges that were already prefetched.
+        :param sg_list: A list of SGE objects or (addr, length, lkey) tuples
+        :return: None
+        """
+        self.advise([(sge.addr, sge.length, sge.lkey)
+                     if not isinstance(sge, tuple) else sge
+                     for sge in sg_list])
+
+    def invalidate(self, addr=None, length=None, lkey=None):
+        """
+        Forgets that a range was prefetched, so it's advised again when it's
+        used. Must be called when the kernel may have invalidated its pages.
+        :param addr: Start address of the range. If None, all the prefetched
+                     ranges (of <lkey>, if given) are forgotten.
+        :param length: Length of the range
+        :param lkey: The range's lkey. If None, the range is forgotten for
+                     all lkeys.
+        :return: None
+        """
+        lkeys = list(self.resident) if lkey is None else [lkey]
+        for key in lkeys:
+            if key not in self.resident:
+                continue
+            if addr is None:
+                del self.resident[key]
+                continue
+            starts, ends = self.resident[key]
+            end = addr + length
+            i = bisect_right(ends, addr)
+            j = bisect_left(starts, end)
+            if i >= j:
+                continue
+            # Keep the parts of the edge ranges outside [addr, end)
+            new_starts, new_ends = [], []
+            if starts[i] < addr:
+                new_starts.append(starts[i])
+                new_ends.append(addr)
+            if ends[j - 1] > end:
+                new_starts.append(end)
+                new_ends.append(ends[j - 1])
+            starts[i:j] = new_starts
+            ends[i:j] = new_ends
+
+    cdef missing(self, uint32_t lkey, start, end):
+        """
+        :return: The parts of [start, end) that weren't prefetched, as
+                 (start, end) tuples
+        """
+        if lkey not in self.resident:
+            return [(start, end)]
+        starts, ends = self.resident[lkey]
+        res = []
+        pos = start
+        i = bisect_right(ends, start)
+        while i < len(starts) and starts[i] < end:
+            if starts[i] > pos:
+                res.append((pos, starts[i]))
+            pos = max(pos, ends[i])
+            i += 1
+        if pos < end:
+            res.append((pos, end))
+        return res
+
+    cdef mark_resident(self, uint32_t lkey, start, end):
+        starts, ends = self.resident.setdefault(lkey, ([], []))
+        # Merge with the overlapping and adjacent ranges
+        i = bisect_left(ends, start)
+        j = bisect_right(starts, end)
+        if i < j:
+            start = min(start, starts[i])
+            end = max(end, ends[j - 1])
+        starts[i:j] = [start]
+        ends[i:j] = [end]
+
+    cdef advise(self, ranges):
+        """
+        Coalesces (addr, length, lkey) ranges and advises the parts that
+        weren't prefetched yet.
+        """
+        cdef unsigned int num = 0
+        cdef int rc
+        if not ranges:
+            return
+        if self.sges == NULL or (<PD>self.pd).pd == NULL:
+            raise PyverbsUserError('The prefetcher or its PD is closed')
+        self.requested_sges += len(ranges)
+        merged = []
+        # Sorted by lkey and address, adjacent and overlapping ranges of an
+        # lkey are merged
+        for addr, length, lkey in sorted(ranges, key=lambda r: (r[2], r[0])):
+            if merged and merged[-1][0] == lkey and addr <= merged[-1][2]:
+                merged[-1][2] = max(merged[-1][2], addr + length)
+            else:
+                merged.append([lkey, addr, addr + length])
+        self.coalesced_sges += len(ranges) - len(merged)
+        pieces = []
+        for lkey, start, end in merged:
+            missing = self.missing(lkey, start, end)
+            for s, t in missing:
+                for chunk in range(s, t, MAX_SGE_LENGTH):
+                    pieces.append((chunk, min(MAX_SGE_LENGTH, t - chunk), lkey))
+            self.skipped_bytes += end - start - sum(t - s for s, t in missing)
+        if not pieces:
+            return
+        for i, (addr, length, lkey) in enumerate(pieces):
+            self.sges[num].addr = addr
+            self.sges[num].length = length
+            self.sges[num].lkey = lkey
+            num += 1
+            if num < self.max_sges and i < len(pieces) - 1:
+                continue
+            rc = v.ibv_advise_mr((<PD>self.pd).pd, self.advice, self.flags,
+                                 self.sges, num)
+            if rc:
+                raise PyverbsRDMAError('Failed to advise MR', rc)
+            self.advise_calls += 1
+            num = 0
+        self.advised_sges += len(pieces)
+        self.advised_bytes += sum(length for _, length, _ in pieces)
+        if self.advice != e.IBV_ADVISE_MR_ADVICE_PREFETCH_NO_FAULT:
+            # NO_FAULT only maps pages that are already present
+            for lkey, start, end in merged:
+                self.mark_resident(lkey, start, end)
+
+    @property
+    def lookahead(self):
+        return self.lookahead
+
+    @property
+    def num_queued(self):
+        return len(self.queue)
+
+    @property
+    def advise_calls(self):
+        return self.advise_calls
+
+    @property
+    def requested_sges(self):
+        return self.requested_sges
+
+    @property
+    def coalesced_sges(self):
+        """
+        Number of requested SGEs that were merged into adjacent ones
+        """
+        return self.coalesced_sges
+
+    @property
+    def advised_sges(self):
+        return self.advised_sges
+
+    @property
+    def advised_bytes(self):
+        return self.advised_bytes
+
+    @property
+    def skipped_bytes(self):
+        """
+        Number of requested bytes that weren't advised since they were
+        already prefetched
+        """
+        return self.skipped_bytes
+
+    def __str__(self):
+        print_format = '{:22}: {:<20}\n'
+        return 'ODPPrefetcher:\n' + \
+               print_format.format('Lookahead', self.lookahead) + \
+               print_format.format('Queued SG lists', self.num_queued) + \
+               print_format.format('Advise calls', self.advise_calls) + \
+               print_format.format('Requested SGEs', self.requested_sges) + \
+               print_format.format('Coalesced SGEs', self.coalesced_sges) + \
+               print_format.format('Advised SGEs', self.advised_sges) + \
+               print_format.format('Advised bytes', self.advised_bytes) + \
+               print_format.format('Skipped bytes', self.skipped_bytes)
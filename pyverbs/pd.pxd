@@ -6,7 +6,7 @@
 from pyverbs.base cimport PyverbsObject
 from pyverbs.device cimport Context
 cimport pyverbs.libibverbs as v
-from .base cimport PyverbsCM
+from .base cimport PyverbsCM, DepRegistry
 
 
 cdef class PD(PyverbsCM):
@@ -14,15 +14,7 @@ cdef class PD(PyverbsCM):
     cdef Context ctx
     cdef add_ref(self, obj)
     cdef remove_ref(self, obj)
-    cdef object srqs
-    cdef object mrs
-    cdef object mws
-    cdef object ahs
-    cdef object qps
-    cdef object parent_domains
-    cdef object wqs
-    cdef object mkeys
-    cdef object deks
+    cdef DepRegistry deps
     cdef object _is_imported
 
 cdef class ParentDomainInitAttr(PyverbsObject):
@@ -34,7 +26,6 @@ cdef class ParentDomainInitAttr(PyverbsObject):
 cdef class ParentDomain(PD):
     cdef add_ref(self, obj)
     cdef object protection_domain
-    cdef object cqs
 
 cdef class ParentDomainContext(PyverbsObject):
     cdef object p_alloc
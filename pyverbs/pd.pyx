@@ -4,18 +4,26 @@
 #cython: legacy_implicit_noexcept=True
 
 from libc.stdint cimport uintptr_t, uint32_t
-from libc.stdlib cimport malloc
-import weakref
-import logging
+from libc.stdlib cimport malloc, free
+from concurrent.futures import ThreadPoolExecutor
+import resource
+import errno
+import time
+import os
 
 from pyverbs.pyverbs_error import PyverbsUserError, PyverbsError, \
     PyverbsRDMAError
+from pyverbs.mem_alloc import madvise, MADV_POPULATE_READ_, \
+    MADV_POPULATE_WRITE_
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+cimport pyverbs.libibverbs_enums as e
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.wr cimport copy_sg_array
 from pyverbs.device cimport Context
 from pyverbs.cmid cimport CMID
 from .mr cimport MR, MW, DMMR
+from .mr_cache cimport MRCache
+from .qp_pool cimport QPPool
 from pyverbs.srq cimport SRQ
 from pyverbs.addr cimport AH
 from pyverbs.cq cimport CQEX
@@ -23,6 +31,17 @@ from pyverbs.qp cimport QP
 from pyverbs.wq cimport WQ
 
 
+cdef populate(chunk, advice):
+    """
+    Prefaults the pages of an (address, length) range, which doesn't have to
+    be page aligned.
+    """
+    addr, length = chunk
+    page_size = resource.getpagesize()
+    start = addr - addr % page_size
+    madvise(start, addr + length - start, advice)
+
+
 cdef class PD(PyverbsCM):
     def __init__(self, object creator not None, **kwargs):
         """
@@ -61,15 +80,7 @@ cdef class PD(PyverbsCM):
         self.ctx.add_ref(self)
         if self.logger:
             self.logger.debug('Created PD')
-        self.srqs = weakref.WeakSet()
-        self.mrs = weakref.WeakSet()
-        self.mws = weakref.WeakSet()
-        self.ahs = weakref.WeakSet()
-        self.qps = weakref.WeakSet()
-        self.parent_domains = weakref.WeakSet()
-        self.mkeys = weakref.WeakSet()
-        self.deks = weakref.WeakSet()
-        self.wqs = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     def advise_mr(self, advise, uint32_t flags, sg_list not None):
         """
@@ -84,10 +95,88 @@ cdef class PD(PyverbsCM):
         dst_sg_list = <v.ibv_sge*>malloc(num_sges * sizeof(v.ibv_sge))
         copy_sg_array(dst_sg_list, sg_list, num_sges)
         rc = v.ibv_advise_mr(self.pd, advise, flags, dst_sg_list, num_sges)
+        free(dst_sg_list)
         if rc:
             raise PyverbsRDMAError('Failed to advise MR', rc)
         return rc
 
+    def reg_mrs(self, ranges, access=e.IBV_ACCESS_LOCAL_WRITE, workers=None,
+                chunk_size=None, prefault=True):
+        """
+        Registers many memory regions concurrently. The ranges are registered
+        from a thread pool; since ibv_reg_mr() is called with the GIL released,
+        the pinning of the regions proceeds in parallel.
+        :param ranges: (address, length) tuples of the buffers to register
+        :param access: Access flags of the MRs, see ibv_access_flags enum
+        :param workers: Number of registering threads. Defaults to the number
+                        of CPUs.
+        :param chunk_size: If set, ranges larger than it are split into MRs of
+                           at most <chunk_size> bytes (rounded up to a page
+                           size multiple), so a single huge region is
+                           registered in parallel as well.
+        :param prefault: Populate the ranges' page tables in parallel using
+                         madvise() before registering them. Ignored if the
+                         kernel doesn't support MADV_POPULATE_(READ|WRITE).
+        :return: A tuple of the list of MRs, in the order of the ranges and
+                 their chunks, and a dict of statistics: the number of MRs and
+                 bytes, the number of workers, and the prefault, registration
+                 and total elapsed times in seconds.
+        """
+        workers = os.cpu_count() if workers is None else workers
+        if workers <= 0:
+            raise PyverbsUserError(f'Invalid number of workers {workers}')
+        chunks = []
+        if chunk_size is not None:
+            if chunk_size <= 0:
+                raise PyverbsUserError(f'Invalid chunk size {chunk_size}')
+            page_size = resource.getpagesize()
+            chunk_size = (chunk_size + page_size - 1) // page_size * page_size
+        for addr, length in ranges:
+            if addr <= 0 or length <= 0:
+                raise PyverbsUserError(f'Invalid range: address {addr}, '
+                                       f'length {length}')
+            if chunk_size is None:
+                chunks.append((addr, length))
+                continue
+            for offset in range(0, length, chunk_size):
+                chunks.append((addr + offset, min(chunk_size, length - offset)))
+        stats = {'num_mrs': len(chunks), 'bytes': sum(l for _, l in chunks),
+                 'workers': workers, 'prefault_time': 0.0}
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            if prefault:
+                advice = MADV_POPULATE_WRITE_ \
+                    if access & e.IBV_ACCESS_LOCAL_WRITE else MADV_POPULATE_READ_
+                prefault_start = time.perf_counter()
+                try:
+                    list(pool.map(lambda c: populate(c, advice), chunks))
+                except PyverbsRDMAError as ex:
+                    if ex.error_code != errno.EINVAL:
+                        raise ex
+                    self.logger.debug('Prefaulting isn\'t supported')
+                stats['prefault_time'] = time.perf_counter() - prefault_start
+            reg_start = time.perf_counter()
+            futures = [pool.submit(MR, self, length, access, address=addr)
+                       for addr, length in chunks]
+            mrs = []
+            error = None
+            for future in futures:
+                try:
+                    mrs.append(future.result())
+                except Exception as ex:
+                    error = error or ex
+        if error is not None:
+            for mr in mrs:
+                mr.close()
+            raise error
+        end_time = time.perf_counter()
+        stats['reg_time'] = end_time - reg_start
+        stats['total_time'] = end_time - start_time
+        if self.debug_enabled():
+            self.logger.debug(f'Registered {len(mrs)} MRs of {stats["bytes"]} '
+                              f'bytes in {stats["total_time"]:.3f} seconds')
+        return mrs, stats
+
     def unimport(self):
         v.ibv_unimport_pd(self.pd)
         self.close()
@@ -112,8 +201,9 @@ cdef class PD(PyverbsCM):
         if self.pd != NULL:
             if self.logger:
                 self.logger.debug('Closing PD')
-            close_weakrefs([self.deks, self.mkeys, self.parent_domains, self.qps,
-                            self.wqs, self.ahs, self.mws, self.mrs, self.srqs])
+            close_deps(self.deps, ('deks', 'mkeys', 'parent_domains',
+                                   'qp_pools', 'qps', 'wqs', 'ahs', 'mws',
+                                   'mr_caches', 'mrs', 'srqs'))
             if not self._is_imported:
                 rc = v.ibv_dealloc_pd(self.pd)
                 if rc != 0:
@@ -123,25 +213,29 @@ cdef class PD(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, MR) or isinstance(obj, DMMR):
-            self.mrs.add(obj)
+            self.deps.add('mrs', obj)
         elif isinstance(obj, MW):
-            self.mws.add(obj)
+            self.deps.add('mws', obj)
+        elif isinstance(obj, MRCache):
+            self.deps.add('mr_caches', obj)
+        elif isinstance(obj, QPPool):
+            self.deps.add('qp_pools', obj)
         elif isinstance(obj, AH):
-            self.ahs.add(obj)
+            self.deps.add('ahs', obj)
         elif isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         elif isinstance(obj, SRQ):
-            self.srqs.add(obj)
+            self.deps.add('srqs', obj)
         elif isinstance(obj, ParentDomain):
-            self.parent_domains.add(obj)
+            self.deps.add('parent_domains', obj)
         elif isinstance(obj, WQ):
-            self.wqs.add(obj)
+            self.deps.add('wqs', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
     cdef remove_ref(self, obj):
         if isinstance(obj, MR):
-            self.mrs.remove(obj)
+            self.deps.remove('mrs', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -253,17 +347,12 @@ cdef class ParentDomain(PD):
         :param attr: Attribute of type ParentDomainInitAttr to initialize the
                      ParentDomain with
         """
-        # Initialize the logger here as the parent's __init__ is called after
-        # the PD is allocated. Allocation can fail, which will lead to exceptions
-        # thrown during object's teardown.
-        self.logger = logging.getLogger(self.__class__.__name__)
         (<PD>attr.pd).add_ref(self)
         self.protection_domain = attr.pd
         self.pd = v.ibv_alloc_parent_domain(context.context, &attr.init_attr)
         if self.pd == NULL:
             raise PyverbsRDMAErrno('Failed to allocate Parent Domain')
         super().__init__(context)
-        self.cqs = weakref.WeakSet()
         self.logger.debug('Allocated ParentDomain')
 
     def __dealloc__(self):
@@ -273,11 +362,11 @@ cdef class ParentDomain(PD):
         if self.pd != NULL:
             if self.logger:
                 self.logger.debug('Closing ParentDomain')
-            close_weakrefs([self.cqs])
+            close_deps(self.deps, ('cqs',))
             super(ParentDomain, self).close()
 
     cdef add_ref(self, obj):
         if isinstance(obj, CQEX):
-            self.cqs.add(obj)
+            self.deps.add('cqs', obj)
         else:
             PD.add_ref(self, obj)
@@ -3,11 +3,13 @@
 
 #cython: language_level=3
 
+from libc.stdint cimport uint64_t
+
 cimport pyverbs.providers.efa.libefa as dv
 
 from pyverbs.addr cimport AH
 from pyverbs.base cimport PyverbsObject
-from pyverbs.cq cimport CQEX
+from pyverbs.cq cimport CQEX, cqex_record
 from pyverbs.device cimport Context
 from pyverbs.qp cimport QP, QPEx
 
@@ -42,6 +44,8 @@ cdef class EfaQPInitAttr(PyverbsObject):
 
 cdef class EfaCQ(CQEX):
     cdef dv.efadv_cq *dv_cq
+    cdef uint64_t dv_wc_flags
+    cdef int read_dv_fields(self, cqex_record *rec) except -1
 
 
 cdef class EfaDVCQInitAttr(PyverbsObject):
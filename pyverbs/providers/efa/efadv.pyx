@@ -6,7 +6,8 @@ cimport pyverbs.providers.efa.libefa as dv
 
 from pyverbs.addr cimport GID
 from pyverbs.base import PyverbsRDMAErrno, PyverbsRDMAError
-from pyverbs.cq cimport CQEX, CqInitAttrEx
+from pyverbs.cq cimport CQEX, CqInitAttrEx, cqex_record
+from libc.string cimport memcpy
 from pyverbs.libibverbs_enums import ibv_qp_attr_mask
 cimport pyverbs.libibverbs as v
 from pyverbs.pd cimport PD
@@ -255,10 +256,24 @@ cdef class EfaCQ(CQEX):
             raise PyverbsRDMAErrno('Failed to create EFA CQ')
         self.ibv_cq = v.ibv_cq_ex_to_cq(self.cq)
         self.dv_cq = dv.efadv_cq_from_ibv_cq_ex(self.cq)
+        self.dv_wc_flags = efa_init_attr.cq_init_attr.wc_flags
         self.context = ctx
         ctx.add_ref(self)
         super().__init__(ctx, attr_ex)
 
+    cdef int read_dv_fields(self, cqex_record *rec) except -1:
+        """
+        Collects the source GID of the current completion for CQEX.drain()
+        when the CQ was created with EFADV_WC_EX_WITH_SGID.
+        """
+        cdef v.ibv_gid sgid
+        if not self.dv_wc_flags & dve.EFADV_WC_EX_WITH_SGID:
+            return 0
+        if dv.efadv_wc_read_sgid(self.dv_cq, &sgid) == 0:
+            memcpy(rec.sgid, sgid.raw, sizeof(rec.sgid))
+            rec.sgid_valid = 1
+        return 1
+
     def read_sgid(self):
         """
         Read SGID from last work completion, if AH is unknown.
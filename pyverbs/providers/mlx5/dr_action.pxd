@@ -7,14 +7,13 @@ from pyverbs.providers.mlx5.dr_domain cimport DrDomain
 from pyverbs.providers.mlx5.mlx5dv cimport Mlx5DevxObj
 from pyverbs.providers.mlx5.dr_table cimport DrTable
 cimport pyverbs.providers.mlx5.libmlx5 as dv
-from pyverbs.base cimport PyverbsCM
+from pyverbs.base cimport PyverbsCM, DepRegistry
 from pyverbs.qp cimport QP
 
 
 cdef class DrAction(PyverbsCM):
     cdef dv.mlx5dv_dr_action *action
-    cdef object dr_rules
-    cdef object dr_used_actions
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
 
 cdef class DrActionQp(DrAction):
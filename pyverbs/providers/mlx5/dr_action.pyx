@@ -7,11 +7,10 @@ from pyverbs.providers.mlx5.mlx5dv cimport Mlx5DevxObj
 from pyverbs.providers.mlx5.dr_rule cimport DrRule
 from pyverbs.providers.mlx5.mlx5_enums import mlx5dv_dr_action_dest_type
 from pyverbs.pyverbs_error import PyverbsError
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from libc.stdlib cimport calloc, free
 from libc.stdint cimport uint32_t, uint8_t
 from libc.string cimport memcpy
-import weakref
 import struct
 import errno
 
@@ -22,14 +21,13 @@ ACTION_SIZE = 8
 cdef class DrAction(PyverbsCM):
     def __init__(self):
         super().__init__()
-        self.dr_rules = weakref.WeakSet()
-        self.dr_used_actions = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     cdef add_ref(self, obj):
         if isinstance(obj, DrRule):
-            self.dr_rules.add(obj)
+            self.deps.add('dr_rules', obj)
         elif isinstance(obj, DrAction):
-            self.dr_used_actions.add(obj)
+            self.deps.add('dr_used_actions', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -40,7 +38,7 @@ cdef class DrAction(PyverbsCM):
         if self.action != NULL:
             if self.logger:
                 self.logger.debug('Closing DrAction.')
-            close_weakrefs([self.dr_rules, self.dr_used_actions])
+            close_deps(self.deps, ('dr_rules', 'dr_used_actions'))
             rc = dv.mlx5dv_dr_action_destroy(self.action)
             if rc:
                 raise PyverbsRDMAError('Failed to destroy DrAction.', rc)
@@ -54,7 +52,7 @@ cdef class DrActionQp(DrAction):
         if self.action == NULL:
             raise PyverbsRDMAErrno('DrActionQp creation failed.')
         self.qp = <QP>qp
-        qp.dr_actions.add(self)
+        qp.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -124,7 +122,7 @@ cdef class DrActionModify(DrAction):
         if self.action == NULL:
             raise PyverbsRDMAErrno('Failed to create dr action modify header')
         self.domain = domain
-        domain.dr_actions.add(self)
+        domain.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -158,7 +156,7 @@ cdef class DrActionDestTable(DrAction):
         if self.action == NULL:
             raise PyverbsRDMAErrno('DrActionDestTable creation failed.')
         self.table = table
-        table.dr_actions.add(self)
+        table.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -193,7 +191,7 @@ cdef class DrActionPushVLan(DrAction):
                                                            <uint32_t>vlan_hdr)
         if self.action == NULL:
             raise PyverbsRDMAErrno('DrActionPushVLan creation failed.')
-        domain.dr_actions.add(self)
+        domain.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -279,7 +277,7 @@ cdef class DrActionDestArray(DrAction):
         if self.action == NULL:
             raise PyverbsRDMAErrno('DrActionDestArray creation failed.')
         free(ptr_list)
-        domain.dr_actions.add(self)
+        domain.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -315,7 +313,7 @@ cdef class DrActionVPort(DrAction):
             raise PyverbsRDMAErrno('Failed to create dr VPort action')
         self.domain = domain
         self.vport = vport
-        domain.dr_actions.add(self)
+        domain.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -339,7 +337,7 @@ cdef class DrActionIBPort(DrAction):
             raise PyverbsRDMAErrno('Failed to create dr IB port action')
         self.domain = domain
         self.ib_port = ib_port
-        domain.dr_actions.add(self)
+        domain.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -389,7 +387,7 @@ cdef class DrActionPacketReformat(DrAction):
         if self.action == NULL:
             raise PyverbsRDMAErrno('Failed to create dr action packet reformat')
         self.domain = domain
-        domain.dr_actions.add(self)
+        domain.deps.add('dr_actions', self)
 
     def __dealloc__(self):
         self.close()
@@ -4,11 +4,10 @@
 #cython: language_level=3
 
 cimport pyverbs.providers.mlx5.libmlx5 as dv
-from pyverbs.base cimport PyverbsCM
+from pyverbs.base cimport PyverbsCM, DepRegistry
 
 cdef class DrDomain(PyverbsCM):
     cdef dv.mlx5dv_dr_domain *domain
-    cdef object dr_tables
+    cdef DepRegistry deps
     cdef object context
-    cdef object dr_actions
     cdef add_ref(self, obj)
@@ -5,11 +5,10 @@ from pyverbs.base import PyverbsRDMAErrno, PyverbsRDMAError
 from pyverbs.providers.mlx5.dr_action cimport DrAction
 from pyverbs.providers.mlx5.dr_table cimport DrTable
 from pyverbs.pyverbs_error import PyverbsError
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.device cimport Context
 cimport pyverbs.libibverbs as v
 cimport libc.stdio as s
-import weakref
 
 
 cdef class DrDomain(PyverbsCM):
@@ -23,10 +22,9 @@ cdef class DrDomain(PyverbsCM):
         self.domain = dv.mlx5dv_dr_domain_create(<v.ibv_context*>context.context, domain_type)
         if self.domain == NULL:
             raise PyverbsRDMAErrno('DrDomain creation failed.')
-        self.dr_tables = weakref.WeakSet()
+        self.deps = DepRegistry()
         self.context = context
-        context.dr_domains.add(self)
-        self.dr_actions = weakref.WeakSet()
+        context.deps.add('dr_domains', self)
 
     def allow_duplicate_rules(self, allow):
         """
@@ -38,9 +36,9 @@ cdef class DrDomain(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, DrTable):
-            self.dr_tables.add(obj)
+            self.deps.add('dr_tables', obj)
         elif isinstance(obj, DrAction):
-            self.dr_actions.add(obj)
+            self.deps.add('dr_actions', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -82,7 +80,7 @@ cdef class DrDomain(PyverbsCM):
         if self.domain != NULL:
             if self.logger:
                 self.logger.debug('Closing DrDomain.')
-            close_weakrefs([self.dr_actions, self.dr_tables])
+            close_deps(self.deps, ('dr_actions', 'dr_tables'))
             rc = dv.mlx5dv_dr_domain_destroy(self.domain)
             if rc:
                 raise PyverbsRDMAError('Failed to destroy DrDomain.', rc)
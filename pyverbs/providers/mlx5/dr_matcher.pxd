@@ -4,10 +4,10 @@
 #cython: language_level=3
 
 cimport pyverbs.providers.mlx5.libmlx5 as dv
-from pyverbs.base cimport PyverbsCM
+from pyverbs.base cimport PyverbsCM, DepRegistry
 
 cdef class DrMatcher(PyverbsCM):
     cdef dv.mlx5dv_dr_matcher *matcher
     cdef object dr_table
-    cdef object dr_rules
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
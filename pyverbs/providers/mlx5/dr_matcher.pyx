@@ -6,8 +6,7 @@ from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError
 from pyverbs.providers.mlx5.dr_table cimport DrTable
 from pyverbs.providers.mlx5.dr_rule cimport DrRule
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
-import weakref
+from pyverbs.base cimport DepRegistry, close_deps
 
 
 cdef class DrMatcher(PyverbsCM):
@@ -36,11 +35,11 @@ cdef class DrMatcher(PyverbsCM):
             raise PyverbsRDMAErrno('DrMatcher creation failed.')
         table.add_ref(self)
         self.dr_table = table
-        self.dr_rules = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     cdef add_ref(self, obj):
         if isinstance(obj, DrRule):
-            self.dr_rules.add(obj)
+            self.deps.add('dr_rules', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -64,7 +63,7 @@ cdef class DrMatcher(PyverbsCM):
         if self.matcher != NULL:
             if self.logger:
                 self.logger.debug('Closing Matcher.')
-            close_weakrefs([self.dr_rules])
+            close_deps(self.deps, ('dr_rules',))
             if dv.mlx5dv_dr_matcher_destroy(self.matcher):
                 raise PyverbsRDMAErrno('Failed to destroy DrMatcher.')
             self.matcher = NULL
@@ -4,11 +4,10 @@
 #cython: language_level=3
 
 cimport pyverbs.providers.mlx5.libmlx5 as dv
-from pyverbs.base cimport PyverbsCM
+from pyverbs.base cimport PyverbsCM, DepRegistry
 
 cdef class DrTable(PyverbsCM):
     cdef dv.mlx5dv_dr_table *table
     cdef object dr_domain
-    cdef object dr_matchers
-    cdef object dr_actions
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
@@ -6,8 +6,7 @@ from pyverbs.providers.mlx5.dr_matcher import DrMatcher
 from pyverbs.providers.mlx5.dr_domain cimport DrDomain
 from pyverbs.providers.mlx5.dr_action cimport DrAction
 from pyverbs.pyverbs_error import PyverbsError
-from pyverbs.base cimport close_weakrefs
-import weakref
+from pyverbs.base cimport DepRegistry, close_deps
 
 
 cdef class DrTable(PyverbsCM):
@@ -23,14 +22,13 @@ cdef class DrTable(PyverbsCM):
             raise PyverbsRDMAErrno('DrTable creation failed.')
         domain.add_ref(self)
         self.dr_domain = domain
-        self.dr_matchers = weakref.WeakSet()
-        self.dr_actions = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     cdef add_ref(self, obj):
         if isinstance(obj, DrMatcher):
-            self.dr_matchers.add(obj)
+            self.deps.add('dr_matchers', obj)
         elif isinstance(obj, DrAction):
-            self.dr_actions.add(obj)
+            self.deps.add('dr_actions', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -41,10 +39,9 @@ cdef class DrTable(PyverbsCM):
         if self.table != NULL:
             if self.logger:
                 self.logger.debug('Closing DrTable.')
-            close_weakrefs([self.dr_matchers, self.dr_actions])
+            close_deps(self.deps, ('dr_matchers', 'dr_actions'))
             rc = dv.mlx5dv_dr_table_destroy(self.table)
             if rc:
                 raise PyverbsRDMAError('Failed to destroy DrTable.', rc)
             self.table = NULL
             self.dr_domain = None
-            self.dr_actions = None
@@ -5,12 +5,11 @@
 
 from cpython.mem cimport PyMem_Malloc, PyMem_Free
 from libc.string cimport strcpy
-import weakref
 
 from pyverbs.pyverbs_error import PyverbsRDMAError
 cimport pyverbs.providers.mlx5.libmlx5 as dv
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.device cimport Context
 cimport pyverbs.libibverbs as v
 
@@ -67,11 +66,7 @@ cdef class Mlx5VfioContext(Mlx5Context):
         cdef v.ibv_device **dev_list
 
         self.name = attr.pci_name
-        self.pds = weakref.WeakSet()
-        self.devx_umems = weakref.WeakSet()
-        self.devx_objs = weakref.WeakSet()
-        self.uars = weakref.WeakSet()
-        self.devx_eqs = weakref.WeakSet()
+        self.deps = DepRegistry()
 
         dev_list = dv.mlx5dv_get_vfio_device_list(&attr.attr)
         if dev_list == NULL:
@@ -111,7 +106,8 @@ cdef class Mlx5VfioContext(Mlx5Context):
         if self.context != NULL:
             if self.logger:
                 self.logger.debug('Closing Mlx5VfioContext')
-            close_weakrefs([self.pds, self.devx_objs, self.devx_umems, self.uars, self.devx_eqs])
+            close_deps(self.deps, ('pds', 'devx_objs', 'devx_umems', 'uars',
+                                   'devx_eqs'))
             rc = v.ibv_close_device(self.context)
             if rc != 0:
                 raise PyverbsRDMAErrno(f'Failed to close device {self.name}')
@@ -3,18 +3,18 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsObject, PyverbsCM
+from libc.stdint cimport uint32_t, uint64_t
+
+from pyverbs.base cimport PyverbsObject, PyverbsCM, DepRegistry
 cimport pyverbs.providers.mlx5.libmlx5 as dv
 from pyverbs.device cimport Context
 from pyverbs.qp cimport QP, QPEx
 cimport pyverbs.libibverbs as v
+from pyverbs.addr cimport AH
 from pyverbs.cq cimport CQEX
 
 
 cdef class Mlx5Context(Context):
-    cdef object devx_umems
-    cdef object devx_objs
-    cdef object devx_eqs
     cdef add_ref(self, obj)
     cpdef close(self)
 
@@ -39,6 +39,11 @@ cdef class Mlx5DVQPInitAttr(PyverbsObject):
 
 cdef class Mlx5QP(QPEx):
     cdef object dc_type
+    cdef int batch_op(self, unsigned int opcode, unsigned int flags,
+                      uint32_t rkey, uint64_t raddr, uint32_t lkey,
+                      uint64_t laddr, uint32_t length, uint32_t imm) except -1
+    cdef int batch_addr(self, AH ah, uint32_t remote_qpn,
+                        uint64_t remote_key) except -1
 
 cdef class Mlx5DVCQInitAttr(PyverbsObject):
     cdef dv.mlx5dv_cq_init_attr attr
@@ -91,8 +96,7 @@ cdef class Mlx5DevxObj(PyverbsCM):
     cdef dv.mlx5dv_devx_obj *obj
     cdef Context context
     cdef object out_view
-    cdef object flow_counter_actions
-    cdef object dest_tir_actions
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
 
 cdef class Mlx5Cqe64(PyverbsObject):
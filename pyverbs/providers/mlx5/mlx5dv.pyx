@@ -5,8 +5,6 @@ from libc.stdint cimport uintptr_t, uint8_t, uint16_t, uint32_t, uint64_t
 from libc.string cimport memcpy, memset
 from libc.stdlib cimport calloc, free ,malloc
 from posix.mman cimport munmap
-import logging
-import weakref
 
 from pyverbs.providers.mlx5.mlx5dv_mkey cimport Mlx5MrInterleaved, Mlx5Mkey, \
     Mlx5MkeyConfAttr, Mlx5SigBlockAttr
@@ -19,7 +17,7 @@ cimport pyverbs.providers.mlx5.libmlx5 as dv
 from pyverbs.mem_alloc import posix_memalign
 from pyverbs.qp cimport QPInitAttrEx, QPEx
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.wr cimport copy_sg_array
 cimport pyverbs.libibverbs_enums as e
 from pyverbs.cq cimport CqInitAttrEx
@@ -37,6 +35,13 @@ cdef extern from 'endian.h':
     unsigned long htobe64(unsigned long host_64bits)
     unsigned long be64toh(unsigned long network_64bits)
 
+cdef enum:
+    _MLX5_WR_MEMCPY = 0x100
+
+# Opcode of a DMA memcpy WR in Mlx5QP.post_batch(). It has no verbs
+# counterpart, so it's placed above the ibv_wr_opcode values.
+MLX5_WR_MEMCPY = _MLX5_WR_MEMCPY
+
 
 cdef char* _prepare_devx_inbox(in_bytes):
     """
@@ -192,8 +197,7 @@ cdef class Mlx5DevxObj(PyverbsCM):
             free(out_mailbox)
         self.context = context
         self.context.add_ref(self)
-        self.flow_counter_actions = weakref.WeakSet()
-        self.dest_tir_actions = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     def query(self, in_, outlen):
         """
@@ -243,9 +247,9 @@ cdef class Mlx5DevxObj(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, DrActionFlowCounter):
-            self.flow_counter_actions.add(obj)
+            self.deps.add('flow_counter_actions', obj)
         elif isinstance(obj, DrActionDestTir):
-            self.dest_tir_actions.add(obj)
+            self.deps.add('dest_tir_actions', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -264,7 +268,7 @@ cdef class Mlx5DevxObj(PyverbsCM):
         if self.obj != NULL:
             if self.logger:
                 self.logger.debug('Closing Mlx5DvexObj')
-            close_weakrefs([self.flow_counter_actions, self.dest_tir_actions])
+            close_deps(self.deps, ('flow_counter_actions', 'dest_tir_actions'))
             rc = dv.mlx5dv_devx_obj_destroy(self.obj)
             if rc:
                 raise PyverbsRDMAError('Failed to destroy a DevX object', rc)
@@ -290,9 +294,6 @@ cdef class Mlx5Context(Context):
         if self.context == NULL:
             raise PyverbsRDMAErrno('Failed to open mlx5 context on {dev}'
                                    .format(dev=self.name))
-        self.devx_umems = weakref.WeakSet()
-        self.devx_objs = weakref.WeakSet()
-        self.devx_eqs = weakref.WeakSet()
 
     def query_mlx5_device(self, comp_mask=-1):
         """
@@ -466,11 +467,11 @@ cdef class Mlx5Context(Context):
             Context.add_ref(self, obj)
         except PyverbsError:
             if isinstance(obj, Mlx5UMEM):
-                self.devx_umems.add(obj)
+                self.deps.add('devx_umems', obj)
             elif isinstance(obj, Mlx5DevxObj):
-                self.devx_objs.add(obj)
+                self.deps.add('devx_objs', obj)
             elif isinstance(obj, Mlx5DevxEq):
-                self.devx_eqs.add(obj)
+                self.deps.add('devx_eqs', obj)
             else:
                 raise PyverbsError('Unrecognized object type')
 
@@ -479,7 +480,8 @@ cdef class Mlx5Context(Context):
 
     cpdef close(self):
         if self.context != NULL:
-            close_weakrefs([self.pps, self.devx_objs, self.devx_umems, self.devx_eqs])
+            close_deps(self.deps, ('pps', 'devx_objs', 'devx_umems',
+                                   'devx_eqs'))
             super(Mlx5Context, self).close()
 
 
@@ -816,10 +818,6 @@ cdef class Mlx5QP(QPEx):
         """
         cdef PD pd
 
-        # Initialize the logger here as the parent's __init__ is called after
-        # the QP is allocated. Allocation can fail, which will lead to exceptions
-        # thrown during object's teardown.
-        self.logger = logging.getLogger(self.__class__.__name__)
         self.dc_type = dv_init_attr.dc_type if dv_init_attr else 0
         if init_attr.pd is not None:
             pd = <PD>init_attr.pd
@@ -1011,6 +1009,32 @@ cdef class Mlx5QP(QPEx):
                                         ah.ah, remote_dctn, remote_dc_key,
                                         stream_id)
 
+    cdef int batch_op(self, unsigned int opcode, unsigned int flags,
+                      uint32_t rkey, uint64_t raddr, uint32_t lkey,
+                      uint64_t laddr, uint32_t length, uint32_t imm) except -1:
+        """
+        Adds MLX5_WR_MEMCPY to the opcodes of post_batch(). A memcpy WR
+        copies <length> bytes from (lkey, laddr) to (rkey, raddr).
+        """
+        if opcode == _MLX5_WR_MEMCPY:
+            dv.mlx5dv_wr_memcpy(dv.mlx5dv_qp_ex_from_ibv_qp_ex(self.qp_ex),
+                                rkey, raddr, lkey, laddr, length)
+            return 0
+        return QPEx.batch_op(self, opcode, flags, rkey, raddr, lkey, laddr,
+                             length, imm)
+
+    cdef int batch_addr(self, AH ah, uint32_t remote_qpn,
+                        uint64_t remote_key) except -1:
+        """
+        DCI QPs address the WRs of post_batch() to a DCT, using <remote_qpn>
+        and <remote_key> as the DCT number and DC key.
+        """
+        if self.dc_type == dve.MLX5DV_DCTYPE_DCI:
+            dv.mlx5dv_wr_set_dc_addr(dv.mlx5dv_qp_ex_from_ibv_qp_ex(self.qp_ex),
+                                     ah.ah, remote_qpn, remote_key)
+            return 0
+        return QPEx.batch_addr(self, ah, remote_qpn, remote_key)
+
     @staticmethod
     def query_lag_port(QP qp):
         """
@@ -1173,10 +1197,6 @@ cdef class Mlx5DVCQInitAttr(PyverbsObject):
 cdef class Mlx5CQ(CQEX):
     def __init__(self, Mlx5Context context, CqInitAttrEx init_attr,
                  Mlx5DVCQInitAttr dv_init_attr):
-        # Initialize the logger here as the parent's __init__ is called after
-        # the CQ is allocated. Allocation can fail, which will lead to exceptions
-        # thrown during object's teardown.
-        self.logger = logging.getLogger(self.__class__.__name__)
         self.cq = \
             dv.mlx5dv_create_cq(context.context, &init_attr.attr,
                                 &dv_init_attr.attr if dv_init_attr is not None
@@ -1315,7 +1335,7 @@ cdef class Mlx5VAR(PyverbsObject):
         self.var = dv.mlx5dv_alloc_var(context.context, flags)
         if self.var == NULL:
             raise PyverbsRDMAErrno('Failed to allocate VAR')
-        context.vars.add(self)
+        context.deps.add('vars', self)
 
     def __dealloc__(self):
         self.close()
@@ -1368,7 +1388,7 @@ cdef class Mlx5PP(PyverbsObject):
                                      <char*>pp_ctx_bytes, flags)
         if self.pp == NULL:
             raise PyverbsRDMAErrno('Failed to allocate packet pacing entry')
-        context.pps.add(self)
+        context.deps.add('pps', self)
 
     def __dealloc__(self):
         self.close()
@@ -1388,7 +1408,7 @@ cdef class Mlx5UAR(PyverbsObject):
         self.uar = dv.mlx5dv_devx_alloc_uar(context.context, flags)
         if self.uar == NULL:
             raise PyverbsRDMAErrno('Failed to allocate UAR')
-        context.uars.add(self)
+        context.deps.add('uars', self)
 
     def __dealloc__(self):
         self.close()
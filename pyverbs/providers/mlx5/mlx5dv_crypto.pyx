@@ -266,7 +266,7 @@ cdef class Mlx5DEK(PyverbsCM):
         if self.mlx5dv_dek == NULL:
             raise PyverbsRDMAErrno('Failed to create DEK')
         self.pd = dek_init_attr.pd
-        self.pd.deks.add(self)
+        self.pd.deps.add('deks', self)
 
     def query(self):
         """
@@ -304,7 +304,7 @@ cdef class Mlx5CryptoLogin(PyverbsCM):
             raise PyverbsRDMAErrno('Failed to create CryptoLoginObj')
 
         self.context = context
-        context.crypto_logins.add(self)
+        context.deps.add('crypto_logins', self)
 
     def query(self):
         """
@@ -5,7 +5,7 @@
 
 cimport pyverbs.providers.mlx5.libmlx5 as dv
 from pyverbs.flow cimport Flow, FlowAction
-from pyverbs.base cimport PyverbsObject
+from pyverbs.base cimport PyverbsObject, DepRegistry
 
 
 cdef class Mlx5FlowMatchParameters(PyverbsObject):
@@ -17,7 +17,7 @@ cdef class Mlx5FlowMatcherAttr(PyverbsObject):
 
 cdef class Mlx5FlowMatcher(PyverbsObject):
     cdef dv.mlx5dv_flow_matcher *flow_matcher
-    cdef object flows
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
     cpdef close(self)
 
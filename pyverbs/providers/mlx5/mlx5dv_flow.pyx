@@ -8,11 +8,10 @@ from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsError, \
     PyverbsUserError
 from pyverbs.providers.mlx5.mlx5dv cimport Mlx5DevxObj
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.device cimport Context
 cimport pyverbs.libibverbs as v
 from pyverbs.qp cimport QP
-import weakref
 
 
 cdef class Mlx5FlowMatchParameters(PyverbsObject):
@@ -113,11 +112,11 @@ cdef class Mlx5FlowMatcher(PyverbsObject):
                                                           &attr.attr)
         if self.flow_matcher == NULL:
             raise PyverbsRDMAErrno('Flow matcher creation failed.')
-        self.flows = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     cdef add_ref(self, obj):
         if isinstance(obj, Flow):
-            self.flows.add(obj)
+            self.deps.add('flows', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -128,7 +127,7 @@ cdef class Mlx5FlowMatcher(PyverbsObject):
         if self.flow_matcher != NULL:
             if self.logger:
                 self.logger.debug('Closing Mlx5FlowMatcher')
-            close_weakrefs([self.flows])
+            close_deps(self.deps, ('flows',))
             rc = dv.mlx5dv_destroy_flow_matcher(self.flow_matcher)
             if rc:
                 raise PyverbsRDMAError('Destroy matcher failed.', rc)
@@ -186,7 +186,7 @@ cdef class Mlx5Mkey(PyverbsCM):
             raise PyverbsRDMAErrno('Failed to create mkey')
         self.max_entries = mkey_init.max_entries
         self.pd = pd
-        self.pd.mkeys.add(self)
+        self.pd.deps.add('mkeys', self)
 
     def mkey_check(self):
         """
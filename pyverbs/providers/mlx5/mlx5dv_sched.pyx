@@ -69,7 +69,7 @@ cdef class Mlx5dvSchedNode(PyverbsObject):
         if self.sched_node == NULL:
             raise PyverbsRDMAErrno('Failed to create sched node')
         self.context = context
-        context.sched_nodes.add(self)
+        context.deps.add('sched_nodes', self)
 
     def modify(self, Mlx5dvSchedAttr sched_attr):
         rc = dv.mlx5dv_sched_node_modify(self.sched_node,
@@ -125,7 +125,7 @@ cdef class Mlx5dvSchedLeaf(PyverbsObject):
         if self.sched_leaf == NULL:
             raise PyverbsRDMAErrno('Failed to create sched leaf')
         self.context = context
-        context.sched_leafs.add(self)
+        context.deps.add('sched_leafs', self)
 
     def modify(self, Mlx5dvSchedAttr sched_attr):
         rc = dv.mlx5dv_sched_leaf_modify(self.sched_leaf,
@@ -3,8 +3,11 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsObject, PyverbsCM
+from libc.stdint cimport uint32_t, uint64_t
+
+from pyverbs.base cimport PyverbsObject, PyverbsCM, DepRegistry
 cimport pyverbs.libibverbs as v
+from pyverbs.addr cimport AH
 
 cdef class QPCap(PyverbsObject):
     cdef v.ibv_qp_cap cap
@@ -38,10 +41,8 @@ cdef class QP(PyverbsCM):
     cdef update_cqs(self, init_attr)
     cdef object scq
     cdef object rcq
-    cdef object mws
+    cdef DepRegistry deps
     cdef object srq
-    cdef object flows
-    cdef object dr_actions
     cdef add_ref(self, obj)
 
 cdef class DataBuffer(PyverbsCM):
@@ -50,6 +51,11 @@ cdef class DataBuffer(PyverbsCM):
 cdef class QPEx(QP):
     cdef v.ibv_qp_ex *qp_ex
     cdef object ind_table
+    cdef int batch_op(self, unsigned int opcode, unsigned int flags,
+                      uint32_t rkey, uint64_t raddr, uint32_t lkey,
+                      uint64_t laddr, uint32_t length, uint32_t imm) except -1
+    cdef int batch_addr(self, AH ah, uint32_t remote_qpn,
+                        uint64_t remote_key) except -1
 
 cdef class ECE(PyverbsCM):
     cdef v.ibv_ece ece
@@ -1,20 +1,22 @@
 # SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
 # Copyright (c) 2019 Mellanox Technologies, Inc. All rights reserved.
 
+from libc.stdint cimport uintptr_t, uint32_t, uint64_t
+from cpython.array cimport array
 from libc.stdlib cimport malloc, free
 from libc.string cimport memcpy
-import weakref
 
 from pyverbs.pyverbs_error import PyverbsUserError, PyverbsError, PyverbsRDMAError
 from pyverbs.utils import gid_str, qp_type_to_str, qp_state_to_str, mtu_to_str
 from pyverbs.utils import access_flags_to_str, mig_state_to_str
 from pyverbs.wq cimport RwqIndTable, RxHashConf
 from pyverbs.mr cimport MW, MWBindInfo, MWBind
-from pyverbs.wr cimport RecvWR, SendWR, SGE
+from pyverbs.wr cimport RecvWR, SendWR, SGE, SGEList, RecvWRBatch, \
+    SendWRBatch
 from pyverbs.base import PyverbsRDMAErrno
 from pyverbs.addr cimport AHAttr, GID, AH
 from pyverbs.flow cimport FlowAttr, Flow
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 cimport pyverbs.libibverbs_enums as e
 from pyverbs.addr cimport GlobalRoute
 from pyverbs.device cimport Context
@@ -31,6 +33,18 @@ cdef extern from 'endian.h':
     unsigned long htobe32(unsigned long host_32bits)
 
 
+cdef int modify_qp(v.ibv_qp *qp, QPAttr qp_attr, int mask):
+    """
+    Calls ibv_modify_qp() without holding the GIL. State transitions go
+    through the kernel and may block on the device, so other Python threads
+    are allowed to run meanwhile.
+    """
+    cdef int rc
+    with nogil:
+        rc = v.ibv_modify_qp(qp, &qp_attr.attr, mask)
+    return rc
+
+
 cdef class QPCap(PyverbsObject):
     def __init__(self, max_send_wr=1, max_recv_wr=10, max_send_sge=1,
                  max_recv_sge=1, max_inline_data=0):
@@ -950,9 +964,7 @@ cdef class QP(PyverbsCM):
         cdef PD pd
         cdef Context ctx
         super().__init__()
-        self.mws = weakref.WeakSet()
-        self.flows = weakref.WeakSet()
-        self.dr_actions = weakref.WeakSet()
+        self.deps = DepRegistry()
         self.update_cqs(init_attr)
         # QP initialization was not done by the provider, we should do it here
         if self.qp == NULL:
@@ -1025,9 +1037,9 @@ cdef class QP(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, MW):
-            self.mws.add(obj)
+            self.deps.add('mws', obj)
         elif isinstance(obj, Flow):
-            self.flows.add(obj)
+            self.deps.add('flows', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -1038,7 +1050,7 @@ cdef class QP(PyverbsCM):
         if self.qp != NULL:
             if self.logger:
                 self.logger.debug('Closing QP')
-            close_weakrefs([self.mws, self.flows, self.dr_actions])
+            close_deps(self.deps, ('mws', 'flows', 'dr_actions'))
             rc = v.ibv_destroy_qp(self.qp)
             if rc:
                 raise PyverbsRDMAError('Failed to destroy QP', rc)
@@ -1096,7 +1108,7 @@ cdef class QP(PyverbsCM):
         """
         mask = self._get_comp_mask('INIT')
         qp_attr.qp_state = e.IBV_QPS_INIT
-        rc =  v.ibv_modify_qp(self.qp, &qp_attr.attr, mask)
+        rc = modify_qp(self.qp, qp_attr, mask)
         if rc != 0:
             raise PyverbsRDMAError('Failed to modify QP state to init', rc)
 
@@ -1116,7 +1128,7 @@ cdef class QP(PyverbsCM):
             self.to_init(qp_attr)
         mask = self._get_comp_mask('RTR')
         qp_attr.qp_state = e.IBV_QPS_RTR
-        rc = v.ibv_modify_qp(self.qp, &qp_attr.attr, mask)
+        rc = modify_qp(self.qp, qp_attr, mask)
         if rc != 0:
             raise PyverbsRDMAError('Failed to modify QP state to RTR', rc)
 
@@ -1135,7 +1147,7 @@ cdef class QP(PyverbsCM):
             self.to_rtr(qp_attr)
         mask = self._get_comp_mask('RTS')
         qp_attr.qp_state = e.IBV_QPS_RTS
-        rc = v.ibv_modify_qp(self.qp, &qp_attr.attr, mask)
+        rc = modify_qp(self.qp, qp_attr, mask)
         if rc != 0:
             raise PyverbsRDMAError('Failed to modify QP state to RTS', rc)
 
@@ -1164,7 +1176,7 @@ cdef class QP(PyverbsCM):
                           modified (see enum ibv_qp_attr_mask)
         :return: None
         """
-        rc = v.ibv_modify_qp(self.qp, &qp_attr.attr, comp_mask)
+        rc = modify_qp(self.qp, qp_attr, comp_mask)
         if rc != 0:
             raise PyverbsRDMAError('Failed to modify QP', rc)
 
@@ -1202,6 +1214,41 @@ cdef class QP(PyverbsCM):
                 memcpy(&bad_wr.send_wr, my_bad_wr, sizeof(bad_wr.send_wr))
             raise PyverbsRDMAError('Failed to post send', rc)
 
+    def post_recv_batch(self, RecvWRBatch wrs not None, num_wrs=None):
+        """
+        Posts the first <num_wrs> WRs of a RecvWRBatch on the QP with a
+        single ibv_post_recv call. On failure, the index of the failed WR
+        is available in wrs.bad_wr.
+        :param wrs: The batch of WRs to post
+        :param num_wrs: Number of WRs to post. Defaults to the whole batch.
+        :return: None
+        """
+        cdef v.ibv_recv_wr *my_bad_wr = NULL
+        num_wrs = wrs.capacity if num_wrs is None else num_wrs
+        rc = v.ibv_post_recv(self.qp, wrs.chain(num_wrs), &my_bad_wr)
+        if rc != 0:
+            wrs.set_bad_wr(my_bad_wr)
+            raise PyverbsRDMAError(f'Failed to post recv batch, bad WR index '
+                                   f'{wrs.bad_wr}', rc)
+
+    def post_send_batch(self, SendWRBatch wrs not None, num_wrs=None):
+        """
+        Posts the first <num_wrs> WRs of a SendWRBatch on the QP with a single
+        ibv_post_send call, so the device is notified once for the whole
+        batch. On failure, the index of the failed WR is available in
+        wrs.bad_wr.
+        :param wrs: The batch of WRs to post
+        :param num_wrs: Number of WRs to post. Defaults to the whole batch.
+        :return: None
+        """
+        cdef v.ibv_send_wr *my_bad_wr = NULL
+        num_wrs = wrs.capacity if num_wrs is None else num_wrs
+        rc = v.ibv_post_send(self.qp, wrs.chain(num_wrs), &my_bad_wr)
+        if rc != 0:
+            wrs.set_bad_wr(my_bad_wr)
+            raise PyverbsRDMAError(f'Failed to post send batch, bad WR index '
+                                   f'{wrs.bad_wr}', rc)
+
     def set_ece(self, ECE ece):
         """
         Set ECE options and use them for QP configuration stage
@@ -1399,6 +1446,16 @@ cdef class QPEx(QP):
 
     def wr_set_sge_list(self, num_sge, sg_list):
         cdef v.ibv_sge *sge = NULL
+        if isinstance(sg_list, SGEList):
+            # The list's array is used in place, no copy is needed
+            if (<SGEList>sg_list).sges == NULL:
+                raise PyverbsUserError('The SGE list is closed')
+            if num_sge > len(sg_list):
+                raise PyverbsUserError(f'Requested {num_sge} SGEs from a '
+                                       f'list of {len(sg_list)}')
+            v.ibv_wr_set_sge_list(self.qp_ex, num_sge,
+                                  (<SGEList>sg_list).sges)
+            return
         sge = <v.ibv_sge*>malloc(num_sge * sizeof(v.ibv_sge))
         if sge == NULL:
             raise PyverbsError('Failed to allocate SGE buffer')
@@ -1420,6 +1477,138 @@ cdef class QPEx(QP):
     def wr_abort(self):
         v.ibv_wr_abort(self.qp_ex)
 
+    cdef int batch_op(self, unsigned int opcode, unsigned int flags,
+                      uint32_t rkey, uint64_t raddr, uint32_t lkey,
+                      uint64_t laddr, uint32_t length, uint32_t imm) except -1:
+        """
+        Builds a single WR of a post_batch() call: calls the opcode's builder
+        and sets the WR's data. Providers override it to add their own
+        opcodes.
+        """
+        if opcode == e.IBV_WR_RDMA_WRITE:
+            v.ibv_wr_rdma_write(self.qp_ex, rkey, raddr)
+        elif opcode == e.IBV_WR_RDMA_WRITE_WITH_IMM:
+            v.ibv_wr_rdma_write_imm(self.qp_ex, rkey, raddr, htobe32(imm))
+        elif opcode == e.IBV_WR_RDMA_READ:
+            v.ibv_wr_rdma_read(self.qp_ex, rkey, raddr)
+        elif opcode == e.IBV_WR_SEND:
+            v.ibv_wr_send(self.qp_ex)
+        elif opcode == e.IBV_WR_SEND_WITH_IMM:
+            v.ibv_wr_send_imm(self.qp_ex, htobe32(imm))
+        elif opcode == e.IBV_WR_SEND_WITH_INV:
+            v.ibv_wr_send_inv(self.qp_ex, imm)
+        elif opcode == e.IBV_WR_LOCAL_INV:
+            v.ibv_wr_local_inv(self.qp_ex, imm)
+            return 0
+        else:
+            raise PyverbsUserError(f'Opcode {opcode} is not supported by '
+                                   f'post_batch')
+        if flags & e.IBV_SEND_INLINE:
+            v.ibv_wr_set_inline_data(self.qp_ex, <void*><uintptr_t>laddr,
+                                     length)
+        else:
+            v.ibv_wr_set_sge(self.qp_ex, lkey, laddr, length)
+        return 0
+
+    cdef int batch_addr(self, AH ah, uint32_t remote_qpn,
+                        uint64_t remote_key) except -1:
+        """
+        Sets the destination of a single WR of a post_batch() call.
+        """
+        v.ibv_wr_set_ud_addr(self.qp_ex, ah.ah, remote_qpn, remote_key)
+        return 0
+
+    def post_batch(self, opcode, wr_id, flags=0, rkey=0, raddr=0, lkey=0,
+                   laddr=0, length=0, imm=0, AH ah=None, remote_qpn=0,
+                   remote_qkey=0):
+        """
+        Builds and posts a batch of send WRs with a single
+        ibv_wr_start() ... ibv_wr_complete() sequence. Each of the WR
+        attributes is either a single integer, which is used for all WRs, or
+        a sequence (preferably an array.array) holding a value per WR. The
+        number of WRs is the length of the sequences, which must all be of
+        the same length.
+        If building a WR fails, the batch is aborted and no WR is posted.
+        Supported opcodes are RDMA write (with immediate), RDMA read, send
+        (with immediate / invalidate) and local invalidate. Provider QPs may
+        support more opcodes.
+        :param opcode: The WRs' opcodes (ibv_wr_opcode)
+        :param wr_id: The WRs' IDs
+        :param flags: The WRs' send flags. If IBV_SEND_INLINE is set, the
+                      local buffer is posted as inline data.
+        :param rkey: Remote key of RDMA operations
+        :param raddr: Remote address of RDMA operations
+        :param lkey: Local key of the WRs' buffer
+        :param laddr: Local address of the WRs' buffer
+        :param length: Length of the WRs' buffer
+        :param imm: Immediate data (host order) of *_WITH_IMM opcodes, or the
+                    rkey to invalidate of SEND_WITH_INV and LOCAL_INV
+        :param ah: An AH to send to, for UD and SRD QPs. Used for all WRs.
+        :param remote_qpn: The destination QP number, used with <ah>
+        :param remote_qkey: The destination QKey, used with <ah>
+        :return: None
+        """
+        cdef array opcodes, wr_ids, flags_col, rkeys, raddrs, lkeys, laddrs, \
+            lengths, imms
+        cdef uint32_t qpn = remote_qpn
+        cdef uint64_t qkey = remote_qkey
+        cdef Py_ssize_t i, num = -1
+        cdef int rc
+        if self.qp_ex == NULL:
+            raise PyverbsUserError('post_batch requires a QP created with '
+                                   'IBV_QP_INIT_ATTR_SEND_OPS_FLAGS')
+        for col in (opcode, wr_id, flags, rkey, raddr, lkey, laddr, length,
+                    imm):
+            if isinstance(col, int):
+                continue
+            if num == -1:
+                num = len(col)
+            elif len(col) != num:
+                raise PyverbsUserError(f'Got columns of {num} and {len(col)} '
+                                       f'values')
+        num = 1 if num == -1 else num
+        opcodes = batch_column(opcode, num, 'I')
+        wr_ids = batch_column(wr_id, num, 'Q')
+        flags_col = batch_column(flags, num, 'I')
+        rkeys = batch_column(rkey, num, 'I')
+        raddrs = batch_column(raddr, num, 'Q')
+        lkeys = batch_column(lkey, num, 'I')
+        laddrs = batch_column(laddr, num, 'Q')
+        lengths = batch_column(length, num, 'I')
+        imms = batch_column(imm, num, 'I')
+        v.ibv_wr_start(self.qp_ex)
+        try:
+            for i in range(num):
+                self.qp_ex.wr_id = wr_ids.data.as_ulonglongs[i]
+                self.qp_ex.wr_flags = flags_col.data.as_uints[i]
+                self.batch_op(opcodes.data.as_uints[i],
+                              flags_col.data.as_uints[i],
+                              rkeys.data.as_uints[i],
+                              raddrs.data.as_ulonglongs[i],
+                              lkeys.data.as_uints[i],
+                              laddrs.data.as_ulonglongs[i],
+                              lengths.data.as_uints[i], imms.data.as_uints[i])
+                if ah is not None:
+                    self.batch_addr(ah, qpn, qkey)
+        except:
+            v.ibv_wr_abort(self.qp_ex)
+            raise
+        rc = v.ibv_wr_complete(self.qp_ex)
+        if rc != 0:
+            raise PyverbsRDMAError('Failed to post a batch of send WRs', rc)
+
+
+cdef array batch_column(values, Py_ssize_t num, typecode):
+    """
+    Converts <values> to an array of <num> entries of type <typecode>. A
+    single integer is broadcast to all entries.
+    """
+    if isinstance(values, int):
+        return array(typecode, [values]) * num
+    if isinstance(values, array) and values.typecode == typecode:
+        return values
+    return array(typecode, values)
+
 
 def _copy_caps(QPCap src, dst):
     """
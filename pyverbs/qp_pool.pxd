@@ -0,0 +1,29 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+#cython: language_level=3
+
+from pyverbs.base cimport PyverbsCM
+
+
+cdef class QPPool(PyverbsCM):
+    cdef object pd
+    cdef object init_attr
+    cdef object qp_attr
+    cdef object key
+    cdef object free
+    cdef object owned
+    cdef object cond
+    cdef object thread
+    cdef bint closed
+    cdef unsigned int low
+    cdef unsigned int high
+    cdef unsigned int pending
+    cdef unsigned long hits
+    cdef unsigned long misses
+    cdef unsigned long created
+    cdef unsigned long recycled
+    cdef unsigned long destroyed
+    cpdef close(self)
+    cdef create(self)
+    cdef prepare(self, qp)
+    cdef refill(self)
@@ -0,0 +1,284 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+import threading
+import weakref
+
+from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, \
+    PyverbsUserError
+cimport pyverbs.libibverbs_enums as e
+from pyverbs.qp cimport QP, QPAttr, QPInitAttr
+from pyverbs.pd cimport PD
+
+
+cdef class QPPool(PyverbsCM):
+    """
+    A pool of pre-created QPs of a PD, which share the same CQs, capabilities
+    and type (the pool's key). get() hands out a QP in the RESET state, or in
+    the INIT state if the pool was given a QPAttr, so setting up a connection
+    only takes the remaining state transitions. release() moves the QP back
+    to the RESET state and keeps it for reuse instead of destroying it.
+    When fewer than <low> QPs are free, the pool is refilled up to <high>
+    free QPs, by a background thread or on get(). Released QPs beyond <high>
+    free QPs are destroyed.
+    The refill thread only holds a weak reference to the pool, so it stops
+    once the pool is closed or garbage collected.
+    """
+    def __init__(self, PD pd not None, QPInitAttr init_attr not None,
+                 QPAttr qp_attr=None, low=8, high=32, background=True):
+        """
+        Initializes a QPPool object and fills it with <high> QPs.
+        :param pd: The PD to create the QPs with
+        :param init_attr: The QPs' initial attributes
+        :param qp_attr: If set, free QPs are moved to the INIT state using it.
+                        Otherwise free QPs are kept in the RESET state.
+        :param low: Low watermark of free QPs, below which the pool is
+                    refilled
+        :param high: High watermark of free QPs
+        :param background: If True, the pool is refilled by a background
+                           thread, otherwise by get()
+        :return: A QPPool object
+        """
+        super().__init__()
+        if high <= 0 or low < 0 or low > high:
+            raise PyverbsUserError(f'Invalid watermarks: low {low}, high '
+                                   f'{high}')
+        cap = init_attr.cap
+        self.key = (pd, init_attr.send_cq, init_attr.recv_cq,
+                    (cap.max_send_wr, cap.max_recv_wr, cap.max_send_sge,
+                     cap.max_recv_sge, cap.max_inline_data),
+                    init_attr.qp_type)
+        self.init_attr = init_attr
+        self.qp_attr = qp_attr
+        self.low = low
+        self.high = high
+        # Free QPs by QP number, the last released one is handed out first
+        self.free = {}
+        # QP number -> weak reference of the QPs created by the pool. QP
+        # numbers of destroyed QPs are reused, so this stays bounded.
+        self.owned = {}
+        self.cond = threading.Condition()
+        self.pd = pd
+        pd.add_ref(self)
+        self.refill()
+        if background:
+            self.thread = threading.Thread(target=_refill_loop,
+                                           args=(weakref.ref(self), self.cond),
+                                           name='QPPool refill', daemon=True)
+            self.thread.start()
+        if self.debug_enabled():
+            self.logger.debug(f'Created QPPool of {len(self.free)} QPs')
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        """
+        Stops the refill thread and destroys the free QPs. QPs that were
+        handed out are not affected, and are destroyed once released.
+        :return: None
+        """
+        if self.pd is not None:
+            if self.logger:
+                self.logger.debug('Closing QPPool')
+            with self.cond:
+                self.closed = True
+                self.cond.notify_all()
+            # The pool may be garbage collected by the refill thread itself
+            if self.thread is not None and \
+               self.thread is not threading.current_thread():
+                self.thread.join()
+            self.thread = None
+            for qp_num, qp in self.free.items():
+                del self.owned[qp_num]
+                qp.close()
+            self.destroyed += len(self.free)
+            self.free.clear()
+            self.pd = None
+
+    cdef create(self):
+        qp = QP(self.pd, self.init_attr)
+        try:
+            self.prepare(qp)
+        except PyverbsError:
+            qp.close()
+            raise
+        self.owned[qp.qp_num] = weakref.ref(qp)
+        self.created += 1
+        return qp
+
+    cdef prepare(self, qp):
+        """
+        Moves a QP in the RESET state to the state of free QPs.
+        """
+        if self.qp_attr is not None:
+            qp.to_init(self.qp_attr)
+
+    cdef refill(self):
+        """
+        Creates QPs until there are <high> free QPs. QPs are created without
+        holding the lock, so get() and release() aren't blocked meanwhile.
+        """
+        while True:
+            with self.cond:
+                if self.closed or len(self.free) + self.pending >= self.high:
+                    return
+                self.pending += 1
+            try:
+                qp = self.create()
+            finally:
+                with self.cond:
+                    self.pending -= 1
+            with self.cond:
+                if not self.closed:
+                    self.free[qp.qp_num] = qp
+                    continue
+            qp.close()
+            return
+
+    def get(self):
+        """
+        Hands out a free QP, or creates one if there's none.
+        :return: A QP in the RESET state, or in the INIT state if the pool
+                 has a QPAttr
+        """
+        if self.closed:
+            raise PyverbsUserError('The QP pool is closed')
+        with self.cond:
+            if self.free:
+                _, qp = self.free.popitem()
+                self.hits += 1
+            else:
+                qp = None
+                self.misses += 1
+            refill = len(self.free) < self.low
+            if refill and self.thread is not None:
+                self.cond.notify_all()
+                refill = False
+        if qp is None:
+            qp = self.create()
+        if refill:
+            self.refill()
+        return qp
+
+    def release(self, QP qp not None):
+        """
+        Returns a QP that was handed out by get() to the pool. The QP is moved
+        to the RESET state, which discards its outstanding WRs, and is either
+        kept for reuse or destroyed if the pool has <high> free QPs. The
+        QP's completions should be polled before it's released. If the pool
+        was closed, the QP is destroyed.
+        :param qp: The QP to release
+        :return: None
+        """
+        if qp.qp == NULL:
+            raise PyverbsUserError('The QP is closed')
+        qp_num = qp.qp_num
+        ref = self.owned.get(qp_num)
+        if ref is None or ref() is not qp:
+            raise PyverbsUserError('The QP doesn\'t belong to this pool')
+        with self.cond:
+            if qp_num in self.free:
+                raise PyverbsUserError(f'QP {qp_num} was already released')
+            keep = not self.closed and \
+                len(self.free) + self.pending < self.high
+        if keep:
+            try:
+                qp.modify(QPAttr(qp_state=e.IBV_QPS_RESET), e.IBV_QP_STATE)
+                self.prepare(qp)
+            except PyverbsRDMAError as ex:
+                self.logger.warning(f'Failed to recycle QP {qp_num}: {ex}')
+                keep = False
+        if keep:
+            with self.cond:
+                if not self.closed:
+                    self.free[qp_num] = qp
+                    self.recycled += 1
+                    return
+        del self.owned[qp_num]
+        qp.close()
+        self.destroyed += 1
+
+    @property
+    def key(self):
+        """
+        (PD, send CQ, receive CQ, (max_send_wr, max_recv_wr, max_send_sge,
+        max_recv_sge, max_inline_data), QP type) of the pool's QPs
+        """
+        return self.key
+
+    @property
+    def low(self):
+        return self.low
+
+    @property
+    def high(self):
+        return self.high
+
+    @property
+    def num_free(self):
+        return len(self.free)
+
+    @property
+    def hits(self):
+        return self.hits
+
+    @property
+    def misses(self):
+        return self.misses
+
+    @property
+    def created(self):
+        return self.created
+
+    @property
+    def recycled(self):
+        return self.recycled
+
+    @property
+    def destroyed(self):
+        return self.destroyed
+
+    def __str__(self):
+        print_format = '{:22}: {:<20}\n'
+        return 'QPPool:\n' + \
+               print_format.format('Free QPs', self.num_free) + \
+               print_format.format('Watermarks', f'{self.low}/{self.high}') + \
+               print_format.format('Hits', self.hits) + \
+               print_format.format('Misses', self.misses) + \
+               print_format.format('Created', self.created) + \
+               print_format.format('Recycled', self.recycled) + \
+               print_format.format('Destroyed', self.destroyed)
+
+
+def _refill_loop(pool_ref, cond):
+    """
+    The refill thread's loop. The pool is only referenced while refilling,
+    so waiting doesn't keep it alive.
+    """
+    cdef QPPool pool
+    while True:
+        with cond:
+            while True:
+                pool = pool_ref()
+                if pool is None or pool.closed:
+                    return
+                if len(pool.free) < pool.low:
+                    break
+                pool = None
+                # Dropping the reference may have garbage collected the pool
+                if pool_ref() is None:
+                    return
+                cond.wait()
+        try:
+            pool.refill()
+        except PyverbsError as ex:
+            pool.logger.warning(f'Failed to refill QPPool: {ex}')
+            # Retry once QPs are handed out or released
+            with cond:
+                if pool.closed:
+                    return
+                pool = None
+                if pool_ref() is None:
+                    return
+                cond.wait()
+        pool = None
@@ -0,0 +1,26 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+#cython: language_level=3
+
+from pyverbs.base cimport PyverbsCM
+cimport pyverbs.libibverbs as v
+
+
+cdef class RecvRing(PyverbsCM):
+    cdef object queue
+    cdef object cq
+    cdef object mr
+    cdef v.ibv_recv_wr *wrs
+    cdef v.ibv_sge *sges
+    cdef v.ibv_wc *wcs
+    cdef unsigned int *free_slots
+    cdef unsigned int *held_slots
+    cdef int num_slots
+    cdef int slot_size
+    cdef int depth
+    cdef int num_free
+    cdef int num_held
+    cdef int num_posted
+    cdef object error
+    cpdef close(self)
+    cdef int post_slots(self, int num) except -1
@@ -0,0 +1,264 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+
+from cpython.array cimport array, clone
+from libc.stdint cimport uintptr_t
+from libc.stdlib cimport calloc, free
+
+from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, \
+    PyverbsUserError
+cimport pyverbs.libibverbs_enums as e
+from pyverbs.srq cimport SRQ
+from pyverbs.mr cimport MR
+from pyverbs.qp cimport QP
+from pyverbs.wq cimport WQ
+from pyverbs.cq cimport CQ
+
+
+cdef class RecvRing(PyverbsCM):
+    """
+    A receive ring splits a range of an MR into <num_slots> fixed-size slots
+    and keeps a receive queue (of a QP, an SRQ or a WQ) topped up with
+    receive WRs pointing at them. poll() drains the ring's CQ, hands the
+    consumed slots to the application as (slot index, byte_len) columns and
+    reposts free slots, all in a single call.
+    A slot returned by poll() is owned by the application until the next
+    poll() call, after which it is reposted. The CQ must report only the
+    ring's receive completions.
+    """
+    def __init__(self, queue not None, CQ cq not None, MR mr not None,
+                 slot_size, num_slots, depth=None, offset=0):
+        """
+        Initializes a RecvRing object and posts <depth> receive WRs.
+        :param queue: The QP, SRQ or WQ whose receive queue is fed
+        :param cq: The CQ that receives the queue's receive completions
+        :param mr: The MR holding the slots
+        :param slot_size: Size of a slot in bytes
+        :param num_slots: Number of slots
+        :param depth: Number of receive WRs to keep posted. Defaults to
+                      <num_slots>.
+        :param offset: Offset of the first slot in the MR
+        :return: A RecvRing object
+        """
+        cdef size_t size
+        cdef uintptr_t addr
+        cdef int i
+        super().__init__()
+        if not isinstance(queue, (QP, SRQ, WQ)):
+            raise PyverbsUserError('A RecvRing can be used with a QP, SRQ or '
+                                   'WQ only')
+        depth = num_slots if depth is None else depth
+        if slot_size <= 0 or num_slots <= 0 or depth <= 0 or \
+                depth > num_slots:
+            raise PyverbsUserError(f'Invalid ring parameters: slot size '
+                                   f'{slot_size}, {num_slots} slots, depth '
+                                   f'{depth}')
+        if offset < 0 or offset + slot_size * num_slots > mr.mr.length:
+            raise PyverbsUserError(f'{num_slots} slots of {slot_size} bytes at '
+                                   f'offset {offset} exceed the MR length '
+                                   f'{mr.mr.length}')
+        size = sizeof(v.ibv_recv_wr) + sizeof(v.ibv_sge) + sizeof(v.ibv_wc) + \
+            2 * sizeof(unsigned int)
+        self.wrs = <v.ibv_recv_wr*>calloc(num_slots, size)
+        if self.wrs == NULL:
+            raise PyverbsError(f'Failed to allocate a ring of {num_slots} '
+                               f'slots')
+        self.num_slots = num_slots
+        self.slot_size = slot_size
+        self.wcs = <v.ibv_wc*>(self.wrs + self.num_slots)
+        self.sges = <v.ibv_sge*>(self.wcs + self.num_slots)
+        self.free_slots = <unsigned int*>(self.sges + self.num_slots)
+        self.held_slots = self.free_slots + self.num_slots
+        self.queue = queue
+        self.cq = cq
+        self.mr = mr
+        self.depth = depth
+        self.error = None
+        addr = <uintptr_t>mr.buf + offset
+        for i in range(num_slots):
+            self.sges[i].addr = addr + <uintptr_t>i * self.slot_size
+            self.sges[i].length = self.slot_size
+            self.sges[i].lkey = mr.mr.lkey
+            self.wrs[i].wr_id = i
+            self.wrs[i].sg_list = &self.sges[i]
+            self.wrs[i].num_sge = 1
+            # Slot 0 is posted first
+            self.free_slots[i] = self.num_slots - 1 - i
+        self.num_free = num_slots
+        self.fill()
+        self.logger.debug('Created a RecvRing')
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        if self.wrs != NULL:
+            if self.logger:
+                self.logger.debug('Closing RecvRing')
+            free(self.wrs)
+            self.wrs = NULL
+            self.queue = None
+            self.cq = None
+            self.mr = None
+
+    cdef int post_slots(self, int num) except -1:
+        """
+        Posts the <num> most recently freed slots with a single post call.
+        """
+        cdef v.ibv_recv_wr *head
+        cdef v.ibv_recv_wr *wr
+        cdef v.ibv_recv_wr *bad_wr = NULL
+        cdef int i, rc
+        if num <= 0:
+            return 0
+        head = &self.wrs[self.free_slots[self.num_free - 1]]
+        wr = head
+        for i in range(1, num):
+            wr.next = &self.wrs[self.free_slots[self.num_free - 1 - i]]
+            wr = wr.next
+        wr.next = NULL
+        if isinstance(self.queue, QP):
+            if (<QP>self.queue).qp == NULL:
+                raise PyverbsUserError('The ring\'s QP is closed')
+            rc = v.ibv_post_recv((<QP>self.queue).qp, head, &bad_wr)
+        elif isinstance(self.queue, SRQ):
+            if (<SRQ>self.queue).srq == NULL:
+                raise PyverbsUserError('The ring\'s SRQ is closed')
+            rc = v.ibv_post_srq_recv((<SRQ>self.queue).srq, head, &bad_wr)
+        else:
+            if (<WQ>self.queue).wq == NULL:
+                raise PyverbsUserError('The ring\'s WQ is closed')
+            rc = v.ibv_post_wq_recv((<WQ>self.queue).wq, head, &bad_wr)
+        if rc != 0:
+            # The WRs preceding the bad WR were posted
+            wr = head
+            num = 0
+            while wr != NULL and wr != bad_wr:
+                num += 1
+                wr = wr.next
+            self.num_free -= num
+            self.num_posted += num
+            raise PyverbsRDMAError('Failed to post the ring\'s receive WRs', rc)
+        self.num_free -= num
+        self.num_posted += num
+        return 0
+
+    def fill(self):
+        """
+        Posts free slots until <depth> receive WRs are outstanding. Clears a
+        previously reported completion error.
+        :return: None
+        """
+        if self.wrs == NULL:
+            raise PyverbsUserError('The RecvRing is closed')
+        self.error = None
+        self.post_slots(min(self.num_free, self.depth - self.num_posted))
+
+    def poll(self, max_entries=None):
+        """
+        Releases the slots returned by the previous poll() call, polls the
+        CQ for up to <max_entries> receive completions and reposts free slots
+        to keep <depth> receive WRs outstanding.
+        Completions with an error status are returned with a byte_len of 0,
+        their status is kept in the error property and reposting stops until
+        fill() is called.
+        A completion with a wr_id that isn't a slot of the ring is skipped,
+        and an error is raised once the rest of the batch was handled; the
+        slots of the batch are then released by the next poll() call.
+        :param max_entries: Maximum number of completions to poll. Defaults
+                            to the number of slots.
+        :return: (npolled, slots, byte_lens): The number of polled
+                 completions and two array.array('I') columns holding the
+                 consumed slot indices and the received lengths
+        """
+        cdef array slots, byte_lens
+        cdef unsigned int slot
+        cdef int i, rc, num
+        cdef int npolled = 0
+        bad_wr_id = None
+        if self.wrs == NULL:
+            raise PyverbsUserError('The RecvRing is closed')
+        for i in range(self.num_held):
+            self.free_slots[self.num_free] = self.held_slots[i]
+            self.num_free += 1
+        self.num_held = 0
+        num = self.num_slots if max_entries is None else \
+            min(max_entries, self.num_slots)
+        if (<CQ>self.cq).cq == NULL:
+            raise PyverbsUserError('The ring\'s CQ is closed')
+        rc = v.ibv_poll_cq((<CQ>self.cq).cq, num, self.wcs)
+        if rc < 0:
+            raise PyverbsRDMAError('Failed to poll CQ', -rc)
+        slots = clone(array('I'), rc, False)
+        byte_lens = clone(array('I'), rc, False)
+        for i in range(rc):
+            if self.wcs[i].wr_id >= <unsigned int>self.num_slots:
+                if bad_wr_id is None:
+                    bad_wr_id = self.wcs[i].wr_id
+                continue
+            slot = <unsigned int>self.wcs[i].wr_id
+            self.num_posted -= 1
+            self.held_slots[self.num_held] = slot
+            self.num_held += 1
+            slots.data.as_uints[npolled] = slot
+            if self.wcs[i].status == e.IBV_WC_SUCCESS:
+                byte_lens.data.as_uints[npolled] = self.wcs[i].byte_len
+            else:
+                byte_lens.data.as_uints[npolled] = 0
+                if self.error is None:
+                    self.error = self.wcs[i].status
+            npolled += 1
+        if self.error is None:
+            self.post_slots(min(self.num_free, self.depth - self.num_posted))
+        if bad_wr_id is not None:
+            raise PyverbsError(f'Unexpected completion with wr_id '
+                               f'{bad_wr_id} on the ring\'s CQ')
+        return rc, slots, byte_lens
+
+    def slot_addr(self, slot):
+        """
+        :param slot: Slot index
+        :return: The address of the slot's buffer
+        """
+        if self.wrs == NULL:
+            raise PyverbsUserError('The RecvRing is closed')
+        if slot < 0 or slot >= self.num_slots:
+            raise PyverbsUserError(f'Invalid slot {slot}')
+        return self.sges[slot].addr
+
+    def read(self, slot, length=None):
+        """
+        Reads the content of a slot.
+        :param slot: Slot index
+        :param length: Number of bytes to read. Defaults to the slot size.
+        :return: The slot's data (bytes)
+        """
+        cdef char *data = <char*><uintptr_t>self.slot_addr(slot)
+        if (<MR>self.mr).mr == NULL:
+            raise PyverbsUserError('The ring\'s MR is closed')
+        length = self.slot_size if length is None else \
+            min(length, self.slot_size)
+        return data[:length]
+
+    @property
+    def num_slots(self):
+        return self.num_slots
+
+    @property
+    def slot_size(self):
+        return self.slot_size
+
+    @property
+    def depth(self):
+        return self.depth
+
+    @property
+    def num_posted(self):
+        return self.num_posted
+
+    @property
+    def error(self):
+        """
+        The status of the first failed completion since the last fill(), or
+        None.
+        """
+        return self.error
@@ -3,7 +3,7 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsObject, PyverbsCM
+from pyverbs.base cimport PyverbsObject, PyverbsCM, DepRegistry
 from . cimport libibverbs as v
 
 cdef class SrqAttr(PyverbsObject):
@@ -24,6 +24,6 @@ cdef class OpsWr(PyverbsCM):
 cdef class SRQ(PyverbsCM):
     cdef v.ibv_srq *srq
     cdef object cq
-    cdef object qps
+    cdef DepRegistry deps
     cdef add_ref(self, obj)
     cpdef close(self)
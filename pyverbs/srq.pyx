@@ -1,11 +1,10 @@
-import weakref
 from libc.errno cimport errno
 from libc.string cimport memcpy
 from libc.stdlib cimport malloc, free
 from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsError
-from pyverbs.wr cimport RecvWR, SGE, copy_sg_array
+from pyverbs.wr cimport RecvWR, RecvWRBatch, SGE, copy_sg_array
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 cimport pyverbs.libibverbs_enums as e
 from pyverbs.device cimport Context
 from pyverbs.cq cimport CQEX, CQ
@@ -247,7 +246,7 @@ cdef class SRQ(PyverbsCM):
         super().__init__()
         self.srq = NULL
         self.cq = None
-        self.qps = weakref.WeakSet()
+        self.deps = DepRegistry()
         if isinstance(creator, PD):
             self._create_srq(creator, attr)
         elif isinstance(creator, Context):
@@ -266,7 +265,7 @@ cdef class SRQ(PyverbsCM):
         if self.srq != NULL:
             if self.logger:
                 self.logger.debug('Closing SRQ')
-            close_weakrefs([self.qps])
+            close_deps(self.deps, ('qps',))
             rc = v.ibv_destroy_srq(self.srq)
             if rc != 0:
                 raise PyverbsRDMAError('Failed to destroy SRQ', rc)
@@ -275,7 +274,7 @@ cdef class SRQ(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -336,3 +335,20 @@ cdef class SRQ(PyverbsCM):
             if bad_wr:
                 memcpy(&bad_wr.recv_wr, my_bad_wr, sizeof(bad_wr.recv_wr))
             raise PyverbsRDMAError('Failed to post receive to SRQ.', rc)
+
+    def post_recv_batch(self, RecvWRBatch wrs not None, num_wrs=None):
+        """
+        Posts the first <num_wrs> WRs of a RecvWRBatch on the SRQ with a
+        single ibv_post_srq_recv call. On failure, the index of the failed WR
+        is available in wrs.bad_wr.
+        :param wrs: The batch of WRs to post
+        :param num_wrs: Number of WRs to post. Defaults to the whole batch.
+        :return: None
+        """
+        cdef v.ibv_recv_wr *my_bad_wr = NULL
+        num_wrs = wrs.capacity if num_wrs is None else num_wrs
+        rc = v.ibv_post_srq_recv(self.srq, wrs.chain(num_wrs), &my_bad_wr)
+        if rc != 0:
+            wrs.set_bad_wr(my_bad_wr)
+            raise PyverbsRDMAError(f'Failed to post receive batch to SRQ, bad '
+                                   f'WR index {wrs.bad_wr}', rc)
@@ -3,7 +3,7 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsObject, PyverbsCM
+from pyverbs.base cimport PyverbsObject, PyverbsCM, DepRegistry
 from pyverbs.device cimport Context
 cimport pyverbs.libibverbs as v
 from pyverbs.cq cimport CQ
@@ -23,7 +23,7 @@ cdef class WQ(PyverbsCM):
     cdef Context context
     cdef PD pd
     cdef object cq
-    cdef object rwq_ind_tables
+    cdef DepRegistry deps
     cpdef add_ref(self, obj)
 
 cdef class RwqIndTableInitAttr(PyverbsObject):
@@ -34,7 +34,7 @@ cdef class RwqIndTable(PyverbsCM):
     cdef v.ibv_rwq_ind_table *rwq_ind_table
     cdef Context context
     cdef object wqs
-    cdef object qps
+    cdef DepRegistry deps
     cpdef add_ref(self, obj)
 
 cdef class RxHashConf(PyverbsObject):
@@ -4,14 +4,13 @@
 from libc.stdlib cimport calloc, free
 from libc.stdint cimport uint8_t
 from libc.string cimport memcpy
-import weakref
 
 from .pyverbs_error import PyverbsRDMAError, PyverbsError, PyverbsUserError
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 cimport pyverbs.libibverbs_enums as e
 from pyverbs.device cimport Context
-from pyverbs.wr cimport RecvWR
+from pyverbs.wr cimport RecvWR, RecvWRBatch
 from pyverbs.cq cimport CQ, CQEX
 from pyverbs.pd cimport PD
 from pyverbs.qp cimport QP
@@ -154,11 +153,11 @@ cdef class WQ(PyverbsCM):
         elif isinstance(attr.cq, CQEX):
             (<CQEX>attr.cq).add_ref(self)
         self.cq = attr.cq
-        self.rwq_ind_tables = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     cpdef add_ref(self, obj):
         if isinstance(obj, RwqIndTable):
-            self.rwq_ind_tables.add(obj)
+            self.deps.add('rwq_ind_tables', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -190,6 +189,23 @@ cdef class WQ(PyverbsCM):
                 memcpy(&bad_wr.recv_wr, my_bad_wr, sizeof(bad_wr.recv_wr))
             raise PyverbsRDMAError('Failed to post recv', rc)
 
+    def post_recv_batch(self, RecvWRBatch wrs not None, num_wrs=None):
+        """
+        Posts the first <num_wrs> WRs of a RecvWRBatch on the WQ with a
+        single ibv_post_wq_recv call. On failure, the index of the failed WR
+        is available in wrs.bad_wr.
+        :param wrs: The batch of WRs to post
+        :param num_wrs: Number of WRs to post. Defaults to the whole batch.
+        :return: None
+        """
+        cdef v.ibv_recv_wr *my_bad_wr = NULL
+        num_wrs = wrs.capacity if num_wrs is None else num_wrs
+        rc = v.ibv_post_wq_recv(self.wq, wrs.chain(num_wrs), &my_bad_wr)
+        if rc != 0:
+            wrs.set_bad_wr(my_bad_wr)
+            raise PyverbsRDMAError(f'Failed to post recv batch, bad WR index '
+                                   f'{wrs.bad_wr}', rc)
+
     def __dealloc__(self):
         self.close()
 
@@ -201,7 +217,7 @@ cdef class WQ(PyverbsCM):
         if self.wq != NULL:
             if self.logger:
                 self.logger.debug('Closing WQ')
-            close_weakrefs([self.rwq_ind_tables])
+            close_deps(self.deps, ('rwq_ind_tables',))
             rc = v.ibv_destroy_wq(self.wq)
             if rc != 0:
                 raise PyverbsRDMAError('Failed to dealloc WQ', rc)
@@ -265,11 +281,11 @@ cdef class RwqIndTable(PyverbsCM):
         self.wqs = attr.wqs_list
         for wq in self.wqs:
             wq.add_ref(self)
-        self.qps = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     cpdef add_ref(self, obj):
         if isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         else:
             raise PyverbsError('Unrecognized object type')
 
@@ -288,7 +304,7 @@ cdef class RwqIndTable(PyverbsCM):
         if self.rwq_ind_table != NULL:
             if self.logger:
                 self.logger.debug('Closing RWQ IND TBL')
-            close_weakrefs([self.qps])
+            close_deps(self.deps, ('qps',))
             rc = v.ibv_destroy_rwq_ind_table(self.rwq_ind_table)
             if rc != 0:
                 raise PyverbsRDMAError('Failed to dealloc RWQ IND TBL', rc)
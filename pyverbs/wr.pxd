@@ -8,14 +8,59 @@ from pyverbs cimport libibverbs as v
 
 
 cdef class SGE(PyverbsCM):
+    cdef v.ibv_sge sge_storage
     cdef v.ibv_sge *sge
+    cdef object sgl
     cpdef read(self, length, offset)
+    cdef v.ibv_sge *get_sge(self) except NULL
+
+cdef class SGEList(PyverbsCM):
+    cdef v.ibv_sge *sges
+    cdef int capacity
+    cdef int num_sge
+    cdef int num_wrs
+    cpdef close(self)
+    cdef check_idx(self, idx)
 
 cdef class RecvWR(PyverbsCM):
     cdef v.ibv_recv_wr recv_wr
+    cdef v.ibv_sge inline_sge
+    cdef v.ibv_sge *sg_buf
+    cdef object sg
+    cpdef close(self)
 
 cdef class SendWR(PyverbsCM):
     cdef v.ibv_send_wr send_wr
+    cdef v.ibv_sge inline_sge
+    cdef v.ibv_sge *sg_buf
+    cdef object sg
+    cdef object ah
+    cpdef close(self)
+
+cdef class WRBatch(PyverbsCM):
+    cdef void *buf
+    cdef v.ibv_sge *sges
+    cdef int capacity
+    cdef int max_sge
+    cdef int bad_idx
+    cpdef close(self)
+    cdef alloc(self, size_t wr_size, int capacity, int max_sge)
+    cdef check_num_wrs(self, num_wrs)
+    cdef set_sge_field(self, values, int sge, int field)
+
+cdef class RecvWRBatch(WRBatch):
+    cdef v.ibv_recv_wr *wrs
+    cdef v.ibv_recv_wr *chain(self, num_wrs) except NULL
+    cdef set_bad_wr(self, v.ibv_recv_wr *bad_wr)
+
+cdef class SendWRBatch(WRBatch):
+    cdef v.ibv_send_wr *wrs
     cdef object ah
+    cdef v.ibv_send_wr *chain(self, num_wrs) except NULL
+    cdef set_bad_wr(self, v.ibv_send_wr *bad_wr)
 
 cdef copy_sg_array(v.ibv_sge *dst, sg, num_sge)
+cdef hold_sg(sg)
+cdef drop_sg(sg)
+cdef v.ibv_sge *set_sg_list(v.ibv_sge *inline_sge, v.ibv_sge **sg_buf, sg,
+                            int num_sge) except NULL
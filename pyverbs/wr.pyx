@@ -7,7 +7,8 @@ from pyverbs.mr cimport MW, MR, MWBindInfo
 cimport pyverbs.libibverbs_enums as e
 cimport pyverbs.libibverbs as v
 from pyverbs.addr cimport AH
-from libc.stdlib cimport free, malloc
+from cpython.array cimport array
+from libc.stdlib cimport calloc, free, malloc
 from libc.string cimport memcpy
 from libc.stdint cimport uintptr_t
 
@@ -18,7 +19,12 @@ cdef class SGE(PyverbsCM):
     can be using a MR or a DMMR. In case direct (device's) memory is used,
     write can't be done using memcpy that relies on CPU-specific optimizations.
     A SGE has no way to tell which memory it is using.
+    The ibv_sge is stored inline in the object, unless the SGE is a view of an
+    SGEList entry.
     """
+    def __cinit__(self, *args, **kwargs):
+        self.sge = &self.sge_storage
+
     def __init__(self, addr, length, lkey):
         """
         Initializes a SGE object.
@@ -28,19 +34,10 @@ cdef class SGE(PyverbsCM):
         :return: A SGE object
         """
         super().__init__()
-        self.sge = <v.ibv_sge*>malloc(sizeof(v.ibv_sge))
-        if self.sge == NULL:
-            raise PyverbsError('Failed to allocate an SGE')
         self.sge.addr = addr
         self.sge.length = length
         self.sge.lkey = lkey
 
-    def __dealloc(self):
-        self.close()
-
-    cpdef close(self):
-        free(self.sge)
-
     cpdef read(self, length, offset):
         """
         Reads <length> bytes of data starting at <offset> bytes from the
@@ -49,37 +46,204 @@ cdef class SGE(PyverbsCM):
         :param offset: Offset from the SGE's address in bytes
         :return: The data written at the SGE's address + offset
         """
+        cdef v.ibv_sge *sge = self.get_sge()
         cdef char *sg_data
-        cdef int off = offset
-        sg_data = <char*>(<uintptr_t>self.sge.addr + off)
+        cdef size_t off
+        if length < 0 or offset < 0 or offset + length > sge.length:
+            raise PyverbsUserError(f'Range of {length} bytes at offset '
+                                   f'{offset} exceeds the SGE length '
+                                   f'{sge.length}')
+        off = offset
+        sg_data = <char*>(<uintptr_t>sge.addr + off)
         return sg_data[:length]
 
+    cdef v.ibv_sge *get_sge(self) except NULL:
+        """
+        Returns the SGE's ibv_sge, after checking that the SGEList the SGE
+        views wasn't closed.
+        """
+        if self.sgl is not None and (<SGEList>self.sgl).sges == NULL:
+            raise PyverbsUserError('The SGE list of this SGE was closed')
+        return self.sge
+
     def __str__(self):
+        cdef v.ibv_sge *sge = self.get_sge()
         print_format = '{:22}: {:<20}\n'
-        return print_format.format('Address', hex(self.sge.addr)) +\
-               print_format.format('Length', self.sge.length) +\
-               print_format.format('Key', hex(self.sge.lkey))
+        return print_format.format('Address', hex(sge.addr)) +\
+               print_format.format('Length', sge.length) +\
+               print_format.format('Key', hex(sge.lkey))
 
     @property
     def addr(self):
-        return self.sge.addr
+        return self.get_sge().addr
     @addr.setter
     def addr(self, val):
-        self.sge.addr = val
+        self.get_sge().addr = val
 
     @property
     def length(self):
-        return self.sge.length
+        return self.get_sge().length
     @length.setter
     def length(self, val):
-        self.sge.length = val
+        self.get_sge().length = val
 
     @property
     def lkey(self):
-        return self.sge.lkey
+        return self.get_sge().lkey
     @lkey.setter
     def lkey(self, val):
-        self.sge.lkey = val
+        self.get_sge().lkey = val
+
+
+cdef class SGEList(PyverbsCM):
+    """
+    A reusable array of ibv_sge structs. Entries are set in place, and
+    indexing the list returns SGE objects that view its entries, so building
+    a scatter-gather list doesn't allocate memory per SGE.
+    SendWR, RecvWR and QPEx.wr_set_sge_list() use the array as is, so the
+    list must be kept unchanged while a WR that uses it is outstanding. The
+    list can't be closed while a SendWR or RecvWR uses it, and its SGE views
+    can't be used once it's closed.
+    """
+    def __init__(self, sg=None, capacity=None):
+        """
+        Allocates an SGEList.
+        :param sg: Initial entries, SGE objects or (addr, length, lkey)
+                   tuples
+        :param capacity: Maximal number of entries, defaults to the number of
+                         initial entries
+        :return: An SGEList object
+        """
+        super().__init__()
+        sg = [] if sg is None else list(sg)
+        if capacity is None:
+            capacity = len(sg)
+        if capacity < 1 or capacity < len(sg):
+            raise PyverbsUserError(f'Invalid SGE list capacity {capacity} for '
+                                   f'{len(sg)} SGEs')
+        self.sges = <v.ibv_sge*>calloc(capacity, sizeof(v.ibv_sge))
+        if self.sges == NULL:
+            raise PyverbsError(f'Failed to allocate a list of {capacity} '
+                               f'SGEs')
+        self.capacity = capacity
+        for entry in sg:
+            self.append(entry)
+
+    def __dealloc__(self):
+        free(self.sges)
+        self.sges = NULL
+
+    cpdef close(self):
+        if self.num_wrs > 0:
+            raise PyverbsUserError(f'The SGE list is used by {self.num_wrs} '
+                                   f'WRs')
+        free(self.sges)
+        self.sges = NULL
+        self.capacity = 0
+        self.num_sge = 0
+
+    cdef check_idx(self, idx):
+        if self.sges == NULL:
+            raise PyverbsUserError('The SGE list is closed')
+        if idx < 0 or idx >= self.num_sge:
+            raise IndexError(f'SGE index {idx} is out of range, the list has '
+                             f'{self.num_sge} SGEs')
+
+    def __len__(self):
+        return self.num_sge
+
+    def __getitem__(self, idx):
+        """
+        :return: An SGE that views entry <idx> of the list. Changing it
+                 changes the list's entry.
+        """
+        cdef SGE sge
+        if idx < 0:
+            idx += self.num_sge
+        self.check_idx(idx)
+        sge = SGE.__new__(SGE)
+        sge.sge = self.sges + <int>idx
+        sge.sgl = self
+        return sge
+
+    def __setitem__(self, idx, val):
+        if idx < 0:
+            idx += self.num_sge
+        self.check_idx(idx)
+        if isinstance(val, SGE):
+            self.sges[<int>idx] = (<SGE>val).get_sge()[0]
+        else:
+            self.set(idx, *val)
+
+    def set(self, idx, addr, length, lkey):
+        """
+        Sets entry <idx> of the list.
+        :param idx: Index of the entry
+        :param addr: The SGE's address
+        :param length: The SGE's length
+        :param lkey: The SGE's local key
+        :return: None
+        """
+        cdef v.ibv_sge *sge
+        self.check_idx(idx)
+        sge = self.sges + <int>idx
+        sge.addr = addr
+        sge.length = length
+        sge.lkey = lkey
+
+    def append(self, val):
+        """
+        Adds an entry at the end of the list.
+        :param val: An SGE object or an (addr, length, lkey) tuple
+        :return: None
+        """
+        if self.sges == NULL:
+            raise PyverbsUserError('The SGE list is closed')
+        if self.num_sge == self.capacity:
+            raise PyverbsUserError(f'The SGE list is full ({self.capacity} '
+                                   f'SGEs)')
+        self.num_sge += 1
+        try:
+            self[self.num_sge - 1] = val
+        except:
+            self.num_sge -= 1
+            raise
+
+    def clear(self):
+        """
+        Empties the list so that it can be refilled, keeping its memory.
+        :return: None
+        """
+        self.num_sge = 0
+
+    @property
+    def capacity(self):
+        return self.capacity
+
+    @property
+    def num_sge(self):
+        return self.num_sge
+    @num_sge.setter
+    def num_sge(self, val):
+        if val < 0 or val > self.capacity:
+            raise PyverbsUserError(f'Invalid number of SGEs {val}, the list '
+                                   f'can hold {self.capacity} SGEs')
+        self.num_sge = val
+
+    @property
+    def total_length(self):
+        """
+        Sum of the lengths of the list's entries
+        """
+        cdef size_t total = 0
+        cdef int i
+        for i in range(self.num_sge):
+            total += self.sges[i].length
+        return total
+
+    def __str__(self):
+        return f'SGEList of {self.num_sge}/{self.capacity} SGEs:\n' + \
+            '\n'.join(str(sge) for sge in self)
 
 
 cdef class RecvWR(PyverbsCM):
@@ -88,28 +252,35 @@ cdef class RecvWR(PyverbsCM):
         """
         Initializes a RecvWR object.
         :param wr_id: A user-defined WR ID
-        :param num_sge: Size of the scatter-gather array
-        :param sg: A scatter-gather array
+        :param num_sge: Size of the scatter-gather array. Defaults to the
+                        length of <sg> if it's an SGEList.
+        :param sg: A scatter-gather array: a sequence of SGEs or an SGEList,
+                   which is used in place
         :param: next_wr: The next WR in the list
         :return: A RecvWR object
         """
         super().__init__()
-        cdef v.ibv_sge *dst
-        self.recv_wr.sg_list = <v.ibv_sge*>malloc(num_sge * sizeof(v.ibv_sge))
-        if self.recv_wr.sg_list == NULL:
-            raise PyverbsRDMAErrno('Failed to malloc SG buffer')
-        dst = self.recv_wr.sg_list
-        copy_sg_array(dst, sg, num_sge)
+        if num_sge == 0 and isinstance(sg, SGEList):
+            num_sge = len(sg)
+        self.recv_wr.sg_list = set_sg_list(&self.inline_sge, &self.sg_buf,
+                                           sg, num_sge)
+        if isinstance(sg, SGEList):
+            hold_sg(sg)
+            self.sg = sg
         self.recv_wr.num_sge = num_sge
         self.recv_wr.wr_id = wr_id
         if next_wr is not None:
             self.recv_wr.next = &next_wr.recv_wr
 
-    def __dealloc(self):
+    def __dealloc__(self):
         self.close()
 
     cpdef close(self):
-        free(self.recv_wr.sg_list)
+        free(self.sg_buf)
+        self.sg_buf = NULL
+        self.recv_wr.sg_list = NULL
+        drop_sg(self.sg)
+        self.sg = None
 
     def __str__(self):
         print_format = '{:22}: {:<20}\n'
@@ -150,24 +321,26 @@ cdef class SendWR(PyverbsCM):
         Initialize a SendWR object with user-provided or default values.
         :param wr_id: A user-defined WR ID
         :param opcode: The WR's opcode
-        :param num_sge: Number of scatter-gather elements in the WR
+        :param num_sge: Number of scatter-gather elements in the WR. Defaults
+                        to the length of <sg> if it's an SGEList.
         :param imm_data: Immediate data
-        :param sg: A SGE element, head of the scatter-gather list
+        :param sg: The scatter-gather list: a sequence of SGEs or an SGEList,
+                   which is used in place
         :param send_flags: Send flags as define in ibv_send_flags enum
         :return: An initialized SendWR object
         """
-        cdef v.ibv_sge *dst
-
         super().__init__()
+        if num_sge == 0 and isinstance(sg, SGEList):
+            num_sge = len(sg)
         mw_opcodes = [e.IBV_WR_LOCAL_INV, e.IBV_WR_BIND_MW,
                       e.IBV_WR_SEND_WITH_INV]
         if opcode not in mw_opcodes and (num_sge < 1 or sg is None):
             raise PyverbsUserError('A WR needs at least one SGE')
-        self.send_wr.sg_list = <v.ibv_sge*>malloc(num_sge * sizeof(v.ibv_sge))
-        if self.send_wr.sg_list == NULL:
-            raise PyverbsRDMAErrno('Failed to malloc SG buffer')
-        dst = self.send_wr.sg_list
-        copy_sg_array(dst, sg, num_sge)
+        self.send_wr.sg_list = set_sg_list(&self.inline_sge, &self.sg_buf,
+                                           sg, num_sge)
+        if isinstance(sg, SGEList):
+            hold_sg(sg)
+            self.sg = sg
         self.send_wr.num_sge = num_sge
         self.send_wr.wr_id = wr_id
         if next_wr is not None:
@@ -177,11 +350,16 @@ cdef class SendWR(PyverbsCM):
         self.send_wr.imm_data = imm_data
         self.ah = None
 
-    def __dealloc(self):
+    def __dealloc__(self):
         self.close()
 
     cpdef close(self):
-        free(self.send_wr.sg_list)
+        free(self.sg_buf)
+        self.sg_buf = NULL
+        self.send_wr.sg_list = NULL
+        drop_sg(self.sg)
+        self.sg = None
+        self.ah = None
 
     def __str__(self):
         print_format = '{:22}: {:<20}\n'
@@ -239,8 +417,21 @@ cdef class SendWR(PyverbsCM):
         self.send_wr.send_flags = val
 
     property sg_list:
-        def __set__(self, SGE val not None):
-            self.send_wr.sg_list = val.sge
+        def __set__(self, val not None):
+            """
+            Makes the WR use an SGE or an SGEList in place.
+            """
+            if isinstance(val, SGEList):
+                if (<SGEList>val).sges == NULL:
+                    raise PyverbsUserError('The SGE list is closed')
+                self.send_wr.sg_list = (<SGEList>val).sges
+            else:
+                self.send_wr.sg_list = (<SGE?>val).get_sge()
+            free(self.sg_buf)
+            self.sg_buf = NULL
+            hold_sg(val)
+            drop_sg(self.sg)
+            self.sg = val
 
     def set_wr_ud(self, AH ah not None, rqpn, rqkey):
         """
@@ -313,6 +504,340 @@ cdef class SendWR(PyverbsCM):
         """
         self.send_wr.qp_type.xrc.remote_srqn = remote_srqn
 
+cdef enum:
+    SGE_ADDR
+    SGE_LENGTH
+    SGE_LKEY
+
+
+cdef array to_column(WRBatch batch, values, typecode):
+    """
+    Converts <values> to an array of at most <batch>.capacity entries. A
+    single integer is broadcast to all the batch's entries.
+    """
+    cdef array col
+    cdef int capacity = batch.capacity
+    if batch.buf == NULL:
+        raise PyverbsUserError('The WR batch is closed')
+    if isinstance(values, int):
+        return array(typecode, [values]) * capacity
+    if isinstance(values, array) and values.typecode == typecode:
+        col = values
+    else:
+        col = array(typecode, values)
+    if len(col) > capacity:
+        raise PyverbsUserError(f'Got {len(col)} values for a batch of '
+                               f'{capacity} WRs')
+    return col
+
+
+cdef class WRBatch(PyverbsCM):
+    """
+    Base class for batches of work requests. The WRs and their scatter-gather
+    lists are laid out in a single allocation, WR <i> uses SGEs
+    [i * max_sge, (i + 1) * max_sge).
+    Setters accept either a single value, which is applied to all WRs, or a
+    sequence (preferably an array.array) of values for WRs 0..len-1.
+    """
+    cdef alloc(self, size_t wr_size, int capacity, int max_sge):
+        if capacity < 1 or max_sge < 0:
+            raise PyverbsUserError(f'Invalid batch capacity {capacity} or '
+                                   f'number of SGEs {max_sge}')
+        self.buf = calloc(1, capacity * (wr_size + max_sge * sizeof(v.ibv_sge)))
+        if self.buf == NULL:
+            raise PyverbsError(f'Failed to allocate a batch of {capacity} WRs')
+        self.sges = <v.ibv_sge*>(<char*>self.buf + capacity * wr_size)
+        self.capacity = capacity
+        self.max_sge = max_sge
+        self.bad_idx = -1
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        free(self.buf)
+        self.buf = NULL
+        self.sges = NULL
+
+    cdef check_num_wrs(self, num_wrs):
+        if self.buf == NULL:
+            raise PyverbsUserError('The WR batch is closed')
+        if num_wrs < 1 or num_wrs > self.capacity:
+            raise PyverbsUserError(f'Can\'t post {num_wrs} WRs from a batch '
+                                   f'of {self.capacity}')
+
+    cdef set_sge_field(self, values, int sge, int field):
+        cdef array col
+        cdef v.ibv_sge *dst
+        cdef int i
+        if sge < 0 or sge >= self.max_sge:
+            raise PyverbsUserError(f'Invalid SGE index {sge}, the batch has '
+                                   f'{self.max_sge} SGEs per WR')
+        col = to_column(self, values, 'Q' if field == SGE_ADDR else 'I')
+        dst = self.sges + sge
+        for i in range(len(col)):
+            if field == SGE_ADDR:
+                dst.addr = col.data.as_ulonglongs[i]
+            elif field == SGE_LENGTH:
+                dst.length = col.data.as_uints[i]
+            else:
+                dst.lkey = col.data.as_uints[i]
+            dst += self.max_sge
+
+    def set_addr(self, values, sge=0):
+        """
+        Sets the address of SGE <sge> of the WRs.
+        :param values: Address or a sequence of addresses
+        :param sge: SGE index within each WR
+        :return: None
+        """
+        self.set_sge_field(values, sge, SGE_ADDR)
+
+    def set_length(self, values, sge=0):
+        """
+        Sets the length of SGE <sge> of the WRs.
+        :param values: Length or a sequence of lengths
+        :param sge: SGE index within each WR
+        :return: None
+        """
+        self.set_sge_field(values, sge, SGE_LENGTH)
+
+    def set_lkey(self, values, sge=0):
+        """
+        Sets the local key of SGE <sge> of the WRs.
+        :param values: Local key or a sequence of local keys
+        :param sge: SGE index within each WR
+        :return: None
+        """
+        self.set_sge_field(values, sge, SGE_LKEY)
+
+    def set_sge(self, addr, length, lkey, sge=0):
+        """
+        Sets address, length and local key of SGE <sge> of the WRs.
+        :return: None
+        """
+        self.set_addr(addr, sge)
+        self.set_length(length, sge)
+        self.set_lkey(lkey, sge)
+
+    @property
+    def capacity(self):
+        return self.capacity
+
+    @property
+    def max_sge(self):
+        return self.max_sge
+
+    @property
+    def bad_wr(self):
+        """
+        The index of the WR that failed the last post of this batch, or None
+        if the last post succeeded.
+        """
+        return None if self.bad_idx < 0 else self.bad_idx
+
+
+cdef class RecvWRBatch(WRBatch):
+    def __init__(self, capacity, num_sge=1):
+        """
+        Allocates a batch of <capacity> receive WRs with <num_sge> SGEs each.
+        The batch is posted using a single ibv_post_recv call (see
+        QP.post_recv_batch(), SRQ.post_recv_batch() and
+        WQ.post_recv_batch()).
+        :param capacity: Number of WRs in the batch
+        :param num_sge: Number of SGEs per WR
+        :return: A RecvWRBatch object
+        """
+        cdef int i
+        super().__init__()
+        self.alloc(sizeof(v.ibv_recv_wr), capacity, num_sge)
+        self.wrs = <v.ibv_recv_wr*>self.buf
+        for i in range(capacity):
+            self.wrs[i].sg_list = self.sges + i * self.max_sge
+            self.wrs[i].num_sge = num_sge
+
+    cpdef close(self):
+        self.wrs = NULL
+        WRBatch.close(self)
+
+    cdef v.ibv_recv_wr *chain(self, num_wrs) except NULL:
+        cdef int i
+        self.check_num_wrs(num_wrs)
+        for i in range(num_wrs - 1):
+            self.wrs[i].next = &self.wrs[i + 1]
+        self.wrs[num_wrs - 1].next = NULL
+        self.bad_idx = -1
+        return self.wrs
+
+    cdef set_bad_wr(self, v.ibv_recv_wr *bad_wr):
+        self.bad_idx = bad_wr - self.wrs if bad_wr != NULL else 0
+
+    def set_wr_id(self, values):
+        """
+        Sets the WR IDs.
+        :param values: WR ID or a sequence of WR IDs
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'Q')
+        cdef int i
+        for i in range(len(col)):
+            self.wrs[i].wr_id = col.data.as_ulonglongs[i]
+
+    def set_num_sge(self, values):
+        """
+        Sets the number of used SGEs of the WRs.
+        :param values: Number of SGEs or a sequence of them, at most the
+                       batch's max_sge
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'I')
+        cdef int i
+        for i in range(len(col)):
+            if col.data.as_uints[i] > <unsigned int>self.max_sge:
+                raise PyverbsUserError(f'WR {i} can use at most '
+                                       f'{self.max_sge} SGEs')
+            self.wrs[i].num_sge = col.data.as_uints[i]
+
+
+cdef class SendWRBatch(WRBatch):
+    def __init__(self, capacity, num_sge=1, opcode=e.IBV_WR_SEND,
+                 send_flags=e.IBV_SEND_SIGNALED):
+        """
+        Allocates a batch of <capacity> send WRs with <num_sge> SGEs each.
+        The batch is posted using a single ibv_post_send call (see
+        QP.post_send_batch()).
+        :param capacity: Number of WRs in the batch
+        :param num_sge: Number of SGEs per WR
+        :param opcode: Initial opcode of all WRs
+        :param send_flags: Initial send flags of all WRs
+        :return: A SendWRBatch object
+        """
+        cdef int i
+        super().__init__()
+        self.alloc(sizeof(v.ibv_send_wr), capacity, num_sge)
+        self.wrs = <v.ibv_send_wr*>self.buf
+        for i in range(capacity):
+            self.wrs[i].sg_list = self.sges + i * self.max_sge
+            self.wrs[i].num_sge = num_sge
+            self.wrs[i].opcode = opcode
+            self.wrs[i].send_flags = send_flags
+        self.ah = None
+
+    def __dealloc__(self):
+        self.close()
+
+    cpdef close(self):
+        if self.wrs != NULL:
+            self.wrs = NULL
+            self.ah = None
+            WRBatch.close(self)
+
+    cdef v.ibv_send_wr *chain(self, num_wrs) except NULL:
+        cdef int i
+        self.check_num_wrs(num_wrs)
+        for i in range(num_wrs - 1):
+            self.wrs[i].next = &self.wrs[i + 1]
+        self.wrs[num_wrs - 1].next = NULL
+        self.bad_idx = -1
+        return self.wrs
+
+    cdef set_bad_wr(self, v.ibv_send_wr *bad_wr):
+        self.bad_idx = bad_wr - self.wrs if bad_wr != NULL else 0
+
+    def set_wr_id(self, values):
+        """
+        Sets the WR IDs.
+        :param values: WR ID or a sequence of WR IDs
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'Q')
+        cdef int i
+        for i in range(len(col)):
+            self.wrs[i].wr_id = col.data.as_ulonglongs[i]
+
+    def set_num_sge(self, values):
+        """
+        Sets the number of used SGEs of the WRs.
+        :param values: Number of SGEs or a sequence of them, at most the
+                       batch's max_sge
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'I')
+        cdef int i
+        for i in range(len(col)):
+            if col.data.as_uints[i] > <unsigned int>self.max_sge:
+                raise PyverbsUserError(f'WR {i} can use at most '
+                                       f'{self.max_sge} SGEs')
+            self.wrs[i].num_sge = col.data.as_uints[i]
+
+    def set_opcode(self, values):
+        """
+        Sets the WRs' opcodes.
+        :param values: Opcode or a sequence of opcodes (see ibv_wr_opcode)
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'I')
+        cdef int i
+        for i in range(len(col)):
+            self.wrs[i].opcode = <e.ibv_wr_opcode>col.data.as_uints[i]
+
+    def set_send_flags(self, values):
+        """
+        Sets the WRs' send flags.
+        :param values: Send flags or a sequence of them (see ibv_send_flags)
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'I')
+        cdef int i
+        for i in range(len(col)):
+            self.wrs[i].send_flags = col.data.as_uints[i]
+
+    def set_imm_data(self, values):
+        """
+        Sets the WRs' immediate data.
+        :param values: Immediate data or a sequence of them
+        :return: None
+        """
+        cdef array col = to_column(self, values, 'I')
+        cdef int i
+        for i in range(len(col)):
+            self.wrs[i].imm_data = col.data.as_uints[i]
+
+    def set_wr_rdma(self, rkey, remote_addr):
+        """
+        Sets the RDMA remote key and address of the WRs.
+        :param rkey: Remote key or a sequence of remote keys
+        :param remote_addr: Remote address or a sequence of remote addresses
+        :return: None
+        """
+        cdef array keys = to_column(self, rkey, 'I')
+        cdef array addrs = to_column(self, remote_addr, 'Q')
+        cdef int i
+        for i in range(len(keys)):
+            self.wrs[i].wr.rdma.rkey = keys.data.as_uints[i]
+        for i in range(len(addrs)):
+            self.wrs[i].wr.rdma.remote_addr = addrs.data.as_ulonglongs[i]
+
+    def set_wr_ud(self, AH ah not None, rqpn, rqkey):
+        """
+        Sets the UD destination of the WRs.
+        :param ah: The address handle used by all WRs
+        :param rqpn: Remote QP number or a sequence of them
+        :param rqkey: Remote QKey or a sequence of them
+        :return: None
+        """
+        cdef array qpns = to_column(self, rqpn, 'I')
+        cdef array qkeys = to_column(self, rqkey, 'I')
+        cdef int i
+        self.ah = ah
+        for i in range(self.capacity):
+            self.wrs[i].wr.ud.ah = ah.ah
+        for i in range(len(qpns)):
+            self.wrs[i].wr.ud.remote_qpn = qpns.data.as_uints[i]
+        for i in range(len(qkeys)):
+            self.wrs[i].wr.ud.remote_qkey = qkeys.data.as_uints[i]
+
+
 def send_flags_to_str(flags):
     send_flags = {e.IBV_SEND_FENCE: 'IBV_SEND_FENCE',
                   e.IBV_SEND_SIGNALED: 'IBV_SEND_SIGNALED',
@@ -329,7 +854,61 @@ def send_flags_to_str(flags):
 
 cdef copy_sg_array(v.ibv_sge *dst, sg, num_sge):
     cdef v.ibv_sge *src
+    if isinstance(sg, SGEList):
+        if num_sge > (<SGEList>sg).num_sge:
+            raise PyverbsUserError(f'Requested {num_sge} SGEs from a list of '
+                                   f'{len(sg)}')
+        memcpy(dst, (<SGEList>sg).sges, num_sge * sizeof(v.ibv_sge))
+        return
     for i in range(num_sge):
-        src = (<SGE>sg[i]).sge
+        src = (<SGE>sg[i]).get_sge()
         memcpy(dst, src, sizeof(v.ibv_sge))
         dst += 1
+
+
+cdef hold_sg(sg):
+    """
+    Marks the SGEList that <sg> is, or that it views if it's an SGE, as used
+    by a WR, so that it can't be closed.
+    """
+    if isinstance(sg, SGE):
+        sg = (<SGE>sg).sgl
+    if isinstance(sg, SGEList):
+        (<SGEList>sg).num_wrs += 1
+
+
+cdef drop_sg(sg):
+    """
+    Undoes hold_sg() once a WR stops using <sg>.
+    """
+    if isinstance(sg, SGE):
+        sg = (<SGE>sg).sgl
+    if isinstance(sg, SGEList):
+        (<SGEList>sg).num_wrs -= 1
+
+
+cdef v.ibv_sge *set_sg_list(v.ibv_sge *inline_sge, v.ibv_sge **sg_buf, sg,
+                            int num_sge) except NULL:
+    """
+    Returns the scatter-gather array of a WR. An SGEList's array is used in
+    place and a single SGE is copied to the WR's inline SGE, so only longer
+    sequences of SGEs are copied to an allocated array, which is returned in
+    <sg_buf> for the WR to free.
+    """
+    cdef v.ibv_sge *dst
+    if isinstance(sg, SGEList):
+        if (<SGEList>sg).sges == NULL:
+            raise PyverbsUserError('The SGE list is closed')
+        if num_sge > (<SGEList>sg).num_sge:
+            raise PyverbsUserError(f'Requested {num_sge} SGEs from a list of '
+                                   f'{len(sg)}')
+        return (<SGEList>sg).sges
+    if num_sge <= 1:
+        dst = inline_sge
+    else:
+        dst = <v.ibv_sge*>malloc(num_sge * sizeof(v.ibv_sge))
+        if dst == NULL:
+            raise PyverbsError(f'Failed to allocate {num_sge} SGEs')
+        sg_buf[0] = dst
+    copy_sg_array(dst, sg, num_sge)
+    return dst
@@ -3,7 +3,7 @@
 
 #cython: language_level=3
 
-from pyverbs.base cimport PyverbsCM, PyverbsObject
+from pyverbs.base cimport PyverbsCM, PyverbsObject, DepRegistry
 from pyverbs.device cimport Context
 cimport pyverbs.libibverbs as v
 
@@ -16,5 +16,4 @@ cdef class XRCD(PyverbsCM):
     cdef v.ibv_xrcd *xrcd
     cdef Context ctx
     cdef add_ref(self, obj)
-    cdef object srqs
-    cdef object qps
+    cdef DepRegistry deps
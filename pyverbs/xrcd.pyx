@@ -1,10 +1,9 @@
 # SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
 # Copyright (c) 2019, Mellanox Technologies. All rights reserved.
-import weakref
 
 from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.base cimport close_weakrefs
+from pyverbs.base cimport DepRegistry, close_deps
 from pyverbs.device cimport Context
 from pyverbs.srq cimport SRQ
 from pyverbs.qp cimport QP
@@ -54,8 +53,7 @@ cdef class XRCD(PyverbsCM):
         self.ctx = context
         context.add_ref(self)
         self.logger.debug('XRCD: Allocated ibv_xrcd')
-        self.srqs = weakref.WeakSet()
-        self.qps = weakref.WeakSet()
+        self.deps = DepRegistry()
 
     def __dealloc__(self):
         """
@@ -76,7 +74,7 @@ cdef class XRCD(PyverbsCM):
         if self.xrcd != NULL:
             if self.logger:
                 self.logger.debug('Closing XRCD')
-            close_weakrefs([self.qps, self.srqs])
+            close_deps(self.deps, ('qps', 'srqs'))
             rc = v.ibv_close_xrcd(self.xrcd)
             if rc != 0:
                 raise PyverbsRDMAError('Failed to dealloc XRCD', rc)
@@ -85,8 +83,8 @@ cdef class XRCD(PyverbsCM):
 
     cdef add_ref(self, obj):
         if isinstance(obj, QP):
-            self.qps.add(obj)
+            self.deps.add('qps', obj)
         elif isinstance(obj, SRQ):
-            self.srqs.add(obj)
+            self.deps.add('srqs', obj)
         else:
             raise PyverbsError('Unrecognized object type')
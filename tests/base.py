@@ -223,7 +223,7 @@ class RDMATestCase(unittest.TestCase):
 
         self.args = []
         if self.dev_name is not None:
-            ctx = d.Context(name=self.dev_name)
+            ctx = d.Context(name=self.dev_name, query_cache=True)
             if self.ib_port is not None:
                 if self.gid_index is not None:
                     self._get_ip_mac(self.dev_name, self.ib_port, self.gid_index)
@@ -239,7 +239,7 @@ class RDMATestCase(unittest.TestCase):
             lst = d.get_device_list()
             for dev in lst:
                 dev_name = dev.name.decode()
-                ctx = d.Context(name=dev_name)
+                ctx = d.Context(name=dev_name, query_cache=True)
                 self._add_gids_per_device(ctx, dev_name)
 
         if not self.args:
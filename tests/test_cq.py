@@ -7,11 +7,13 @@ Test module for pyverbs' cq module.
 """
 import unittest
 import errno
+import time
 
 from tests.base import PyverbsAPITestCase, RDMATestCase, UDResources
-from pyverbs.pyverbs_error import PyverbsRDMAError
+from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsUserError
 from pyverbs.base import PyverbsRDMAErrno
-from pyverbs.cq import CompChannel, CQ
+from pyverbs.cq import CompChannel, CQ, WCBatch
+from pyverbs.libibverbs_enums import ibv_wc_opcode, ibv_wc_status
 import tests.irdma_base as irdma
 from pyverbs.qp import QPCap
 import pyverbs.device as d
@@ -80,6 +82,27 @@ class CQAPITest(PyverbsAPITestCase):
             CQ(self.ctx, 100, None, None, self.ctx.num_comp_vectors + 1)
         self.assertEqual(ex.exception.error_code, errno.EINVAL)
 
+    def test_modify_cq_moderation(self):
+        """
+        Test CQ.modify() with values within the device's CQ moderation caps
+        and verify that values beyond the caps are rejected.
+        """
+        caps = self.attr_ex.cq_mod_caps
+        if caps.max_cq_count == 0 or caps.max_cq_period == 0:
+            raise unittest.SkipTest('CQ moderation is not supported')
+        with CQ(self.ctx, 100, None, None, 0) as cq:
+            try:
+                cq.modify(min(caps.max_cq_count, 16),
+                          min(caps.max_cq_period, 10))
+            except PyverbsRDMAError as ex:
+                if ex.error_code == errno.EOPNOTSUPP:
+                    raise unittest.SkipTest('Modify CQ is not supported')
+                raise ex
+            with self.assertRaises(PyverbsUserError):
+                cq.modify(caps.max_cq_count + 1, 1)
+            with self.assertRaises(PyverbsUserError):
+                cq.modify(1, caps.max_cq_period + 1)
+
 
 class CQTest(RDMATestCase):
     """
@@ -133,3 +156,71 @@ class CQTest(RDMATestCase):
         finally:
             for i in range(post_send_num):
                 u.poll_cq(self.client.cq)
+
+    def test_poll_batch(self):
+        """
+        Send <iters> UD messages and drain both sides' completions with
+        CQ.poll_batch(), reusing a single WCBatch for the receive side.
+        """
+        self.create_players(CQUDResources, cq_depth=self.iters)
+        recv_wr = u.get_recv_wr(self.server)
+        u.post_recv(self.server, recv_wr, num_wqes=self.iters)
+        send_wr, _ = u.get_send_elements(self.client, False)
+        ah_client = u.get_global_ah(self.client, self.gid_index, self.ib_port)
+        for i in range(self.iters):
+            send_wr.wr_id = i
+            u.send(self.client, send_wr, ah=ah_client)
+
+        for cq, opcode in [(self.client.cq, ibv_wc_opcode.IBV_WC_SEND),
+                           (self.server.cq, ibv_wc_opcode.IBV_WC_RECV)]:
+            wcs = WCBatch(self.iters)
+            wr_ids = []
+            start_poll_t = time.perf_counter()
+            while len(wr_ids) < self.iters and \
+                    time.perf_counter() - start_poll_t < u.POLL_CQ_TIMEOUT:
+                npolled, wcs = cq.poll_batch(self.iters - len(wr_ids), wcs)
+                self.assertEqual(npolled, len(wcs))
+                self.assertTrue(wcs.all_success(),
+                                'Got a completion with an error status')
+                self.assertTrue(all(op == opcode for op in wcs.opcode))
+                wr_ids.extend(wcs.wr_id)
+            self.assertEqual(len(wr_ids), self.iters,
+                             'Got timeout on polling CQ')
+            if opcode == ibv_wc_opcode.IBV_WC_SEND:
+                self.assertEqual(wr_ids, list(range(self.iters)))
+
+    def test_poll_batch_ring(self):
+        """
+        Poll completions into the CQ's own completion ring and verify that the
+        ring and its WCView slots are reused across polls.
+        """
+        self.create_players(CQUDResources, cq_depth=self.iters)
+        send_wr, _ = u.get_send_elements(self.client, False)
+        ah_client = u.get_global_ah(self.client, self.gid_index, self.ib_port)
+        ring = self.client.cq.ring
+        views = []
+        for i in range(self.iters):
+            send_wr.wr_id = i
+            u.send(self.client, send_wr, ah=ah_client)
+            npolled = 0
+            start_poll_t = time.perf_counter()
+            while npolled == 0 and \
+                    time.perf_counter() - start_poll_t < u.POLL_CQ_TIMEOUT:
+                npolled, wcs = self.client.cq.poll_batch()
+            self.assertEqual(npolled, 1, 'Got timeout on polling CQ')
+            self.assertIs(wcs, ring)
+            for wc in wcs:
+                self.assertEqual(wc.status, ibv_wc_status.IBV_WC_SUCCESS)
+                self.assertEqual(wc.wr_id, i)
+                views.append(wc)
+        self.assertTrue(all(view is views[0] for view in views))
+        self.assertEqual(views[0].to_wc().wr_id, self.iters - 1)
+        # The ring is never reallocated
+        with self.assertRaises(PyverbsUserError):
+            self.client.cq.poll_batch(ring.capacity + 1)
+        self.assertIs(self.client.cq.ring, ring)
+        self.client.cq.close()
+        with self.assertRaises(PyverbsUserError):
+            self.client.cq.ring
+        with self.assertRaises(PyverbsUserError):
+            self.client.cq.poll_batch()
@@ -1,12 +1,16 @@
+import asyncio
 import errno
+import time
 import unittest
 
 from pyverbs.pyverbs_error import PyverbsRDMAError
 from tests.base import RCResources, UDResources
 from tests.base import RDMATestCase
 from tests.utils import traffic
+import tests.utils as u
 
 from pyverbs.cq import CQ, CompChannel
+from pyverbs.libibverbs_enums import ibv_wc_status
 
 
 def create_cq_with_comp_channel(agr_obj):
@@ -37,3 +41,67 @@ class CqEventsTestCase(RDMATestCase):
     def test_cq_events_rc(self):
         self.create_players(CqEventsRC)
         traffic(**self.traffic_args)
+
+    def test_cq_events_async_rc(self):
+        """
+        Waits for RC send and receive completions of several CQs from a single
+        asyncio event loop using CQ.wait_completions().
+        """
+        self.create_players(CqEventsRC)
+        asyncio.run(self.async_traffic())
+
+    def test_cq_events_async_loops_rc(self):
+        """
+        Waits for completions from two consecutive event loops, without
+        detaching the completion channels from the first one.
+        """
+        self.create_players(CqEventsRC)
+        self.iters = 10
+        asyncio.run(self.async_traffic(detach=False))
+        asyncio.run(self.async_traffic())
+
+    async def async_traffic(self, detach=True):
+        recv_wr = u.get_recv_wr(self.server)
+        u.post_recv(self.server, recv_wr)
+        for _ in range(self.iters):
+            send_wr, _ = u.get_send_elements(self.client, False)
+            u.send(self.client, send_wr)
+            waiters = asyncio.gather(self.client.cq.wait_completions(1),
+                                     self.server.cq.wait_completions(1))
+            client_wcs, server_wcs = \
+                await asyncio.wait_for(waiters, u.POLL_CQ_TIMEOUT)
+            for wc in client_wcs + server_wcs:
+                self.assertEqual(wc.status, ibv_wc_status.IBV_WC_SUCCESS)
+            u.post_recv(self.server, recv_wr)
+        if detach:
+            self.client.comp_channel.detach()
+            self.server.comp_channel.detach()
+
+    def test_cq_wait_rc(self):
+        """
+        Runs RC traffic using CQ.wait() with no spin budget, so the waiting
+        thread sleeps on the completion channel.
+        """
+        self.create_players(CqEventsRC)
+        recv_wr = u.get_recv_wr(self.server)
+        u.post_recv(self.server, recv_wr)
+        for _ in range(self.iters):
+            send_wr, _ = u.get_send_elements(self.client, False)
+            u.send(self.client, send_wr)
+            for player in [self.client, self.server]:
+                npolled, wcs = player.cq.wait(1, timeout=u.POLL_CQ_TIMEOUT,
+                                              spin_us=0)
+                self.assertEqual(npolled, 1)
+                self.assertTrue(wcs.all_success())
+            u.post_recv(self.server, recv_wr)
+
+    def test_cq_wait_timeout(self):
+        """
+        Verifies that CQ.wait() returns when the timeout expires and no
+        completion arrived.
+        """
+        self.create_players(CqEventsRC)
+        start = time.perf_counter()
+        npolled, _ = self.client.cq.wait(1, timeout=0.1, spin_us=10)
+        self.assertEqual(npolled, 0)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)
@@ -1,6 +1,7 @@
 from tests.base import RCResources, UDResources, XRCResources, RDMATestCase, \
     PyverbsAPITestCase
 from pyverbs.pyverbs_error import PyverbsRDMAError
+from pyverbs.pyverbs_error import PyverbsUserError
 from pyverbs.cq import CqInitAttrEx, CQEX
 from pyverbs.libibverbs_enums import ibv_access_flags, ibv_raw_packet_caps, ibv_create_cq_wc_flags, \
     ibv_cq_init_attr_mask, ibv_create_cq_attr_flags, IBV_WC_STANDARD_FLAGS
@@ -8,6 +9,7 @@ from pyverbs.mr import MR
 import tests.utils as u
 import unittest
 import errno
+import time
 
 
 def create_ex_cq(res):
@@ -66,6 +68,43 @@ class CqExTestCase(RDMATestCase):
         self.create_players(CqExXRC)
         u.xrc_traffic(self.client, self.server, is_cq_ex=True)
 
+    def test_rc_drain_cq_ex(self):
+        """
+        Send messages over RC and collect the receive completions with a
+        single CQEX.drain() call, requesting only a subset of the CQ's
+        wc_flags.
+        """
+        self.iters = 10
+        self.create_players(CqExRC)
+        recv_wr = u.get_recv_wr(self.server)
+        u.post_recv(self.server, recv_wr, num_wqes=self.iters)
+        send_wr, _ = u.get_send_elements(self.client, False)
+        for i in range(self.iters):
+            send_wr.wr_id = i
+            u.send(self.client, send_wr)
+            u.poll_cq_ex(self.client.cq)
+        fields = ibv_create_cq_wc_flags.IBV_WC_EX_WITH_BYTE_LEN | \
+                 ibv_create_cq_wc_flags.IBV_WC_EX_WITH_QP_NUM
+        byte_lens, qp_nums = [], []
+        start_poll_t = time.perf_counter()
+        while len(byte_lens) < self.iters and \
+                time.perf_counter() - start_poll_t < u.POLL_CQ_TIMEOUT:
+            npolled, recs = self.server.cq.drain(self.iters - len(byte_lens),
+                                                 fields)
+            self.assertEqual(npolled, len(recs))
+            self.assertTrue(recs.all_success(),
+                            'Got a completion with an error status')
+            byte_lens.extend(recs.byte_len)
+            qp_nums.extend(recs.qp_num)
+        self.assertEqual(len(byte_lens), self.iters, 'Got timeout on polling CQ')
+        self.assertEqual(set(byte_lens), {self.server.msg_size})
+        self.assertEqual(set(qp_nums), {self.server.qp.qp_num})
+        with self.assertRaises(PyverbsUserError):
+            recs.imm_data
+        for max_entries in [0, -1]:
+            with self.assertRaises(PyverbsUserError):
+                self.server.cq.drain(max_entries, recs=recs)
+
 
 class CQEXAPITest(PyverbsAPITestCase):
     """
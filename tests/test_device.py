@@ -5,13 +5,15 @@
 Test module for pyverbs' device module.
 """
 from multiprocessing import Process, Queue
+from array import array
 import unittest
 import resource
 import random
 import errno
 import os
 
-from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError
+from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, \
+    PyverbsUserError
 from tests.base import PyverbsAPITestCase
 from pyverbs.device import Context, DM
 import tests.utils as u
@@ -284,6 +286,38 @@ class DeviceTest(PyverbsAPITestCase):
                         'Successfully queried non-existing port {p}'. \
                         format(p=port))
 
+    def test_query_cache(self):
+        """
+        Test that cached query results match the uncached ones and that
+        invalidated entries are queried again
+        """
+        with d.Context(name=self.dev_name, query_cache=True) as ctx:
+            self.assertTrue(ctx.query_cache)
+            dev_attr = ctx.query_device()
+            port_attr = ctx.query_port(self.ib_port)
+            pkey = ctx.query_pkey(self.ib_port, 0)
+            if port_attr.gid_tbl_len > 0:
+                gid = ctx.query_gid(self.ib_port, 0)
+                cached_gid = ctx.query_gid(self.ib_port, 0)
+                self.assertIsNot(cached_gid, gid)
+                self.assertEqual(cached_gid.gid, gid.gid)
+            self.assertEqual(ctx.query_device().node_guid, dev_attr.node_guid)
+            self.assertEqual(ctx.query_port(self.ib_port).lid, port_attr.lid)
+            self.assertEqual(ctx.query_pkey(self.ib_port, 0), pkey)
+            stats = ctx.query_cache_stats
+            self.assertEqual(stats['misses'], stats['entries'])
+            self.assertEqual(stats['hits'], stats['entries'])
+            # Only the device's entry is left
+            ctx.invalidate_query_cache(self.ib_port)
+            stats = ctx.query_cache_stats
+            self.assertEqual(stats['invalidations'], stats['misses'] - 1)
+            ctx.query_port(self.ib_port)
+            stats = ctx.query_cache_stats
+            self.assertEqual(stats['misses'], stats['hits'] + 1)
+            self.assertEqual(stats['entries'], 2)
+            ctx.query_cache = False
+            self.assertEqual(ctx.query_cache_stats['entries'], 0)
+
 
 class DMTest(PyverbsAPITestCase):
     """
@@ -402,6 +436,40 @@ class DMTest(PyverbsAPITestCase):
             read_str = dm.copy_from_dm(data_offset, data_length)
             assert read_str.decode() == data
 
+    def test_dm_vec_copy(self):
+        """
+        Test scatter/gather copies between buffers and several DM regions
+        """
+        dm_len = 256
+        if dm_len > self.attr_ex.max_dm_size:
+            raise unittest.SkipTest('The device memory is too small')
+        dm_attrs = u.get_dm_attrs(dm_len)
+        chunk = 64
+        regions = [(192, chunk), (0, chunk), (128, u.DM_ALIGNMENT)]
+        total = sum(length for _, length in regions)
+        data = bytes(random.randrange(256) for _ in range(total))
+        with d.DM(self.ctx, dm_attrs) as dm:
+            self.assertEqual(dm.copy_to_dm_vec(memoryview(data), regions), total)
+            self.assertEqual(dm.copy_from_dm(0, chunk), data[chunk:2 * chunk])
+            buf = bytearray(total)
+            self.assertEqual(dm.copy_from_dm_into(buf, regions), total)
+            self.assertEqual(bytes(buf), data)
+            buf = bytearray(chunk)
+            dm.copy_from_dm_into(memoryview(buf), dm_offset=192)
+            self.assertEqual(bytes(buf), data[:chunk])
+            with self.assertRaises(PyverbsUserError):
+                dm.copy_from_dm_into(bytearray(total - 1), regions)
+            with self.assertRaises(PyverbsUserError):
+                dm.copy_to_dm_vec(data, [(-4, 4)])
+            # Typed arrays are copied as raw bytes
+            counters = array('Q', range(1, 9))
+            self.assertEqual(dm.copy_to_dm_vec(counters, [(0, 64)]), 64)
+            dst = array('Q', [0] * 8)
+            self.assertEqual(dm.copy_from_dm_into(dst, [(0, 64)]), 64)
+            self.assertEqual(dst, counters)
+            with self.assertRaises(PyverbsUserError):
+                dm.copy_to_dm_vec(memoryview(data)[::2], [(0, 4)])
+
     def alloc_dm(self, res_queue, size):
         """
         Alloc device memory. Used by multiple processes that allocate DMs in
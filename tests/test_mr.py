@@ -5,16 +5,20 @@
 Test module for pyverbs' mr module.
 """
 import unittest
+from array import array
+import resource
 import random
 import errno
 
 from tests.base import PyverbsAPITestCase, RCResources, RDMATestCase
-from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsError
+from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsError, PyverbsUserError
 from pyverbs.mr import MR, MW, DMMR, DmaBufMR, MWBindInfo, MWBind
-from pyverbs.mem_alloc import posix_memalign, free
+from pyverbs.mem_alloc import posix_memalign, free, mmap, munmap, read as mem_read, \
+    MAP_ANONYMOUS_, MAP_PRIVATE_, MAP_NORESERVE_
+import pyverbs.mem_alloc as mem
 from pyverbs.dmabuf import DmaBuf
 from pyverbs.qp import QPAttr
-from pyverbs.wr import SendWR
+from pyverbs.wr import SendWR, SGE
 import pyverbs.device as d
 from pyverbs.pd import PD
 from pyverbs.libibverbs_enums import ibv_access_flags, ibv_qp_state, ibv_qp_attr_mask, ibv_rereg_mr_flags, \
@@ -22,6 +26,7 @@ from pyverbs.libibverbs_enums import ibv_access_flags, ibv_qp_state, ibv_qp_attr
 import tests.utils as u
 
 MAX_IO_LEN = 1048576
+GIB = 1 << 30
 DM_INVALID_ALIGNMENT = 3
 
 
@@ -182,6 +187,172 @@ class MRTest(RDMATestCase):
                                             'Failed to register a MR'):
                     MR(pd, u.get_mr_length(), ibv_access_flags.IBV_ACCESS_REMOTE_ATOMIC)
 
+    def test_mr_buffer_protocol(self):
+        """
+        Verify zero-copy access to the MR's buffer through the buffer protocol,
+        and that exported views keep the buffer alive after the MR is closed.
+        """
+        length = u.get_mr_length()
+        with d.Context(name=self.dev_name) as ctx:
+            with PD(ctx) as pd:
+                mr = MR(pd, length, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE)
+                mv = memoryview(mr)
+                self.assertEqual(len(mv), length)
+                self.assertFalse(mv.readonly)
+                mv[:4] = b'abcd'
+                self.assertEqual(mr.read(4, 0), b'abcd')
+                mr.write(bytearray(b'efgh'), 4, 8)
+                view = mr.view(8, 4)
+                self.assertEqual(bytes(view), b'efgh')
+                words = array('I', [1, 2])
+                mr.write(words, 8, 16)
+                self.assertEqual(mr.read(8, 16), words.tobytes())
+                with self.assertRaises(PyverbsUserError):
+                    mr.write(b'ab', 4, 16)
+                self.assertEqual(mr.exports, 2)
+                with self.assertRaises(PyverbsUserError):
+                    mr.view(length - 2, 4)
+                mr.close()
+                self.assertEqual(bytes(mv[:4]), b'abcd')
+                with self.assertRaises(PyverbsUserError):
+                    memoryview(mr)
+                view.release()
+                mv.release()
+                self.assertEqual(mr.exports, 0)
+
+    def test_mr_large_offset(self):
+        """
+        Register a sparse 5 GiB region using ODP and verify that accesses at
+        offsets beyond 4 GiB reach the right address and that accesses beyond
+        the MR's end are refused.
+        """
+        length = 5 * GIB
+        offset = 4 * GIB + 17
+        data = b'pyverbs'
+        with d.Context(name=self.dev_name) as ctx:
+            u.odp_supported(ctx, 'rc', 0)
+            addr = mmap(length=length,
+                        flags=MAP_PRIVATE_ | MAP_ANONYMOUS_ | MAP_NORESERVE_)
+            try:
+                with PD(ctx) as pd:
+                    try:
+                        mr = MR(pd, length, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE |
+                                ibv_access_flags.IBV_ACCESS_ON_DEMAND, address=addr)
+                    except PyverbsRDMAError as ex:
+                        if ex.error_code == errno.EOPNOTSUPP:
+                            raise unittest.SkipTest('ODP MR registration is not supported')
+                        raise ex
+                    with mr:
+                        mr.write(data, len(data), offset)
+                        self.assertEqual(mr.read(len(data), offset), data)
+                        self.assertEqual(bytes(mr.view(offset, len(data))), data)
+                        self.assertEqual(mem_read(addr, len(data), offset), data)
+                        mr.write(data, len(data), 3 * GIB)
+                        sge = SGE(addr, 4 * GIB - 1, mr.lkey)
+                        self.assertEqual(sge.read(len(data), 3 * GIB), data)
+                        with self.assertRaises(PyverbsUserError):
+                            mr.read(len(data), length - 1)
+                        with self.assertRaises(PyverbsUserError):
+                            mr.write(data, len(data), length - 1)
+            finally:
+                munmap(addr, length)
+
+    def test_reg_mrs(self):
+        """
+        Register several buffers, one of them split into chunks, from a
+        thread pool and verify the MRs cover the buffers in order.
+        """
+        page_size = resource.getpagesize()
+        lengths = [page_size, 3 * page_size, 10 * page_size]
+        addrs = [mmap(length=l) for l in lengths]
+        try:
+            with d.Context(name=self.dev_name) as ctx:
+                with PD(ctx) as pd:
+                    mrs, stats = pd.reg_mrs(zip(addrs, lengths), workers=4,
+                                            chunk_size=4 * page_size)
+                    self.assertEqual(stats['num_mrs'], 5)
+                    self.assertEqual(stats['bytes'], sum(lengths))
+                    self.assertGreaterEqual(stats['total_time'], stats['reg_time'])
+                    covered = [(mr.buf, mr.length) for mr in mrs]
+                    self.assertEqual(covered[:2], list(zip(addrs[:2], lengths[:2])))
+                    self.assertEqual(sum(l for _, l in covered[2:]), lengths[2])
+                    self.assertEqual(covered[2][0], addrs[2])
+                    for mr in mrs:
+                        self.assertLessEqual(mr.length, 4 * page_size)
+                        mr.write(b'a' * mr.length, mr.length)
+                        mr.close()
+                    with self.assertRaises(PyverbsUserError):
+                        pd.reg_mrs([(addrs[0], 0)])
+        finally:
+            for addr, length in zip(addrs, lengths):
+                munmap(addr, length)
+
+    def test_mem_alloc_vec(self):
+        """
+        Fill the fields of several WQE-like entries of an MR's buffer using the
+        vectorized mem_alloc helpers and read them back.
+        """
+        stride = 64
+        num = 16
+        with d.Context(name=self.dev_name) as ctx:
+            with PD(ctx) as pd:
+                with MR(pd, stride * num, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE) as mr:
+                    mem.memset(mr.buf, 0xff, stride * num)
+                    offsets = array('Q', range(4, stride * num, stride))
+                    mem.scatterbe32(mr.buf, offsets, range(num))
+                    mem.scatterbe64(mr.buf, [o + 4 for o in offsets],
+                                    [i << 40 for i in range(num)])
+                    self.assertEqual(mr.read(4, 4), bytes(4))
+                    self.assertEqual(mem.readbe32_strided(mr.buf, num, stride, 4).tolist(),
+                                     list(range(num)))
+                    self.assertEqual(mem.gatherbe64(mr.buf, [o + 4 for o in offsets]).tolist(),
+                                     [i << 40 for i in range(num)])
+                    self.assertEqual(mem.readbe64_strided(mr.buf, num, stride, 8).tolist(),
+                                     [i << 40 for i in range(num)])
+                    self.assertEqual(mem.gatherbe32(mr.buf, [0])[0], 0xffffffff)
+                    mem.memcpy(mr.buf + stride, mr.view(0, stride), stride)
+                    mem.memcpy(mr.buf + 2 * stride, mr.buf, stride)
+                    self.assertEqual(mr.read(stride, stride), mr.read(stride, 0))
+                    self.assertEqual(mr.read(stride, 2 * stride), mr.read(stride, 0))
+                    for invalid in (lambda: mem.readbe32_strided(mr.buf, -1, stride),
+                                    lambda: mem.readbe64_strided(mr.buf, num, -stride),
+                                    lambda: mem.readbe32_strided(mr.buf, num, stride, -4),
+                                    lambda: mem.gatherbe32(mr.buf, [-4]),
+                                    lambda: mem.gatherbe64(mr.buf, [0, -8]),
+                                    lambda: mem.scatterbe32(mr.buf, [-4], [1]),
+                                    lambda: mem.scatterbe64(mr.buf, [-8], [1])):
+                        with self.assertRaises(PyverbsUserError):
+                            invalid()
+
+    def test_mr_numa_node(self):
+        """
+        Allocate an MR's buffer on the device's NUMA node and verify the
+        pages' actual placement after they're faulted in.
+        """
+        length = u.get_mr_length()
+        with d.Context(name=self.dev_name) as ctx:
+            self.assertTrue(ctx.local_cpus)
+            self.assertEqual(d.parse_cpulist('0-2,5,7-8'), [0, 1, 2, 5, 7, 8])
+            node = ctx.numa_node
+            if node < 0:
+                # No NUMA affinity, use the node of the first local CPU
+                node = 0
+            with PD(ctx) as pd:
+                with MR(pd, length, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE,
+                        numa_node=node) as mr:
+                    self.assertEqual(mr.numa_node, node)
+                    mr.write(b'a' * length, length)
+                    self.assertEqual(mr.query_numa_nodes(),
+                                     {node: (length + resource.getpagesize() - 1) //
+                                      resource.getpagesize()})
+                with MR(pd, length, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE,
+                        numa_node='device') as mr:
+                    self.assertEqual(mr.numa_node,
+                                     None if ctx.numa_node < 0 else ctx.numa_node)
+                    with self.assertRaises(PyverbsUserError):
+                        MR(pd, length, ibv_access_flags.IBV_ACCESS_LOCAL_WRITE,
+                           address=mr.buf, numa_node=node)
+
 
 class MWRC(RCResources):
     def __init__(self, dev_name, ib_port, gid_index, mw_type):
@@ -570,6 +741,36 @@ class DmaBufMRTest(PyverbsAPITestCase):
                             read_str = mr.read(read_len, offset).decode()
                             assert read_str in write_str
 
+    def test_dmabuf_buffer_protocol(self):
+        """
+        Verify that the dma-buf stays mapped across accesses, is exported
+        through the buffer protocol and is unmapped only once the last view
+        is released. Without a GPU, the dma-buf is allocated using udmabuf.
+        """
+        check_dmabuf_support(self.gpu)
+        with PD(self.ctx) as pd:
+            check_dmabuf_mr_support(pd, self.gpu)
+            mr_len = u.get_mr_length()
+            flags = ibv_access_flags.IBV_ACCESS_LOCAL_WRITE
+            for mr_off in [0, mr_len // 2]:
+                mr = DmaBufMR(pd, mr_len, flags, offset=mr_off, gpu=self.gpu,
+                              gtt=self.gtt)
+                mr.write(b'abcd', 4, 8)
+                buf = mr.buf
+                self.assertEqual(mr.read(4, 8), b'abcd')
+                self.assertEqual(mr.buf, buf)
+                mv = memoryview(mr)
+                self.assertEqual(len(mv), mr_len)
+                self.assertEqual(bytes(mv[8:12]), b'abcd')
+                mr.view(0, 4)[:] = b'efgh'
+                self.assertEqual(mr.read(4, 0), b'efgh')
+                with self.assertRaises(PyverbsUserError):
+                    mr.read(4, mr_len - 2)
+                mr.close()
+                self.assertEqual(bytes(mv[:4]), b'efgh')
+                mv.release()
+                self.assertEqual(mr.buf, 0)
+
     def test_dmabuf_lkey(self):
         """
         Test reading lkey property
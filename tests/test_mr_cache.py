@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+"""
+Test module for pyverbs' mr_cache module.
+"""
+import resource
+
+from pyverbs.libibverbs_enums import ibv_access_flags
+from pyverbs.pyverbs_error import PyverbsUserError
+from pyverbs.mem_alloc import mmap, munmap
+from tests.base import PyverbsAPITestCase
+from pyverbs.mr_cache import MRCache
+from pyverbs.pd import PD
+
+
+NUM_PAGES = 16
+
+
+class MRCacheTest(PyverbsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.page_size = resource.getpagesize()
+        self.length = NUM_PAGES * self.page_size
+        self.addr = mmap(length=self.length)
+        self.pd = PD(self.ctx)
+
+    def tearDown(self):
+        self.pd.close()
+        munmap(self.addr, self.length)
+        super().tearDown()
+
+    def page(self, idx):
+        return self.addr + idx * self.page_size
+
+    def test_mr_cache_hit_miss(self):
+        cache = MRCache(self.pd)
+        mr = cache.reg(self.addr + 100, 200)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+        self.assertEqual(mr.buf, self.addr)
+        self.assertEqual(mr.length, self.page_size)
+        self.assertIs(cache.reg(self.addr + 300, 100), mr)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # A cached MR with insufficient access flags is replaced
+        access = ibv_access_flags.IBV_ACCESS_LOCAL_WRITE | \
+            ibv_access_flags.IBV_ACCESS_REMOTE_WRITE
+        remote_mr = cache.reg(self.addr, 100, access)
+        self.assertIsNot(remote_mr, mr)
+        self.assertEqual((cache.misses, cache.merges), (2, 1))
+        self.assertIs(cache.reg(self.addr, 100), remote_mr)
+        self.assertEqual(cache.num_entries, 1)
+        with self.assertRaises(PyverbsUserError):
+            cache.reg(self.addr, 0)
+
+    def test_mr_cache_merge(self):
+        cache = MRCache(self.pd)
+        cache.reg(self.page(2), self.page_size)
+        cache.reg(self.page(5), self.page_size)
+        self.assertEqual(cache.num_entries, 2)
+        mr = cache.reg(self.page(2) + 10, 3 * self.page_size)
+        self.assertEqual(cache.merges, 2)
+        self.assertEqual(cache.num_entries, 1)
+        self.assertEqual(mr.buf, self.page(2))
+        self.assertEqual(mr.length, 4 * self.page_size)
+        self.assertEqual(cache.reg_bytes, 4 * self.page_size)
+        self.assertIs(cache.reg(self.page(5), self.page_size), mr)
+
+    def test_mr_cache_evict(self):
+        cache = MRCache(self.pd, max_bytes=2 * self.page_size)
+        first = cache.reg(self.page(0), self.page_size)
+        cache.reg(self.page(2), self.page_size)
+        # Make the second MR the least recently used one
+        cache.reg(self.page(0), self.page_size)
+        cache.reg(self.page(4), self.page_size)
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(cache.num_entries, 2)
+        self.assertEqual(cache.reg_bytes, 2 * self.page_size)
+        self.assertIs(cache.reg(self.page(0), self.page_size), first)
+        misses = cache.misses
+        cache.reg(self.page(2), self.page_size)
+        self.assertEqual(cache.misses, misses + 1)
+
+    def test_mr_cache_invalidate(self):
+        cache = MRCache(self.pd)
+        mr = cache.reg(self.page(0), self.page_size)
+        cache.reg(self.page(4), self.page_size)
+        self.assertEqual(cache.invalidate(self.page(0) + 10, 10), 1)
+        self.assertEqual(cache.invalidations, 1)
+        self.assertEqual(mr.buf, 0)
+        self.assertEqual(cache.num_entries, 1)
+        cache.flush()
+        self.assertEqual(cache.num_entries, 0)
+        self.assertEqual(cache.reg_bytes, 0)
+        cache.close()
+        with self.assertRaises(PyverbsUserError):
+            cache.reg(self.page(0), self.page_size)
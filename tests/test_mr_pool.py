@@ -0,0 +1,89 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+"""
+Test module for pyverbs' mr_pool module.
+"""
+from pyverbs.pyverbs_error import PyverbsError, PyverbsUserError
+from pyverbs.mr_pool import MRPool, MRChunk
+from tests.base import PyverbsAPITestCase
+from pyverbs.wr import SendWR, RecvWR
+from pyverbs.pd import PD
+
+
+POOL_SIZE = 256 * 1024
+SIZE_CLASSES = (64, 1000, 4096)
+ALIGN = 64
+
+
+class MRPoolTest(PyverbsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.pd = PD(self.ctx)
+        self.pool = MRPool(self.pd, POOL_SIZE, size_classes=SIZE_CLASSES,
+                           align=ALIGN, slab_size=16 * 1024)
+
+    def tearDown(self):
+        self.pool.close()
+        self.pd.close()
+        super().tearDown()
+
+    def test_mr_pool_alloc(self):
+        chunks = [self.pool.alloc(length) for length in (1, 64, 65, 1000, 4000)]
+        self.assertEqual([c.size for c in chunks], [64, 64, 1000, 1000, 4096])
+        self.assertEqual(self.pool.num_allocated, len(chunks))
+        mr_start = self.pool.mr.buf
+        for chunk in chunks:
+            self.assertIsInstance(chunk, MRChunk)
+            self.assertEqual(chunk.addr % ALIGN, 0)
+            self.assertEqual(chunk.addr, mr_start + chunk.offset)
+            self.assertEqual(chunk.lkey, self.pool.lkey)
+            self.assertEqual(chunk.rkey, self.pool.rkey)
+            self.assertLessEqual(chunk.offset + chunk.size, POOL_SIZE)
+        ranges = sorted((c.offset, c.offset + c.size) for c in chunks)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertLessEqual(end, start)
+        # Chunks plug into WRs as SGEs
+        send_wr = SendWR(num_sge=2, sg=chunks[:2])
+        self.assertEqual(send_wr.num_sge, 2)
+        RecvWR(num_sge=1, sg=[chunks[2]])
+        with self.assertRaises(PyverbsUserError):
+            self.pool.alloc(4097)
+
+    def test_mr_pool_free(self):
+        chunk = self.pool.alloc(100)
+        offset = chunk.offset
+        free_before = self.pool.num_free(1000)
+        self.pool.free(chunk)
+        # A freed chunk can't be used anymore
+        for use in (lambda: chunk.addr, lambda: chunk.read(1, 0),
+                    lambda: SendWR(num_sge=1, sg=[chunk])):
+            with self.assertRaises(PyverbsUserError):
+                use()
+        self.assertEqual(self.pool.num_free(1000), free_before + 1)
+        self.assertEqual(self.pool.num_allocated, 0)
+        # Freed chunks are reused first
+        with self.pool.alloc(1000) as chunk:
+            self.assertEqual(chunk.offset, offset)
+        self.assertEqual(self.pool.num_allocated, 0)
+        used = self.pool.used_bytes
+        for _ in range(10):
+            self.pool.alloc(10).close()
+        self.assertEqual(self.pool.used_bytes - used, 16 * 1024)
+
+    def test_mr_pool_exhaustion(self):
+        chunks = []
+        with self.assertRaises(PyverbsError):
+            while True:
+                chunks.append(self.pool.alloc(4096))
+        self.assertEqual(len(chunks), POOL_SIZE // 4096)
+        chunks.pop().close()
+        chunks.append(self.pool.alloc(4096))
+
+    def test_mr_pool_close(self):
+        chunk = self.pool.alloc(100)
+        self.pool.close()
+        # Outstanding chunks can't be used once the pool is closed
+        for use in (lambda: chunk.lkey, lambda: chunk.read(1, 0),
+                    lambda: RecvWR(num_sge=1, sg=[chunk])):
+            with self.assertRaises(PyverbsUserError):
+                use()
+        chunk.close()
@@ -4,6 +4,8 @@ from tests.base import RCResources, UDResources, XRCResources
 from pyverbs.qp import QPCap, QPAttr, QPInitAttr
 from pyverbs.wr import SGE, SendWR, RecvWR
 from tests.base import RDMATestCase
+from pyverbs.pyverbs_error import PyverbsRDMAError
+from pyverbs.odp_prefetch import ODPPrefetcher
 from pyverbs.mr import MR
 from pyverbs.libibverbs_enums import ibv_odp_transport_cap_bits, ibv_access_flags, ibv_odp_transport_cap_bits, \
     ibv_qp_type, ibv_placement_type, ibv_selectivity_level, ibv_qp_create_send_ops_flags, ibv_wr_opcode, \
@@ -11,6 +13,7 @@ from pyverbs.libibverbs_enums import ibv_odp_transport_cap_bits, ibv_access_flag
     _IBV_ADVISE_MR_ADVICE_PREFETCH_NO_FAULT
 import tests.utils as u
 import unittest
+import errno
 
 HUGE_PAGE_SIZE = 0x200000
 
@@ -313,6 +316,53 @@ class OdpTestCase(RDMATestCase):
                                 use_mr_prefetch='async', prefetch_advice=advice)
             u.traffic(**self.traffic_args)
 
+    def test_odp_scheduler_prefetch_rc_traffic(self):
+        """
+        Prefetch the sends through an ODPPrefetcher. The same buffer is sent
+        every iteration, so it's advised only once unless page faults are
+        forced.
+        """
+        self.create_players(OdpRC, request_user_addr=self.force_page_faults,
+                            use_mr_prefetch='scheduler')
+        u.traffic(**self.traffic_args)
+        for player in [self.client, self.server]:
+            prefetcher = player.prefetcher
+            self.assertEqual(prefetcher.requested_sges, self.iters)
+            if not self.force_page_faults:
+                self.assertEqual(prefetcher.advise_calls, 1)
+                self.assertEqual(prefetcher.skipped_bytes,
+                                 (self.iters - 1) * player.msg_size)
+
+    def test_odp_prefetcher_coalesce(self):
+        """
+        Verify that adjacent SGEs are advised as one range and that
+        prefetched ranges are skipped until they're invalidated.
+        """
+        self.create_players(OdpRC, request_user_addr=self.force_page_faults)
+        mr = self.client.mr
+        chunk = mr.length // 4
+        prefetcher = ODPPrefetcher(self.client.pd, lookahead=4)
+        for i in range(4):
+            prefetcher.submit([SGE(mr.buf + i * chunk, chunk, mr.lkey)])
+        try:
+            prefetcher.next()
+        except PyverbsRDMAError as ex:
+            if ex.error_code == errno.EOPNOTSUPP:
+                raise unittest.SkipTest('Advise MR is not supported')
+            raise ex
+        self.assertEqual((prefetcher.advise_calls, prefetcher.advised_sges,
+                          prefetcher.coalesced_sges), (1, 1, 3))
+        self.assertEqual(prefetcher.advised_bytes, 4 * chunk)
+        prefetcher.prefetch([(mr.buf, 2 * chunk, mr.lkey)])
+        self.assertEqual(prefetcher.advise_calls, 1)
+        self.assertEqual(prefetcher.skipped_bytes, 2 * chunk)
+        prefetcher.invalidate(mr.buf + chunk, chunk)
+        prefetcher.prefetch([(mr.buf, 2 * chunk, mr.lkey)])
+        self.assertEqual(prefetcher.advise_calls, 2)
+        self.assertEqual(prefetcher.advised_bytes, 5 * chunk)
+        self.assertEqual(prefetcher.num_queued, 3)
+        prefetcher.close()
+
     def test_odp_implicit_sync_prefetch_rc_traffic(self):
         self.create_players(OdpRC, request_user_addr=self.force_page_faults,
                             use_mr_prefetch='sync', is_implicit=True)
@@ -3,9 +3,12 @@
 """
 Test module for pyverbs' pd module.
 """
+import logging
 import random
 
+from pyverbs.libibverbs_enums import ibv_access_flags
 from tests.base import PyverbsAPITestCase
+from pyverbs.mr import MR
 from pyverbs.pd import PD
 
 
@@ -44,3 +47,33 @@ class PDTest(PyverbsAPITestCase):
             # not expecting an exception here.
             pd.close()
             pd.close()
+
+    def test_pd_logger(self):
+        """
+        Test that objects share their class's logger
+        """
+        with PD(self.ctx) as pd1, PD(self.ctx) as pd2:
+            self.assertIs(pd1.logger, logging.getLogger('PD'))
+            self.assertIs(pd1.logger, pd2.logger)
+            level = pd1.logger.level
+            pd1.set_log_level(logging.DEBUG)
+            try:
+                self.assertEqual(pd2.logger.getEffectiveLevel(), logging.DEBUG)
+            finally:
+                pd1.set_log_level(level)
+
+    def test_pd_close_deps(self):
+        """
+        Test that closing a PD closes the MRs that are still open, after some
+        were closed or garbage collected
+        """
+        access = ibv_access_flags.IBV_ACCESS_LOCAL_WRITE
+        with PD(self.ctx) as pd:
+            mrs = [MR(pd, 64, access) for _ in range(200)]
+            for _ in range(100):
+                MR(pd, 64, access)
+            for mr in mrs[::2]:
+                mr.close()
+            pd.close()
+            for mr in mrs:
+                self.assertEqual(mr.buf, 0)
@@ -11,8 +11,10 @@ import random
 import errno
 import os
 
-from pyverbs.pyverbs_error import PyverbsRDMAError
-from pyverbs.qp import QPAttr, QP
+from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsUserError
+from pyverbs.wr import RecvWR, RecvWRBatch, SendWR, SendWRBatch, SGE, \
+    SGEList
+from pyverbs.qp import QPAttr, QPCap, QP
 from tests.base import PyverbsAPITestCase, RDMATestCase, RCResources
 import pyverbs.utils as pu
 import pyverbs.device as d
@@ -368,6 +370,66 @@ class QPTest(PyverbsAPITestCase):
                 qp.modify(qa, ibv_qp_attr_mask.IBV_QP_STATE)
                 assert qp.qp_state == ibv_qp_state.IBV_QPS_RESET, 'Extended QP, QP state is not as expected'
 
+    def test_sge_list(self):
+        """
+        Verifies SGEList indexing and reuse, and that SGEs and WRs don't leak
+        their scatter-gather arrays.
+        """
+        sgl = SGEList([SGE(0x1000, 64, 1), (0x2000, 128, 2)], capacity=4)
+        self.assertEqual((len(sgl), sgl.capacity), (2, 4))
+        self.assertEqual(sgl.total_length, 192)
+        view = sgl[-1]
+        view.length = 256
+        self.assertEqual(sgl[1].length, 256)
+        sgl.append((0x3000, 32, 3))
+        self.assertEqual([sge.addr for sge in sgl], [0x1000, 0x2000, 0x3000])
+        with self.assertRaises(IndexError):
+            sgl[3]
+        sgl.append(sgl[0])
+        with self.assertRaises(PyverbsUserError):
+            sgl.append((0x5000, 8, 5))
+        sgl.clear()
+        self.assertEqual(len(sgl), 0)
+        sgl.append((0x4000, 16, 4))
+        with self.assertRaises(PyverbsUserError):
+            SendWR(sg=sgl, num_sge=2)
+        self.assertEqual(SendWR(sg=sgl).num_sge, 1)
+        # The list can't be closed while WRs use it, nor viewed once closed
+        wr = SendWR(sg=sgl)
+        view_wr = SendWR(num_sge=1, sg=[SGE(0x1000, 64, 1)])
+        view = sgl[0]
+        view_wr.sg_list = view
+        wr.close()
+        with self.assertRaises(PyverbsUserError):
+            sgl.close()
+        view_wr.close()
+        sgl.close()
+        with self.assertRaises(PyverbsUserError):
+            view.addr
+        with self.assertRaises(PyverbsUserError):
+            view.read(1, 0)
+
+        def rss():
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGESIZE')
+        sgl = SGEList([(0x1000, 64, 1), (0x2000, 64, 1)])
+        for _ in range(2):
+            before = rss()
+            for i in range(200000):
+                sge = SGE(0x1000 + i, 64, 1)
+                SendWR(num_sge=2, sg=[sge, sge])
+                RecvWR(num_sge=1, sg=[sge])
+                SendWR(sg=sgl)
+        # Leaked SGEs and SG arrays would take tens of MBs
+        self.assertLess(rss() - before, 4 * 1024 * 1024)
+
+
+class BatchRCResources(RCResources):
+    BATCH_SIZE = 32
+
+    def create_qp_cap(self):
+        return QPCap(max_send_wr=self.BATCH_SIZE, max_recv_wr=self.num_msgs)
+
 
 class RCQPTest(RDMATestCase):
     """
@@ -392,6 +454,63 @@ class RCQPTest(RDMATestCase):
         self.assertGreaterEqual(qp_attr.max_dest_rd_atomic, self.max_dest_rd_atomic,
                                 'Max Dest RD Atomic is less than requested.')
 
+    def test_sge_list_traffic(self):
+        """
+        Sends and receives using WRs whose scatter-gather lists are SGELists.
+        """
+        self.create_players(RCResources)
+        size = self.server.msg_size
+        recv_sgl = SGEList([(self.server.mr.buf, size, self.server.mr.lkey)])
+        send_sgl = SGEList([(self.client.mr.buf, size, self.client.mr.lkey)])
+        self.client.mr.write('c' * size, size)
+        for i in range(self.iters):
+            u.post_recv(self.server, RecvWR(wr_id=i, sg=recv_sgl))
+            u.post_send(self.client, SendWR(wr_id=i, sg=send_sgl))
+            u.poll_cq(self.client.cq)
+            u.poll_cq(self.server.cq)
+            self.assertEqual(self.server.mr.read(size, 0), b'c' * size)
+
+    def test_post_batch(self):
+        """
+        Posts a batch of receive WRs and a batch of send WRs, each with a
+        single post call, and verifies the completions' WR IDs.
+        """
+        self.create_players(BatchRCResources)
+        num = BatchRCResources.BATCH_SIZE
+        msg_size = self.server.msg_size
+        recv_wrs = RecvWRBatch(num)
+        recv_wrs.set_sge(self.server.mr.buf, msg_size, self.server.mr.lkey)
+        recv_wrs.set_wr_id(range(100, 100 + num))
+        send_wrs = SendWRBatch(num)
+        send_wrs.set_sge(self.client.mr.buf, msg_size, self.client.mr.lkey)
+        send_wrs.set_wr_id(range(num))
+        for _ in range(10):
+            self.server.qp.post_recv_batch(recv_wrs)
+            self.client.qp.post_send_batch(send_wrs)
+            self.assertIsNone(send_wrs.bad_wr)
+            send_wcs = u.poll_cq(self.client.cq, num)
+            recv_wcs = u.poll_cq(self.server.cq, num)
+            self.assertEqual([wc.wr_id for wc in send_wcs], list(range(num)))
+            self.assertEqual(sorted(wc.wr_id for wc in recv_wcs),
+                             list(range(100, 100 + num)))
+        with self.assertRaises(PyverbsUserError):
+            self.client.qp.post_send_batch(send_wrs, num + 1)
+        # Use more SGEs than the QP supports in the third WR, the first two
+        # WRs are posted and the third one is reported as the bad WR.
+        attr, _ = self.client.qp.query(ibv_qp_attr_mask.IBV_QP_CAP)
+        max_sge = attr.cap.max_send_sge
+        bad_wrs = SendWRBatch(3, num_sge=max_sge + 1)
+        for i in range(max_sge + 1):
+            bad_wrs.set_sge(self.client.mr.buf, msg_size, self.client.mr.lkey,
+                            sge=i)
+        bad_wrs.set_num_sge([1, 1, max_sge + 1])
+        self.server.qp.post_recv_batch(recv_wrs, 2)
+        with self.assertRaises(PyverbsRDMAError):
+            self.client.qp.post_send_batch(bad_wrs)
+        self.assertEqual(bad_wrs.bad_wr, 2)
+        u.poll_cq(self.client.cq, 2)
+        u.poll_cq(self.server.cq, 2)
+
 
 def get_qp_init_attr_ex(cq, pd, attr, attr_ex, qpt):
     """
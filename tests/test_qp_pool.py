@@ -0,0 +1,108 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+"""
+Test module for pyverbs' qp_pool module.
+"""
+import threading
+import weakref
+import time
+import gc
+
+from pyverbs.libibverbs_enums import ibv_qp_type, ibv_qp_state
+from pyverbs.qp import QP, QPAttr, QPCap, QPInitAttr
+from pyverbs.pyverbs_error import PyverbsUserError
+from tests.base import PyverbsAPITestCase
+from pyverbs.qp_pool import QPPool
+from pyverbs.cq import CQ
+from pyverbs.pd import PD
+
+
+class QPPoolTest(PyverbsAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.pd = PD(self.ctx)
+        self.cq = CQ(self.ctx, 16)
+        self.init_attr = QPInitAttr(qp_type=ibv_qp_type.IBV_QPT_RC,
+                                    scq=self.cq, rcq=self.cq,
+                                    cap=QPCap(max_recv_wr=4))
+        self.qp_attr = QPAttr(port_num=self.ib_port)
+
+    def tearDown(self):
+        self.pd.close()
+        self.cq.close()
+        super().tearDown()
+
+    def test_qp_pool_get_release(self):
+        with QPPool(self.pd, self.init_attr, low=2, high=4,
+                    background=False) as pool:
+            self.assertEqual(pool.num_free, 4)
+            self.assertEqual(pool.key[0], self.pd)
+            self.assertEqual(pool.key[-1], ibv_qp_type.IBV_QPT_RC)
+            qp = pool.get()
+            self.assertEqual(qp.qp_state, ibv_qp_state.IBV_QPS_RESET)
+            qp.to_init(QPAttr(port_num=self.ib_port))
+            pool.release(qp)
+            self.assertEqual(qp.qp_state, ibv_qp_state.IBV_QPS_RESET)
+            self.assertEqual(pool.num_free, 4)
+            with self.assertRaises(PyverbsUserError):
+                pool.release(qp)
+            self.assertIs(pool.get(), qp)
+            self.assertEqual((pool.hits, pool.misses, pool.created,
+                              pool.recycled), (2, 0, 4, 1))
+            with QP(self.pd, self.init_attr) as other:
+                with self.assertRaises(PyverbsUserError):
+                    pool.release(other)
+            qp = pool.get()
+        # QPs handed out before the pool was closed are destroyed on release
+        destroyed = pool.destroyed
+        pool.release(qp)
+        self.assertEqual(pool.destroyed, destroyed + 1)
+        self.assertEqual(pool.num_free, 0)
+
+    def test_qp_pool_watermarks(self):
+        with QPPool(self.pd, self.init_attr, self.qp_attr, low=2, high=4,
+                    background=False) as pool:
+            qps = [pool.get() for _ in range(3)]
+            for qp in qps:
+                self.assertEqual(qp.qp_state, ibv_qp_state.IBV_QPS_INIT)
+            # Going below the low watermark refilled the pool
+            self.assertEqual(pool.num_free, 4)
+            self.assertEqual(pool.created, 7)
+            for qp in qps:
+                pool.release(qp)
+            # QPs released beyond the high watermark are destroyed
+            self.assertEqual(pool.num_free, 4)
+            self.assertEqual(pool.destroyed, 3)
+
+    def test_qp_pool_background_refill(self):
+        pool = QPPool(self.pd, self.init_attr, low=2, high=4)
+        qps = [pool.get() for _ in range(4)]
+        deadline = time.monotonic() + 5
+        while pool.num_free < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(pool.num_free, 4)
+        # Closing the PD closes the pool and the QPs
+        self.pd.close()
+        self.assertEqual(pool.num_free, 0)
+        with self.assertRaises(PyverbsUserError):
+            pool.get()
+        for qp in qps:
+            qp.close()
+
+    def test_qp_pool_collected(self):
+        pool = QPPool(self.pd, self.init_attr, low=2, high=4)
+        qp = pool.get()
+        pool_ref = weakref.ref(pool)
+        # The refill thread doesn't keep an unreferenced pool alive, though
+        # it may briefly hold it while checking the watermarks
+        del pool
+        deadline = time.monotonic() + 5
+        while pool_ref() is not None and time.monotonic() < deadline:
+            gc.collect()
+            time.sleep(0.01)
+        self.assertIsNone(pool_ref())
+        while any(t.name == 'QPPool refill' for t in threading.enumerate()) \
+                and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertFalse(any(t.name == 'QPPool refill'
+                             for t in threading.enumerate()))
+        qp.close()
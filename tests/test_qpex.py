@@ -1,9 +1,10 @@
+from array import array
 import unittest
 import random
 import errno
 
 from pyverbs.qp import QPCap, QPInitAttrEx, QPAttr, QPEx, QP
-from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError
+from pyverbs.pyverbs_error import PyverbsError, PyverbsRDMAError, PyverbsUserError
 from pyverbs.mr import MW, MWBindInfo
 from pyverbs.base import inc_rkey
 from tests.utils import wc_status_to_str
@@ -106,6 +107,17 @@ class QpExRCRDMAWrite(RCResources):
         self.mr = u.create_custom_mr(self, ibv_access_flags.IBV_ACCESS_REMOTE_WRITE)
 
 
+class QpExRCRDMAWriteBatch(RCResources):
+    BATCH_SIZE = 32
+
+    def create_qps(self):
+        u.create_qp_ex(self, ibv_qp_type.IBV_QPT_RC, ibv_qp_create_send_ops_flags.IBV_QP_EX_WITH_RDMA_WRITE)
+
+    def create_mr(self):
+        self.mr = u.create_custom_mr(self, ibv_access_flags.IBV_ACCESS_REMOTE_WRITE,
+                                     size=self.msg_size * self.BATCH_SIZE)
+
+
 class QpExRCRDMAWriteImm(RCResources):
     def create_qps(self):
         u.create_qp_ex(self, ibv_qp_type.IBV_QPT_RC, ibv_qp_create_send_ops_flags.IBV_QP_EX_WITH_RDMA_WRITE_WITH_IMM)
@@ -208,6 +220,37 @@ class QpExTestCase(RDMATestCase):
         self.create_players(QpExRCRDMAWrite)
         u.rdma_traffic(**self.traffic_args, new_send=True, send_op=ibv_wr_opcode.IBV_WR_RDMA_WRITE)
 
+    def test_qp_ex_rc_rdma_write_batch(self):
+        """
+        Posts batches of RDMA writes with a single post_batch() call, each WR
+        writing a distinct pattern to its own slot of the remote MR. Verifies
+        that a batch with an unsupported opcode is aborted as a whole.
+        """
+        self.create_players(QpExRCRDMAWriteBatch)
+        num = QpExRCRDMAWriteBatch.BATCH_SIZE
+        size = self.client.msg_size
+        offsets = [i * size for i in range(num)]
+        laddrs = array('Q', [self.client.mr.buf + off for off in offsets])
+        raddrs = array('Q', [self.client.raddr + off for off in offsets])
+        opcodes = array('I', [ibv_wr_opcode.IBV_WR_RDMA_WRITE] * num)
+        opcodes[1] = ibv_wr_opcode.IBV_WR_ATOMIC_CMP_AND_SWP
+        with self.assertRaises(PyverbsUserError):
+            self.client.qp.post_batch(opcodes, array('Q', range(num)),
+                                      ibv_send_flags.IBV_SEND_SIGNALED, self.client.rkey,
+                                      raddrs, self.client.mr.lkey, laddrs, size)
+        for it in range(self.iters // 10):
+            for i, off in enumerate(offsets):
+                self.client.mr.write(bytes([(it + i) % 256]) * size, size, off)
+            self.client.qp.post_batch(ibv_wr_opcode.IBV_WR_RDMA_WRITE,
+                                      array('Q', range(num)),
+                                      ibv_send_flags.IBV_SEND_SIGNALED, self.client.rkey,
+                                      raddrs, self.client.mr.lkey, laddrs, size)
+            wcs = u.poll_cq(self.client.cq, num)
+            self.assertEqual([wc.wr_id for wc in wcs], list(range(num)))
+            for i, off in enumerate(offsets):
+                self.assertEqual(self.server.mr.read(size, off),
+                                 bytes([(it + i) % 256]) * size)
+
     def test_qp_ex_rc_rdma_write_imm(self):
         self.create_players(QpExRCRDMAWriteImm)
         u.traffic(**self.traffic_args, new_send=True, send_op=ibv_wr_opcode.IBV_WR_RDMA_WRITE_WITH_IMM)
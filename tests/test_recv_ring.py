@@ -0,0 +1,157 @@
+# SPDX-License-Identifier: (GPL-2.0 OR Linux-OpenIB)
+"""
+Test module for pyverbs' recv_ring module.
+"""
+import unittest
+import errno
+import time
+
+from pyverbs.libibverbs_enums import ibv_access_flags, ibv_qp_type, \
+    ibv_wq_attr_mask, ibv_wq_state, ibv_wq_type, ibv_wc_status
+from pyverbs.pyverbs_error import PyverbsRDMAError, PyverbsUserError
+from tests.base import PyverbsAPITestCase, RCResources, RDMATestCase
+from pyverbs.wq import WQ, WQAttr, WQInitAttr
+from pyverbs.recv_ring import RecvRing
+from pyverbs.qp import QPCap, QPInitAttr
+from pyverbs.pd import PD
+from pyverbs.cq import CQ
+from pyverbs.mr import MR
+import tests.utils as u
+
+
+NUM_SLOTS = 32
+RING_DEPTH = 16
+
+
+class RecvRingRC(RCResources):
+    """
+    RC resources with a dedicated receive CQ and an MR that can hold
+    NUM_SLOTS messages.
+    """
+    def create_cq(self):
+        self.cq = CQ(self.ctx, self.num_msgs, None, None, 0)
+        self.rcq = CQ(self.ctx, NUM_SLOTS, None, None, 0)
+
+    def create_mr(self):
+        self.mr = MR(self.pd, self.msg_size * NUM_SLOTS,
+                     ibv_access_flags.IBV_ACCESS_LOCAL_WRITE)
+
+    def create_qp_cap(self):
+        return QPCap(max_send_wr=RING_DEPTH, max_recv_wr=NUM_SLOTS)
+
+    def create_qp_init_attr(self):
+        return QPInitAttr(qp_type=ibv_qp_type.IBV_QPT_RC, scq=self.cq,
+                          rcq=self.rcq, srq=self.srq, cap=self.create_qp_cap())
+
+
+class RecvRingTest(RDMATestCase):
+    def setUp(self):
+        super().setUp()
+        self.iters = 100
+
+    def ring_traffic(self, ring):
+        """
+        Sends <iters> messages, each with a distinct payload, and verifies
+        they are received through the ring while the receive queue is kept
+        at the ring's depth.
+        """
+        msg_size = self.client.msg_size
+        send_wr, _ = u.get_send_elements(self.client, False)
+        for i in range(self.iters):
+            payload = bytes([i % 256]) * msg_size
+            self.client.mr.write(payload, msg_size)
+            u.send(self.client, send_wr)
+            u.poll_cq(self.client.cq)
+            start = time.perf_counter()
+            npolled = 0
+            while npolled == 0:
+                npolled, slots, byte_lens = ring.poll()
+                if time.perf_counter() - start > u.POLL_CQ_TIMEOUT:
+                    self.fail('Receive completion timed out')
+            self.assertEqual(npolled, 1)
+            self.assertIsNone(ring.error)
+            self.assertEqual(byte_lens[0], msg_size)
+            self.assertEqual(ring.read(slots[0], msg_size), payload)
+            self.assertEqual(ring.num_posted, RING_DEPTH)
+
+    def test_recv_ring_qp(self):
+        self.create_players(RecvRingRC)
+        ring = RecvRing(self.server.qp, self.server.rcq, self.server.mr,
+                        self.server.msg_size, NUM_SLOTS, RING_DEPTH)
+        self.assertEqual(ring.num_posted, RING_DEPTH)
+        self.ring_traffic(ring)
+
+    def test_recv_ring_srq(self):
+        self.create_players(RecvRingRC, with_srq=True)
+        ring = RecvRing(self.server.srq, self.server.rcq, self.server.mr,
+                        self.server.msg_size, NUM_SLOTS, RING_DEPTH)
+        self.ring_traffic(ring)
+
+    def test_recv_ring_bad_params(self):
+        self.create_players(RecvRingRC)
+        with self.assertRaises(PyverbsUserError):
+            RecvRing(self.server.qp, self.server.rcq, self.server.mr,
+                     self.server.msg_size, NUM_SLOTS + 1)
+        with self.assertRaises(PyverbsUserError):
+            RecvRing(self.server.qp, self.server.rcq, self.server.mr,
+                     self.server.msg_size, NUM_SLOTS, NUM_SLOTS + 1)
+
+
+class RecvRingWQTest(PyverbsAPITestCase):
+    """
+    Feeds a WQ from a RecvRing. The WQ isn't attached to a QP, so the ring's
+    receive WRs are completed by moving the WQ to the error state, which
+    flushes them.
+    """
+    SLOT_SIZE = 64
+
+    def setUp(self):
+        super().setUp()
+        self.pd = PD(self.ctx)
+        self.cq = CQ(self.ctx, NUM_SLOTS)
+        self.mr = MR(self.pd, self.SLOT_SIZE * NUM_SLOTS,
+                     ibv_access_flags.IBV_ACCESS_LOCAL_WRITE)
+        wq_init_attr = WQInitAttr(wq_pd=self.pd, wq_cq=self.cq,
+                                  wq_type=ibv_wq_type.IBV_WQT_RQ,
+                                  max_wr=NUM_SLOTS, max_sge=1)
+        try:
+            self.wq = WQ(self.ctx, wq_init_attr)
+        except PyverbsRDMAError as ex:
+            if ex.error_code == errno.EOPNOTSUPP:
+                raise unittest.SkipTest('Create WQ is not supported')
+            raise ex
+        self.modify_wq(ibv_wq_state.IBV_WQS_RDY)
+
+    def tearDown(self):
+        self.wq.close()
+        self.mr.close()
+        self.cq.close()
+        self.pd.close()
+        super().tearDown()
+
+    def modify_wq(self, state):
+        self.wq.modify(WQAttr(attr_mask=ibv_wq_attr_mask.IBV_WQ_ATTR_STATE,
+                              wq_state=state))
+
+    def test_recv_ring_wq(self):
+        ring = RecvRing(self.wq, self.cq, self.mr, self.SLOT_SIZE, NUM_SLOTS,
+                        RING_DEPTH)
+        self.assertEqual(ring.num_posted, RING_DEPTH)
+        self.modify_wq(ibv_wq_state.IBV_WQS_ERR)
+        flushed = []
+        start = time.perf_counter()
+        while len(flushed) < RING_DEPTH:
+            npolled, slots, byte_lens = ring.poll()
+            flushed.extend(slots)
+            self.assertEqual(set(byte_lens), {0} if npolled else set())
+            if time.perf_counter() - start > u.POLL_CQ_TIMEOUT:
+                self.fail('Flush completions timed out')
+        self.assertEqual(sorted(flushed), list(range(RING_DEPTH)))
+        self.assertEqual(ring.error, ibv_wc_status.IBV_WC_WR_FLUSH_ERR)
+        # Reposting stopped on the first error
+        self.assertEqual(ring.num_posted, 0)
+        ring.close()
+        for func in [lambda: ring.poll(), lambda: ring.slot_addr(0),
+                     lambda: ring.read(0)]:
+            with self.assertRaises(PyverbsUserError):
+                func()
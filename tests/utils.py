@@ -28,6 +28,7 @@ from pyverbs.base import PyverbsRDMAErrno
 from tests.efa_base import SRDResources
 from pyverbs.cq import PollCqAttr, CQEX
 from pyverbs.mr import MW, MWBindInfo
+from pyverbs.odp_prefetch import ODPPrefetcher
 from pyverbs.mem_alloc import madvise
 import pyverbs.device as d
 from pyverbs.libibverbs_enums import ibv_access_flags, ibv_odp_general_caps, ibv_device_cap_flags, \
@@ -869,8 +870,13 @@ def traffic(client, server, iters, gid_idx, port, is_cq_ex=False, send_op=ibv_wr
             if force_page_faults:
                 madvise(client.mr.buf, client.msg_size)
                 madvise(server.mr.buf, server.msg_size)
+                for agr_obj in [client, server]:
+                    if getattr(agr_obj, 'prefetcher', None) is not None:
+                        agr_obj.prefetcher.invalidate()
             c_send_wr, c_sg = get_send_elements(client, False, send_op)
-            if client.use_mr_prefetch:
+            if client.use_mr_prefetch == 'scheduler':
+                schedule_prefetch(client, [c_sg])
+            elif client.use_mr_prefetch:
                 flags = _IBV_ADVISE_MR_FLAG_FLUSH
                 if client.use_mr_prefetch == 'async':
                     flags = 0
@@ -886,7 +892,9 @@ def traffic(client, server, iters, gid_idx, port, is_cq_ex=False, send_op=ibv_wr
             for msg in msg_received_list:
                 validate(msg, True, server.msg_size)
             s_send_wr, s_sg = get_send_elements(server, True, send_op)
-            if server.use_mr_prefetch:
+            if server.use_mr_prefetch == 'scheduler':
+                schedule_prefetch(server, [s_sg])
+            elif server.use_mr_prefetch:
                 flags = _IBV_ADVISE_MR_FLAG_FLUSH
                 if server.use_mr_prefetch == 'async':
                     flags = 0
@@ -1722,6 +1730,26 @@ def prefetch_mrs(agr_obj, sg_list, advice=_IBV_ADVISE_MR_ADVICE_PREFETCH_WRITE,
         raise ex
 
 
+def schedule_prefetch(agr_obj, sg_list):
+    """
+    Pre-fetch an SG list of an on-demand paging MR through the aggregation
+    object's ODPPrefetcher, which is created on first use.
+    :param agr_obj: Aggregation object which contains all resources necessary
+    :param sg_list: SGE list
+    :return: None
+    """
+    if getattr(agr_obj, 'prefetcher', None) is None:
+        agr_obj.prefetcher = ODPPrefetcher(agr_obj.pd,
+                                           advice=agr_obj.prefetch_advice)
+    agr_obj.prefetcher.submit(sg_list)
+    try:
+        agr_obj.prefetcher.next()
+    except PyverbsRDMAError as ex:
+        if ex.error_code == errno.EOPNOTSUPP:
+            raise unittest.SkipTest(f'Advise MR with advice ({agr_obj.prefetch_advice}) is not supported')
+        raise ex
+
+
 def is_eth(ctx, port_num):
     """
     Querires the device's context's <port_num> port for its link layer.